@@ -0,0 +1,231 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.global_vars import CHAT_PUSH_CHANNEL, CHAT_PUSH_QUEUE_SIZE, CHAT_PUSH_HEARTBEAT, MESSAGE_PAGE_SIZE
+from app.instrumentation import log_event
+from app.message_history import latest_message_id, page_messages
+from app.models import Message
+
+HEARTBEAT = object()
+RESYNC = object()  # wakes a subscriber to catch up from the db, never yielded
+
+
+# tell every api worker a message was committed; runs inside the inserting transaction so the
+# notification is only delivered if the insert commits
+def notify_message(db, gid: int, message_id: int):
+    notify_messages(db, [(gid, message_id)])
+
+
+# notify_message for many (gid, id) pairs in one statement
+def notify_messages(db, messages):
+    db.execute(text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+               {"channel": CHAT_PUSH_CHANNEL,
+                "payloads": [json.dumps({"gid": gid, "id": message_id}) for gid, message_id in messages]})
+
+
+def message_event(message: Message) -> dict:
+    return {
+        "id": message.id,
+        "gid": message.gid,
+        "sender_uid": message.sender_uid,
+        "sender_name": message.sender_name,
+        "text": message.text,
+        "timestamp": message.timestamp.isoformat() if message.timestamp else None,
+        "read_by": [message.sender_uid],
+    }
+
+
+# one connected client; the broker thread offers messages through the client's event loop
+class Subscriber:
+    def __init__(self, broker, gid: int, loop, queue_size: int = CHAT_PUSH_QUEUE_SIZE):
+        self.broker = broker
+        self.gid = gid
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False  # messages were dropped, catch up from the db before reading the queue again
+
+    # runs on the subscriber's loop
+    def offer(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+            self.broker.delivered += 1
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.broker.dropped += 1
+
+    # runs on the subscriber's loop; the live feed may have missed messages, so catch up from the db
+    def resync(self):
+        self.overflowed = True
+        try:
+            self.queue.put_nowait(RESYNC)  # a full queue is read again soon enough, no need to wake it
+        except asyncio.QueueFull:
+            pass
+
+
+# per-worker LISTEN connection fanning committed messages out to this worker's subscribers
+# the listener thread fetches each notified message once, however many clients are watching its group
+class ChatBroker:
+    def __init__(self, engine, session_factory, channel: str = CHAT_PUSH_CHANNEL):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.channel = channel
+        self._subscribers = {}  # gid -> set of Subscriber
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.delivered = 0
+        self.dropped = 0
+        self.resyncs = 0  # times subscribers were sent back to the db, after a reconnect or a failed dispatch
+
+    def subscribe(self, gid: int) -> Subscriber:
+        subscriber = Subscriber(self, gid, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(gid, set()).add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._listen_forever, name="chat-push", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.gid)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.gid]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def stop(self):
+        self._stop.set()
+
+    def _listen_forever(self):
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                self._listen()
+                delay = 1.0
+            except Exception as e:
+                log_event(logging.WARNING, "chat_push_listen_failed", error=str(e))
+                self._stop.wait(delay)
+                delay = min(delay * 2, 30.0)
+
+    # every subscriber catches up from the db past the last id it was sent
+    # notifications sent while the listener was down, or that failed to dispatch, are gone for good
+    def _resync_all(self):
+        with self._lock:
+            subscribers = [s for subscribers in self._subscribers.values() for s in subscribers]
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.resync)
+        self.resyncs += 1
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        conn = raw.driver_connection
+        raw.detach()  # a long-lived LISTEN connection doesn't belong in the pool
+        try:
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {self.channel}")
+            # anything committed before LISTEN took effect was never heard
+            self._resync_all()
+            while not self._stop.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                notifies, conn.notifies[:] = list(conn.notifies), []
+                if notifies:
+                    try:
+                        self._dispatch([json.loads(n.payload) for n in notifies])
+                    except Exception as e:
+                        log_event(logging.WARNING, "chat_push_dispatch_failed", error=str(e))
+                        self._resync_all()
+        finally:
+            conn.close()
+
+    def _dispatch(self, payloads):
+        with self._lock:
+            watched = {p["id"] for p in payloads if p["gid"] in self._subscribers}
+        if not watched:
+            return
+        db = self.session_factory()
+        try:
+            messages = db.query(Message).filter(Message.id.in_(watched)).order_by(Message.id).all()
+        finally:
+            db.close()
+
+        for message in messages:
+            event = message_event(message)
+            with self._lock:
+                subscribers = list(self._subscribers.get(message.gid, ()))
+            for subscriber in subscribers:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+
+
+# one page of gid's messages after after_id, oldest first, and whether there are more
+def _messages_after(session_factory, gid: int, after_id: int, limit: int = MESSAGE_PAGE_SIZE):
+    db = session_factory()
+    try:
+        messages, has_more = page_messages(db, gid, after_id=after_id, limit=limit)
+    finally:
+        db.close()
+    return [message_event(m) for m in messages], has_more
+
+
+def _latest_id(session_factory, gid: int) -> int:
+    db = session_factory()
+    try:
+        return latest_message_id(db, gid)
+    finally:
+        db.close()
+
+
+# everything a subscriber should see, in order: message events and HEARTBEAT after heartbeat seconds of quiet
+# first catches up from the db past after_id, then follows the live feed; if the client fell so far behind
+# that its queue overflowed, it goes back to the db from the last id it was sent, so a slow consumer costs
+# bounded memory and still misses nothing; the broker uses the same path whenever its own feed had a gap
+# after_id None means live from now: the group's newest message at subscription time, so a fresh client
+# doesn't replay the whole history; pass 0 to really start from the beginning
+async def subscriber_events(broker: ChatBroker, subscriber: Subscriber, after_id: Optional[int],
+                            heartbeat: float = CHAT_PUSH_HEARTBEAT):
+    if after_id is None:
+        # resolved after subscribing, so a message committed in between is caught up or arrives live
+        after_id = await asyncio.to_thread(_latest_id, broker.session_factory, subscriber.gid)
+    last_id = after_id
+    recent = deque(maxlen=CHAT_PUSH_QUEUE_SIZE * 2)  # ids already sent, live events can repeat caught-up ones
+    catch_up = True
+    while True:
+        if catch_up or subscriber.overflowed:
+            subscriber.overflowed = False
+            catch_up = False
+            more = True
+            while more:
+                page, more = await asyncio.to_thread(_messages_after, broker.session_factory, subscriber.gid,
+                                                     last_id)
+                for event in page:
+                    recent.append(event["id"])
+                    last_id = max(last_id, event["id"])
+                    yield event
+
+        try:
+            event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+        except asyncio.TimeoutError:
+            yield HEARTBEAT
+            continue
+        if event is RESYNC:
+            continue
+        if event["id"] in recent:
+            continue
+        recent.append(event["id"])
+        last_id = max(last_id, event["id"])
+        yield event
+
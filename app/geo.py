@@ -0,0 +1,32 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+# bounding box (min_lon, min_lat, max_lon, max_lat) around a point for a radius in miles
+def bounding_box(lat: float, lng: float, max_distance: float):
+    lat_delta = max_distance / 69.0
+    lon_delta = max_distance / (69.0 * math.cos(math.radians(lat)))
+    return lng - lon_delta, lat - lat_delta, lng + lon_delta, lat + lat_delta
+
+
+# haversine distance in miles from one point to arrays of points
+def haversine_miles(lat, lng, lats, lngs):
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    d_lat = lat2 - lat1
+    d_lon = np.radians(lngs) - math.radians(lng)
+    a = np.sin(d_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+# pairwise haversine distances in miles between every pair of points, as one broadcast operation
+def haversine_matrix(lats, lngs):
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    d_lat = lat[:, None] - lat[None, :]
+    d_lon = lng[:, None] - lng[None, :]
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arctan2(np.sqrt(a), np.sqrt(np.clip(1 - a, 0, None)))
@@ -5,3 +5,110 @@ DB_NAME = "vacation_planner"
 FB_ACC_PATH = "C:/Users/ryanh/Downloads/vacation-698a8-firebase-adminsdk-fbsvc-61dc104cf9.json"
 MAPBOX_PRIVATE_TOKEN = "KEY"
 MAPBOX_PUBLIC_TOKEN = "KEY_GOES_HERE"
+
+# landmark search fan-out
+MAPBOX_SEARCHBOX_URL = "https://api.mapbox.com/search/searchbox/v1/forward"  # point at bench/fake_searchbox.py to benchmark offline
+MAPBOX_MAX_IN_FLIGHT = 16  # cap on concurrent Searchbox requests per trip
+MAPBOX_QUERY_TIMEOUT = 5.0  # seconds before a single query is given up on, counted from when it is sent
+MAPBOX_FETCH_DEADLINE = 8.0  # seconds a trip's whole fan-out may take, queueing included; late queries are dropped
+
+# landmark search cache
+LANDMARK_CACHE_TTL = 6 * 60 * 60  # seconds a cached Searchbox response stays valid
+LANDMARK_CACHE_MAX_ENTRIES = 5000  # in-process LRU size
+LANDMARK_CACHE_GEOHASH_PRECISION = 6  # ~1.2km x 0.6km tiles
+LANDMARK_CACHE_PERSIST = False  # also keep entries in the landmark_cache table, shared across workers
+LANDMARK_CACHE_PURGE_INTERVAL = 60 * 60  # seconds between deletes of expired landmark_cache rows
+
+# where landmarks come from: "mapbox" or "local" (a POI file built with python -m app.poi_index)
+LANDMARK_PROVIDER = "mapbox"
+LOCAL_POI_PATH = "data/pois.npy"
+LOCAL_POI_CELL_DEG = 0.1  # grid cell size of the local spatial index, in degrees
+
+# landmark candidate scoring: score = relevance weight * relevance - distance weight * (distance / max distance)
+LANDMARK_RELEVANCE_WEIGHT = 1.0
+LANDMARK_DISTANCE_WEIGHT = 0.5
+LANDMARK_SELECTION_RANDOMNESS = 0.3  # weight of the random term added to each score when picking landmarks
+
+# near-duplicate landmark merging
+LANDMARK_DEDUP_DISTANCE = 0.05  # miles (~80m) within which two similarly named candidates are the same place
+LANDMARK_DEDUP_NAME_SIMILARITY = 0.8  # difflib ratio above which normalized names count as similar
+LANDMARK_DEDUP_WORD_OVERLAP = 0.6  # shared fraction of all words above which normalized names count as similar
+
+# background trip generation
+TRIP_JOB_WORKERS = 4  # trips generated at once per api worker
+TRIP_JOB_MAX_PER_USER = 2  # queued + running jobs a single user may have
+TRIP_JOB_LEASE = 60  # seconds a job stays claimed by its api worker without a heartbeat
+TRIP_JOB_HEARTBEAT = 15  # seconds between lease renewals and sweeps for jobs whose worker went away
+TRIP_JOB_MAX_ATTEMPTS = 2  # runs a job gets before a lost worker fails it instead of requeueing it
+MAX_TRIP_BATCH = 5  # alternatives one generate_trip_batch call may create
+
+# itinerary ordering
+ITINERARY_TIME_BUDGET = 0.05  # seconds of 2-opt/or-opt improvement per route
+
+# pre-warming candidate pools for popular locations
+PREWARM_ENABLED = False  # run the pre-warm scheduler inside the api (or run python -m app.prewarm on its own)
+PREWARM_INTERVAL = 60 * 60  # seconds between refresh cycles
+PREWARM_TOP_TILES = 20  # most frequent trip tiles warmed each cycle
+PREWARM_TRIP_WINDOW = 5000  # most recent trips mined for popular tiles
+PREWARM_CONCURRENCY = 2  # tiles refreshed at once
+PREWARM_QUERY_BUDGET = 300  # Searchbox requests a single cycle may spend
+PREWARM_RADIUS = 50.0  # miles, the app's default trip radius
+
+# shared external HTTP client (Mapbox)
+HTTP_CONNECT_TIMEOUT = 3.05  # seconds
+HTTP_READ_TIMEOUT = 5.0  # seconds
+HTTP_POOL_SIZE = MAPBOX_MAX_IN_FLIGHT  # keep-alive connections per host
+HTTP_MAX_RETRIES = 2  # retries on 429/5xx and connection errors
+HTTP_BACKOFF_BASE = 0.2  # seconds, doubled each retry with full jitter
+HTTP_BACKOFF_MAX = 2.0  # seconds
+HTTP_BREAKER_THRESHOLD = 5  # consecutive failures that open the circuit
+HTTP_BREAKER_COOLDOWN = 30.0  # seconds the circuit stays open before a trial request
+
+# instrumentation
+LOG_LEVEL = "WARNING"  # DEBUG logs every trip generation stage as JSON lines, INFO logs summaries
+
+# normalized trip landmarks and "trips near me"
+TRIP_LANDMARK_CELL_DEG = 0.1  # grid cell of the trip_landmarks index, in degrees; changing it needs the cells rebuilt
+NEARBY_TRIPS_PAGE_SIZE = 20
+NEARBY_TRIPS_MAX_PAGE_SIZE = 100
+
+# incremental trip edits
+TRIP_PATCH_MAX_OPS = 50
+
+# group trip listings
+TRIP_LIST_PAGE_SIZE = 50
+TRIP_LIST_MAX_PAGE_SIZE = 200
+
+# chat unread summary
+UNREAD_COUNT_CAP = 100  # unread counts stop here (shown as 99+), so a long-ignored chat costs no more than this
+MESSAGE_PREVIEW_CHARS = 80
+
+# chat sync paging
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_MAX_PAGE_SIZE = 200
+
+# chat push (WebSocket/SSE) fan-out over Postgres LISTEN/NOTIFY
+CHAT_PUSH_CHANNEL = "chat_messages"
+CHAT_PUSH_QUEUE_SIZE = 100  # pending messages per subscriber before it falls back to catching up from the db
+CHAT_PUSH_HEARTBEAT = 15.0  # seconds of silence before a heartbeat is sent
+
+# group commit for send_message: concurrent sends are written together in one INSERT and one commit
+MESSAGE_GROUP_COMMIT = False
+MESSAGE_GROUP_COMMIT_WINDOW = 0.005  # seconds the first send of a batch waits for others to join
+MESSAGE_GROUP_COMMIT_MAX_BATCH = 100  # a batch this full is written without waiting out the window
+
+# messages partitioning and cold-history compaction
+MESSAGE_MAINTENANCE_ENABLED = True  # run it inside the api (every worker, compaction is locked to one at a time)
+MESSAGE_MAINTENANCE_INTERVAL = 6 * 60 * 60  # seconds between maintenance cycles
+MESSAGE_PARTITION_MONTHS_AHEAD = 2  # month partitions kept ready past the current month
+MESSAGE_ARCHIVE_AFTER_MONTHS = 6  # month partitions older than this are compacted into message_archive
+
+# chat full-text search
+MESSAGE_SEARCH_CONFIG = "english"  # text search configuration of messages.search_vector
+MESSAGE_SEARCH_PAGE_SIZE = 20
+MESSAGE_SEARCH_MAX_PAGE_SIZE = 100
+MESSAGE_SEARCH_RANK_WINDOW = 1000  # newest matches ranked per search, bounds the cost of very common words
+MESSAGE_SEARCH_START_SEL = "\x02"  # STX before each matched word in a snippet, never left in message text
+MESSAGE_SEARCH_STOP_SEL = "\x03"  # ETX after it
+MESSAGE_SEARCH_HEADLINE = (f"StartSel={MESSAGE_SEARCH_START_SEL}, StopSel={MESSAGE_SEARCH_STOP_SEL}, "
+                           "MaxWords=24, MinWords=8, MaxFragments=2")  # ts_headline options
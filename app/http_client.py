@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.global_vars import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_SIZE, HTTP_MAX_RETRIES, \
+    HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, HTTP_BREAKER_THRESHOLD, HTTP_BREAKER_COOLDOWN
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+# closed -> open after `threshold` consecutive failures, open -> half_open after `cooldown` seconds,
+# half_open lets a single trial request through which closes the circuit again or re-opens it
+class CircuitBreaker:
+    def __init__(self, threshold: int = HTTP_BREAKER_THRESHOLD, cooldown: float = HTTP_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+# process-wide client for external APIs: one keep-alive connection pool, explicit connect/read timeouts,
+# jittered exponential retry on 429/5xx and connection errors, and a circuit breaker that fails fast
+# while the upstream is degraded
+class ExternalHttpClient:
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE, connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = HTTP_READ_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES,
+                 breaker: CircuitBreaker = None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=False, max_retries=0)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0, "in_flight": 0,
+                          "max_in_flight": 0}
+
+    def _count(self, name: str, delta: int = 1):
+        with self._lock:
+            self._counters[name] += delta
+            if name == "in_flight":
+                self._counters["max_in_flight"] = max(self._counters["max_in_flight"], self._counters["in_flight"])
+
+    @staticmethod
+    def _backoff(attempt: int, res=None) -> float:
+        retry_after = res.headers.get("Retry-After") if res is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_BACKOFF_MAX)
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt))
+
+    # GET with retries, never sleeping past the optional monotonic deadline
+    # raises CircuitOpenError when the breaker is open, otherwise returns the last response or raises its error
+    def get(self, url: str, deadline: float = None, **kwargs):
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError("Circuit open, not calling upstream")
+
+            self._count("requests")
+            self._count("in_flight")
+            res, error = None, None
+            try:
+                res = self.session.get(url, timeout=self.timeout, **kwargs)
+            except Exception as e:
+                # anything, not just RequestException: a half-open trial that dies any other way must still
+                # report back, or the breaker would wait for it forever
+                error = e
+            finally:
+                self._count("in_flight", -1)
+
+            # 429 is the quota talking, the upstream itself is answering fine
+            if error is not None or res.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if error is None and res.status_code not in RETRY_STATUSES:
+                return res
+            self._count("failures")
+
+            retryable = error is None or isinstance(error, (requests.ConnectionError, requests.Timeout))
+            delay = self._backoff(attempt, res)
+            if (not retryable or attempt >= self.max_retries
+                    or (deadline is not None and time.monotonic() + delay >= deadline)):
+                if error is not None:
+                    raise error
+                return res
+            attempt += 1
+            self._count("retries")
+            time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        host_pools = self.adapter.poolmanager.pools
+        pools = [host_pools[key] for key in host_pools.keys()]
+        stats["pool"] = {
+            "hosts": len(pools),
+            "max_size": self.adapter._pool_maxsize,
+            "connections_opened": sum(pool.num_connections for pool in pools),
+            "idle": sum(1 for pool in pools if pool.pool is not None for conn in list(pool.pool.queue) if conn),
+        }
+        stats["breaker"] = {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "times_opened": self.breaker.times_opened,
+        }
+        return stats
+
+
+# the one client every Mapbox call goes through
+mapbox_client = ExternalHttpClient()
@@ -0,0 +1,156 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from app.global_vars import LOG_LEVEL
+
+# latency buckets in seconds, from sub-millisecond in-process stages up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(labels)} {value}")
+        return lines
+
+
+# cumulative-bucket histogram in the Prometheus style
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (+inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    # {labels: (sum, count)} for every series
+    def snapshot(self):
+        with self._lock:
+            return {labels: (total, count) for labels, (_, total, count) in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_label_str(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_str(labels)} {total}")
+                lines.append(f"{self.name}_count{_label_str(labels)} {count}")
+        return lines
+
+
+# holds every metric plus collectors, callables returning (name, help, [(labels dict, value)]) gauges
+# for state that lives elsewhere (client pool, cache size)
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    # Prometheus text exposition format
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for fn in self.collectors:
+            try:
+                gauges = fn()
+            except Exception as e:
+                log_event(logging.WARNING, "metrics_collector_failed", error=str(e))
+                continue
+            for name, help_text, samples in gauges:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_label_str(tuple(sorted(labels.items())))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram("trip_stage_seconds", "Latency of each trip generation stage")
+EXTERNAL_QUERY_SECONDS = REGISTRY.histogram("external_query_seconds", "Latency of single upstream queries")
+EXTERNAL_QUERIES = REGISTRY.counter("external_queries_total", "Upstream queries by provider and outcome")
+DUPLICATES_REMOVED = REGISTRY.counter("landmark_duplicates_removed_total", "Near-duplicate candidates merged")
+TRIPS_GENERATED = REGISTRY.counter("trips_generated_total", "Trips generated by endpoint mode")
+MESSAGE_BATCH_SIZE = REGISTRY.histogram("message_group_commit_batch_size", "Messages written per group commit",
+                                        buckets=(1, 2, 5, 10, 25, 50, 100, 250))
+
+
+# time a block of the pipeline into trip_stage_seconds{stage=...}
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+logger = logging.getLogger("vacation_planner")
+logger.setLevel(LOG_LEVEL)
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+
+# structured log line {"event": ..., **fields}; the level check comes first so disabled levels cost a
+# single comparison and nothing gets formatted
+def log_event(level: int, event: str, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({"event": event, **fields}, default=str))
+
+
+def debug_enabled() -> bool:
+    return logger.isEnabledFor(logging.DEBUG)
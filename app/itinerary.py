@@ -0,0 +1,104 @@
+import time
+
+import numpy as np
+
+from app.geo import haversine_matrix
+from app.global_vars import ITINERARY_TIME_BUDGET
+
+_EPS = 1e-9
+
+
+# nearest-neighbour route from path[0] through every node in nodes
+def _nearest_neighbour(dist, first, nodes):
+    path = [first]
+    remaining = set(nodes) - {first}
+    while remaining:
+        row = dist[path[-1]]
+        nxt = min(remaining, key=lambda n: row[n])
+        path.append(nxt)
+        remaining.discard(nxt)
+    return path
+
+
+# best segment reversal path[i..j]; both ends of the path stay put
+def _two_opt_step(dist, path) -> bool:
+    n = len(path)
+    p = np.asarray(path)
+    for i in range(1, n - 2):
+        js = np.arange(i + 1, n - 1)
+        a, b = p[i - 1], p[i]
+        c, d = p[js], p[js + 1]
+        delta = dist[a, c] + dist[b, d] - dist[a, b] - dist[c, d]
+        best = int(np.argmin(delta))
+        if delta[best] < -_EPS:
+            j = int(js[best])
+            path[i:j + 1] = path[i:j + 1][::-1]
+            return True
+    return False
+
+
+# best move of a 1-3 stop segment (optionally reversed) to another place in the path
+def _or_opt_step(dist, path) -> bool:
+    n = len(path)
+    for length in (1, 2, 3):
+        for i in range(1, n - length):
+            seg = path[i:i + length]
+            prev, nxt = path[i - 1], path[i + length]
+            gain = dist[prev, seg[0]] + dist[seg[-1], nxt] - dist[prev, nxt]
+            if gain <= _EPS:
+                continue
+            rest = np.asarray(path[:i] + path[i + length:])
+            left, right = rest[:-1], rest[1:]  # insert between left[k] and right[k]
+            base = dist[left, right]
+            forward = dist[left, seg[0]] + dist[seg[-1], right] - base
+            backward = dist[left, seg[-1]] + dist[seg[0], right] - base
+            k_f, k_b = int(np.argmin(forward)), int(np.argmin(backward))
+            if min(forward[k_f], backward[k_b]) < gain - _EPS:
+                k, new_seg = (k_f, seg) if forward[k_f] <= backward[k_b] else (k_b, seg[::-1])
+                rest = rest.tolist()
+                path[:] = rest[:k + 1] + new_seg + rest[k + 1:]
+                return True
+    return False
+
+
+# order stops into a short open route: nearest-neighbour construction, then 2-opt and or-opt
+# improvement until nothing improves or time_budget seconds have passed
+# stops are dicts with lat/long; if start is given as (lat, long) the route begins there
+# returns (ordered stops, route length in miles)
+def order_stops(stops, start=None, time_budget: float = ITINERARY_TIME_BUDGET):
+    if len(stops) < 2 and start is None:
+        return list(stops), 0.0
+    deadline = time.perf_counter() + time_budget
+
+    lats = [s["lat"] for s in stops]
+    lngs = [s["long"] for s in stops]
+    if start is not None:
+        lats.insert(0, start[0])
+        lngs.insert(0, start[1])
+    real = haversine_matrix(lats, lngs)
+
+    # virtual end node (and virtual start node when there is no start point) with zero distance to
+    # everything, so the open route becomes a path with fixed ends and the moves need no edge cases
+    offset = 0 if start is not None else 1
+    size = len(real) + offset + 1
+    dist = np.zeros((size, size))
+    dist[offset:offset + len(real), offset:offset + len(real)] = real
+    first_stop = 1
+    stop_nodes = list(range(first_stop, first_stop + len(stops)))
+    end = size - 1
+
+    if start is not None:
+        path = _nearest_neighbour(dist, 0, [0] + stop_nodes)
+    else:
+        # start from the stop furthest from everything else, one end of the spread
+        first = stop_nodes[int(np.argmax(real.sum(axis=1)))]
+        path = [0] + _nearest_neighbour(dist, first, stop_nodes)
+    path.append(end)
+
+    while time.perf_counter() < deadline:
+        if not (_two_opt_step(dist, path) or _or_opt_step(dist, path)):
+            break
+
+    p = np.asarray(path)
+    length = float(dist[p[:-1], p[1:]].sum())
+    return [stops[node - first_stop] for node in path[1:-1]], length
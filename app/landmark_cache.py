@@ -0,0 +1,209 @@
+import datetime
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app.global_vars import LANDMARK_CACHE_TTL, LANDMARK_CACHE_MAX_ENTRIES, LANDMARK_CACHE_GEOHASH_PRECISION, \
+    LANDMARK_CACHE_PURGE_INTERVAL
+from app.instrumentation import log_event
+from app.models import LandmarkCacheEntry
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+# standard geohash of a point, used as the cache tile
+def geohash(lat: float, lng: float, precision: int = LANDMARK_CACHE_GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits = bits << 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+# cache key for one search term around a point
+def cache_key(lat: float, lng: float, search_query: str, max_distance: float) -> str:
+    return f"{geohash(lat, lng)}|{search_query.strip().lower()}|{round(float(max_distance), 1)}"
+
+
+# optional second tier backed by the landmark_cache table so entries survive restarts
+class PostgresCacheTier:
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+
+    def get_many(self, keys, min_ttl: float = 0):
+        if not keys:
+            return {}
+        now = datetime.datetime.utcnow()
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(LandmarkCacheEntry.key, LandmarkCacheEntry.features, LandmarkCacheEntry.expires_at)
+                .filter(LandmarkCacheEntry.key.in_(keys),
+                        LandmarkCacheEntry.expires_at > now + datetime.timedelta(seconds=min_ttl))
+                .all()
+            )
+        finally:
+            db.close()
+        return {key: (features, (expires_at - now).total_seconds()) for key, features, expires_at in rows}
+
+    def set_many(self, entries, ttl: float):
+        if not entries:
+            return
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl)
+        stmt = insert(LandmarkCacheEntry).values(
+            [{"key": key, "features": features, "expires_at": expires_at} for key, features in entries.items()]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LandmarkCacheEntry.key],
+            set_={"features": stmt.excluded.features, "expires_at": stmt.excluded.expires_at},
+        )
+        db = self.session_factory()
+        try:
+            db.execute(stmt)
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self):
+        db = self.session_factory()
+        try:
+            deleted = (
+                db.query(LandmarkCacheEntry)
+                .filter(LandmarkCacheEntry.expires_at <= datetime.datetime.utcnow())
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+        return deleted
+
+
+# in-process LRU of Searchbox features with a TTL, optionally backed by a persistent tier
+class LandmarkCache:
+    def __init__(self, ttl: float = LANDMARK_CACHE_TTL, max_entries: int = LANDMARK_CACHE_MAX_ENTRIES,
+                 persistent=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self._entries = OrderedDict()  # key -> (expires at, features)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _put_local(self, key, features, ttl):
+        self._entries[key] = (time.monotonic() + ttl, features)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # look up many keys at once, returns only the ones that are cached and fresh
+    # entries expiring within min_ttl seconds are treated as missing, which is how the pre-warmer refreshes ahead
+    def get_many(self, keys, min_ttl: float = 0):
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    missing.append(key)
+                elif entry[0] <= now:
+                    del self._entries[key]
+                    missing.append(key)
+                elif entry[0] <= now + min_ttl:
+                    missing.append(key)
+                else:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+
+        if missing and self.persistent is not None:
+            try:
+                persisted = self.persistent.get_many(missing, min_ttl)
+            except Exception as e:
+                log_event(logging.WARNING, "landmark_cache_lookup_failed", error=str(e))
+                persisted = {}
+            with self._lock:
+                for key, (features, remaining) in persisted.items():
+                    self._put_local(key, features, remaining)
+                    found[key] = features
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, entries):
+        if not entries:
+            return
+        with self._lock:
+            for key, features in entries.items():
+                self._put_local(key, features, self.ttl)
+        if self.persistent is not None:
+            try:
+                self.persistent.set_many(entries, self.ttl)
+            except Exception as e:
+                log_event(logging.WARNING, "landmark_cache_write_failed", error=str(e))
+
+    # drop expired entries, here and in the persistent tier, returns how many persisted rows were deleted
+    # lookups only skip expired rows, so without this the landmark_cache table grows forever
+    def purge_expired(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            for key in [key for key, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[key]
+        if self.persistent is None:
+            return 0
+        return self.persistent.purge_expired()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# purges the cache every interval seconds, for apis that persist it without running the prewarm scheduler
+# (whose cycle purges it too)
+class CachePurger:
+    def __init__(self, cache, interval: float = LANDMARK_CACHE_PURGE_INTERVAL):
+        self.cache = cache
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                log_event(logging.INFO, "landmark_cache_purged", deleted=self.cache.purge_expired())
+            except Exception as e:
+                log_event(logging.ERROR, "landmark_cache_purge_failed", error=str(e))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="landmark-cache-purge", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
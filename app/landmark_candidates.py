@@ -0,0 +1,79 @@
+import re
+
+import numpy as np
+
+from app.geo import bounding_box, haversine_miles
+from app.global_vars import LANDMARK_RELEVANCE_WEIGHT, LANDMARK_DISTANCE_WEIGHT
+
+# Define a list of unwanted terms that should be filtered out from landmark names
+UNWANTED_WORDS = ["street", "drive", "way", "avenue", "road", "development", "developments", "residential",
+                  "commercial", "office", "plaza", "mall", "complex", "apartment", "lane", "parkway", "court",
+                  "common", "commons", "place"]
+_UNWANTED_PATTERN = re.compile("|".join(re.escape(word) for word in UNWANTED_WORDS))
+
+
+# check if a name contains unwanted terms
+def is_unwanted(name: str) -> bool:
+    return _UNWANTED_PATTERN.search(name.lower()) is not None
+
+
+# pull coordinates, relevance and names out of Searchbox features into flat arrays
+def features_to_arrays(features, default_name: str):
+    n = len(features)
+    lats = np.full(n, np.nan)
+    lngs = np.full(n, np.nan)
+    relevance = np.zeros(n)
+    names = []
+    for i, feat in enumerate(features):
+        coords = (feat.get("geometry") or {}).get("coordinates")
+        prop = feat.get("properties") or {}
+        names.append(prop.get("name", default_name))
+        if not coords or len(coords) < 2:
+            continue  # left as NaN and dropped by the filter
+        try:
+            lngs[i] = float(coords[0])
+            lats[i] = float(coords[1])
+        except (TypeError, ValueError):
+            continue
+        try:
+            relevance[i] = float(prop.get("relevance", 0))
+        except (TypeError, ValueError):
+            pass
+    return lats, lngs, relevance, names
+
+
+# turn one category's features into scored candidate dicts in a single batched pass
+# drops invalid coordinates, anything outside the bbox/radius and unwanted names
+def build_candidates(lat: float, lng: float, max_distance: float, category: str, features):
+    if not features:
+        return []
+    lats, lngs, relevance, names = features_to_arrays(features, category)
+
+    # cheap bbox test first, the haversine only runs on what is left
+    min_lon, min_lat, max_lon, max_lat = bounding_box(lat, lng, max_distance)
+    keep = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lon) & (lngs <= max_lon))
+    distances = haversine_miles(lat, lng, lats[keep], lngs[keep])
+    in_radius = distances <= max_distance
+    keep = keep[in_radius]
+    distances = distances[in_radius]
+
+    scores = LANDMARK_RELEVANCE_WEIGHT * relevance[keep]
+    if max_distance > 0:
+        scores = scores - LANDMARK_DISTANCE_WEIGHT * (distances / max_distance)
+
+    landmark_type = "Park" if category == "Parks" else category  # Special case for "Parks"
+    candidates = []
+    for i, dist, score in zip(keep.tolist(), distances.tolist(), scores.tolist()):
+        name = names[i]
+        if is_unwanted(name):
+            continue
+        candidates.append({
+            "name": name,
+            "lat": float(lats[i]),
+            "long": float(lngs[i]),
+            "type": landmark_type,
+            "relevance": float(relevance[i]),
+            "distance": dist,
+            "score": score,
+        })
+    return candidates
@@ -0,0 +1,99 @@
+import math
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from app.global_vars import LANDMARK_DEDUP_DISTANCE, LANDMARK_DEDUP_NAME_SIMILARITY, LANDMARK_DEDUP_WORD_OVERLAP
+
+_NAME_STOPWORDS = {"the", "of", "and", "at", "a", "an"}
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]+")
+
+
+# lowercase, strip accents and punctuation and drop filler words so "The Museum of Art" ~ "museum art"
+def normalize_name(name: str) -> str:
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii").lower()
+    name = _NON_ALNUM.sub(" ", name.replace("&", " and "))
+    return " ".join(word for word in name.split() if word not in _NAME_STOPWORDS)
+
+
+def names_similar(a: str, b: str, threshold: float = LANDMARK_DEDUP_NAME_SIMILARITY,
+                  overlap: float = LANDMARK_DEDUP_WORD_OVERLAP) -> bool:
+    if a == b:
+        return True
+    if not a or not b:
+        return False
+    words_a, words_b = set(a.split()), set(b.split())
+    if len(words_a & words_b) / len(words_a | words_b) >= overlap:
+        return True  # "art institute" vs "art institute chicago", but not "cafe" vs "blue cafe"
+    return SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+# short-range distance in miles, accurate enough at dedup scale
+def _close_distance(lat1, lon1, lat2, lon2):
+    dy = (lat2 - lat1) * 69.09
+    dx = (lon2 - lon1) * 69.09 * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(dx, dy)
+
+
+# grid of kept candidates, cells about one threshold wide so a lookup only visits the 3x3 neighbourhood
+# ref_lat is the most poleward latitude expected, which keeps the columns from being too narrow
+class NearDuplicateGrid:
+    def __init__(self, ref_lat: float, max_distance: float = LANDMARK_DEDUP_DISTANCE,
+                 name_threshold: float = LANDMARK_DEDUP_NAME_SIMILARITY):
+        self.max_distance = max_distance
+        self.name_threshold = name_threshold
+        self.cell_lat = max_distance / 69.09
+        self.cell_lon = self.cell_lat / max(math.cos(math.radians(min(abs(ref_lat), 89.0))), 0.01)
+        self.cells = {}  # (row, col) -> list of kept [candidate, category, normalized name]
+
+    def _cell(self, candidate):
+        return int(math.floor(candidate["lat"] / self.cell_lat)), int(math.floor(candidate["long"] / self.cell_lon))
+
+    # kept entry that is the same place as candidate, or None
+    def find(self, candidate, normalized: str = None):
+        if normalized is None:
+            normalized = normalize_name(candidate["name"])
+        row, col = self._cell(candidate)
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                for kept in self.cells.get((row + d_row, col + d_col), ()):
+                    other = kept[0]
+                    if (_close_distance(candidate["lat"], candidate["long"], other["lat"], other["long"])
+                            <= self.max_distance and names_similar(normalized, kept[2], self.name_threshold)):
+                        return kept
+        return None
+
+    def add(self, candidate, category: str, normalized: str = None):
+        if normalized is None:
+            normalized = normalize_name(candidate["name"])
+        self.cells.setdefault(self._cell(candidate), []).append([candidate, category, normalized])
+
+    def entries(self):
+        for kept_in_cell in self.cells.values():
+            yield from kept_in_cell
+
+
+# merge candidates that are the same place found through different search terms of one category
+# of every duplicate pair the higher score is kept, in roughly linear time thanks to the grid
+# categories are merged separately: a place found as both a museum and an art gallery stays in both pools,
+# since merging it into one would take it away from the other category's quota, possibly its only candidate;
+# select_landmarks keeps it from being picked twice
+# returns the deduplicated {category: candidates} and how many duplicates were removed
+def merge_near_duplicates(candidates_per_category, max_distance: float = LANDMARK_DEDUP_DISTANCE,
+                          name_threshold: float = LANDMARK_DEDUP_NAME_SIMILARITY):
+    max_abs_lat = max((abs(c["lat"]) for cands in candidates_per_category.values() for c in cands), default=0.0)
+    deduped = {}
+    removed = 0
+    for cat, candidates in candidates_per_category.items():
+        grid = NearDuplicateGrid(max_abs_lat, max_distance, name_threshold)
+        for candidate in candidates:
+            normalized = normalize_name(candidate["name"])
+            duplicate = grid.find(candidate, normalized)
+            if duplicate is None:
+                grid.add(candidate, cat, normalized)
+                continue
+            removed += 1
+            if candidate["score"] > duplicate[0]["score"]:
+                duplicate[0] = candidate
+        deduped[cat] = [candidate for candidate, _, _ in grid.entries()]
+    return deduped, removed
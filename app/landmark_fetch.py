@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.global_vars import MAPBOX_PUBLIC_TOKEN, MAPBOX_MAX_IN_FLIGHT, MAPBOX_QUERY_TIMEOUT, MAPBOX_SEARCHBOX_URL, \
+    MAPBOX_FETCH_DEADLINE
+from app.http_client import mapbox_client
+from app.instrumentation import EXTERNAL_QUERIES, EXTERNAL_QUERY_SECONDS, log_event
+
+# worker threads for the blocking requests calls, shared by every trip being generated
+_executor = ThreadPoolExecutor(max_workers=MAPBOX_MAX_IN_FLIGHT, thread_name_prefix="mapbox")
+
+
+# build the Searchbox url for one search term
+def build_search_url(search_query: str, lat: float, lng: float, bbox: str, limit: int = 10) -> str:
+    encoded_query = urllib.parse.quote(search_query)  # URL encode the search term
+    return (
+        f"{MAPBOX_SEARCHBOX_URL}?q={encoded_query}"
+        f"&types=poi&proximity={lng},{lat}&bbox={bbox}&limit={limit}"
+        f"&access_token={MAPBOX_PUBLIC_TOKEN}"
+    )
+
+
+# single blocking request through the shared client, returns the features or None if Mapbox answered with an error
+def _fetch_features(url: str, timeout: float):
+    res = mapbox_client.get(url, deadline=time.monotonic() + timeout)
+    if res.status_code != 200:
+        log_event(logging.WARNING, "searchbox_error", status=res.status_code)
+        return None
+    return res.json().get("features", [])
+
+
+# run one query under the in-flight cap, giving up timeout seconds after a worker thread picks it up
+# the executor is shared by every trip being generated, so a query can queue behind other trips' queries;
+# that wait is bounded by iter_fetch's deadline, which cancels the query if it is still queued by then
+async def _fetch_one(key, url: str, semaphore: asyncio.Semaphore, timeout: float):
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        picked_up = asyncio.Event()
+
+        def fetch():
+            loop.call_soon_threadsafe(picked_up.set)
+            return _fetch_features(url, timeout)
+
+        future = loop.run_in_executor(_executor, fetch)
+        try:
+            await picked_up.wait()
+        except asyncio.CancelledError:
+            future.cancel()  # takes it off the executor's queue if no thread has started it
+            raise
+        started = time.perf_counter()
+        try:
+            features = await asyncio.wait_for(future, timeout)
+            outcome = "ok" if features is not None else "error"
+        except asyncio.TimeoutError:
+            log_event(logging.WARNING, "searchbox_timeout", key=key, timeout=timeout)
+            features, outcome = None, "timeout"
+        except (requests.RequestException, ValueError) as e:
+            log_event(logging.WARNING, "searchbox_failed", key=key, error=str(e))
+            features, outcome = None, "error"
+        EXTERNAL_QUERY_SECONDS.observe(time.perf_counter() - started, provider="mapbox")
+        EXTERNAL_QUERIES.inc(provider="mapbox", outcome=outcome)
+    return key, features
+
+
+# send every (key, url) query at once and yield (key, features) as each one finishes
+# features is None for queries that failed or timed out; whatever hasn't finished deadline seconds in, queued or
+# not, is cancelled and yielded as None too, so a trip's fan-out never takes longer than deadline
+async def iter_fetch(queries, max_in_flight: int = MAPBOX_MAX_IN_FLIGHT, timeout: float = MAPBOX_QUERY_TIMEOUT,
+                     deadline: float = MAPBOX_FETCH_DEADLINE):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    keys = {asyncio.ensure_future(_fetch_one(key, url, semaphore, timeout)): key for key, url in queries}
+    pending = set(keys)
+    give_up = loop.time() + deadline
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(give_up - loop.time(), 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if pending:
+        log_event(logging.WARNING, "searchbox_deadline", deadline=deadline, dropped=len(pending))
+        EXTERNAL_QUERIES.inc(len(pending), provider="mapbox", outcome="timeout")
+        for task in pending:
+            yield keys[task], None
+
+
+# collect whatever came back in time
+# keys that failed or timed out are left out, so callers get partial results instead of an error
+async def fetch_all(queries, max_in_flight: int = MAPBOX_MAX_IN_FLIGHT, timeout: float = MAPBOX_QUERY_TIMEOUT,
+                    deadline: float = MAPBOX_FETCH_DEADLINE):
+    results = {}
+    async for key, features in iter_fetch(queries, max_in_flight, timeout, deadline):
+        if features is not None:
+            results[key] = features
+    return results
+
+
+# blocking entry point for sync callers such as the generate_trip endpoint
+def fetch_all_sync(queries, max_in_flight: int = MAPBOX_MAX_IN_FLIGHT, timeout: float = MAPBOX_QUERY_TIMEOUT,
+                   deadline: float = MAPBOX_FETCH_DEADLINE):
+    return asyncio.run(fetch_all(queries, max_in_flight, timeout, deadline))
@@ -0,0 +1,133 @@
+import json
+import logging
+
+from app.global_vars import LANDMARK_PROVIDER, LOCAL_POI_PATH
+from app.instrumentation import DUPLICATES_REMOVED, log_event, span, debug_enabled
+from app.landmark_cache import LandmarkCache
+from app.landmark_candidates import build_candidates
+from app.landmark_dedup import NearDuplicateGrid, merge_near_duplicates
+from app.landmark_providers import MapboxLandmarkProvider, LocalLandmarkProvider
+from app.landmark_selection import select_landmarks
+from app.single_flight import SingleFlight
+
+# Searchbox responses keyed by location tile, search term and radius
+# routers/trips.py adds the landmark_cache table tier when LANDMARK_CACHE_PERSIST
+landmark_cache = LandmarkCache()
+
+# Where candidate landmarks come from, see LANDMARK_PROVIDER in global_vars
+if LANDMARK_PROVIDER == "local":
+    landmark_provider = LocalLandmarkProvider(LOCAL_POI_PATH)
+else:
+    landmark_provider = MapboxLandmarkProvider(landmark_cache)
+
+# In-progress candidate fetches, shared by identical concurrent requests
+candidate_fetches = SingleFlight()
+
+
+# Parse the landmark types and the json category counts sent by the app
+def parse_landmark_request(landmark_types: str, category_counts_str: str):
+    # Parse the landmark types and clean up any extra spaces
+    categories = [cat.strip() for cat in landmark_types.split(",") if cat.strip()]
+
+    # Try parsing the category counts, defaulting to 1 for each category if parsing fails
+    try:
+        category_counts = json.loads(category_counts_str)
+    except Exception as e:
+        log_event(logging.INFO, "category_counts_invalid", error=str(e))
+        category_counts = {cat: 1 for cat in categories}
+
+    # Ensure all specified categories have an entry in category_counts
+    for cat in categories:
+        if cat not in category_counts:
+            category_counts[cat] = 1
+    log_event(logging.DEBUG, "landmark_request", categories=categories, category_counts=category_counts)
+    return categories, category_counts
+
+
+# Drop the scoring fields so only name/lat/long/type is stored and returned
+def public_landmark(candidate: dict) -> dict:
+    return {key: value for key, value in candidate.items() if key not in ("relevance", "distance", "score")}
+
+
+# Key identifying a candidate pool: same spot (to ~10m), same categories and radius
+# category_counts only affects selection, so callers with different counts still share a pool
+def candidate_pool_key(lat: float, lng: float, categories, max_distance: float):
+    return round(lat, 4), round(lng, 4), tuple(sorted(set(categories))), round(float(max_distance), 1)
+
+
+# Scored, deduplicated candidates for every category, before any selection
+def fetch_candidates(lat: float, lng: float, categories, max_distance: float):
+    # Initialize a dictionary to store candidate landmarks for each category
+    candidates_per_category = {cat: [] for cat in categories}
+
+    # Raw features for every category from the configured provider (Mapbox or the local POI file)
+    with span("provider_search"):
+        features_by_category = landmark_provider.search(lat, lng, max_distance, categories)
+
+    with span("filter"):
+        for cat in categories:
+            # Distance/bbox/radius filtering and scoring run over the whole response at once
+            candidates_per_category[cat] = build_candidates(lat, lng, max_distance, cat,
+                                                            features_by_category.get(cat, []))
+
+    # The same place often comes back under several search terms with slightly different names or coordinates
+    with span("dedup"):
+        candidates_per_category, duplicates_removed = merge_near_duplicates(candidates_per_category)
+    DUPLICATES_REMOVED.inc(duplicates_removed)
+    if debug_enabled():
+        log_event(logging.DEBUG, "candidates",
+                  features={cat: len(features) for cat, features in features_by_category.items()},
+                  candidates={cat: len(c) for cat, c in candidates_per_category.items()},
+                  duplicates_removed=duplicates_removed)
+    return candidates_per_category
+
+
+# Callers asking for the same spot at the same time share one candidate fetch,
+# each still draws its own selection from it
+def get_candidate_pool(lat: float, lng: float, categories, max_distance: float):
+    return candidate_fetches.do(
+        candidate_pool_key(lat, lng, categories, max_distance),
+        lambda: fetch_candidates(lat, lng, categories, max_distance)
+    )
+
+
+def get_landmarks(lat: float, lng: float, landmark_types: str, max_distance: float, num_destinations: int,
+                  category_counts_str: str):
+    with span("parse"):
+        categories, category_counts = parse_landmark_request(landmark_types, category_counts_str)
+
+    candidates_per_category = get_candidate_pool(lat, lng, categories, max_distance)
+
+    # Pick the best scored candidates per category (with some randomness), unique by name and type, never the
+    # same place under two categories (the next candidate fills in), capped to num_destinations
+    with span("selection"):
+        selected_candidates = [
+            public_landmark(c) for c in select_landmarks(candidates_per_category, category_counts, num_destinations)
+        ]
+
+    if debug_enabled():
+        log_event(logging.DEBUG, "landmarks_selected", lat=lat, lng=lng, max_distance=max_distance,
+                  num_destinations=num_destinations, landmarks=[c["name"] for c in selected_candidates])
+    return selected_candidates
+
+
+# Same pipeline as get_landmarks, but yields (category, landmarks) as soon as each category's queries are in
+# Categories are deduplicated against what was already sent and the num_destinations cap is filled in
+# arrival order, since landmarks that have been streamed can't be taken back
+async def stream_landmarks(lat: float, lng: float, landmark_types: str, max_distance: float, num_destinations: int,
+                           category_counts_str: str):
+    with span("parse"):
+        categories, category_counts = parse_landmark_request(landmark_types, category_counts_str)
+    sent = NearDuplicateGrid(abs(lat) + max_distance / 69.0)
+    remaining = num_destinations
+
+    async for cat, features in landmark_provider.search_iter(lat, lng, max_distance, categories):
+        with span("filter"):
+            candidates = build_candidates(lat, lng, max_distance, cat, features)
+        with span("dedup"):
+            candidates, duplicates_removed = merge_near_duplicates({cat: candidates})
+        DUPLICATES_REMOVED.inc(duplicates_removed)
+        with span("selection"):
+            selected = select_landmarks(candidates, category_counts, remaining, seen=sent)
+        remaining -= len(selected)
+        yield cat, [public_landmark(c) for c in selected]
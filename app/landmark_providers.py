@@ -0,0 +1,168 @@
+import abc
+import asyncio
+import logging
+
+from app.geo import bounding_box
+from app.instrumentation import log_event, span
+from app.landmark_cache import cache_key
+from app.landmark_fetch import build_search_url, fetch_all_sync, iter_fetch
+from app.poi_index import PoiIndex
+
+# Mapping for each category to relevant search terms for the API query
+QUERY_MAPPING = {
+    "Food": ["restaurant", "cafe", "diner", "bistro", "eatery", "food", "coffee shop", "grill", "pho", "ramen",
+             "yakitori", "la piazza"],
+    "Parks": ["garden", "botanical garden", "green space", "nature reserve", "trail", "peak", "falls", "orchard"],
+    "Historic": ["historic building", "heritage site", "historical site", "landmark", "old building", "monumental"],
+    "Memorials": ["memorial", "monument", "commemorative", "statue", "cenotaph", "tribute"],
+    "Museums": ["museum", "art gallery", "exhibit", "history museum", "science museum", "cultural center"],
+    "Art": ["art gallery", "exhibit", "showcase", "gallery", "art center", "art museum", "creative space"],
+    "Entertainment": ["cinema", "movie theater", "theater", "amusement", "entertainment", "arcade", "playhouse",
+                      "live performance"]
+}
+
+
+# where get_landmarks gets its raw candidates from
+# search() returns {category: [feature, ...]} with features in the Searchbox GeoJSON shape,
+# search_iter() yields (category, features) as each category becomes available
+class LandmarkProvider(abc.ABC):
+    name = "base"
+
+    @abc.abstractmethod
+    def search(self, lat: float, lng: float, max_distance: float, categories):
+        ...
+
+    async def search_iter(self, lat: float, lng: float, max_distance: float, categories):
+        results = await asyncio.to_thread(self.search, lat, lng, max_distance, categories)
+        for cat in categories:
+            yield cat, results.get(cat, [])
+
+    # upstream queries a search here would send, counting cached entries expiring within min_ttl as stale
+    # providers without a cache have nothing to warm
+    def stale_queries(self, lat: float, lng: float, max_distance: float, categories, min_ttl: float = 0):
+        return {}
+
+    # send the given stale queries and store the results, returns how many came back
+    def refresh(self, queries) -> int:
+        return 0
+
+    # drop expired cache entries, returns how many persisted ones were deleted
+    def purge_expired(self) -> int:
+        return 0
+
+
+# live Searchbox queries, one per search term, served from the cache where possible
+class MapboxLandmarkProvider(LandmarkProvider):
+    name = "mapbox"
+
+    def __init__(self, cache=None):
+        self.cache = cache
+
+    # work out the (category, term) -> cache key mapping, the cache hits and the queries still to send
+    def _plan(self, lat: float, lng: float, max_distance: float, categories, min_ttl: float = 0):
+        bbox = ",".join(str(v) for v in bounding_box(lat, lng, max_distance))
+
+        # one query per (category, search term); terms shared between categories are only sent once
+        keys_by_query = {}
+        for cat in categories:
+            for search_query in QUERY_MAPPING.get(cat, [cat]):  # Use the category name or mapped queries
+                keys_by_query[(cat, search_query)] = cache_key(lat, lng, search_query, max_distance)
+
+        # serve what we can from the cache and only send the misses to Mapbox
+        unique_keys = list(set(keys_by_query.values()))
+        with span("cache_lookup"):
+            features_by_key = self.cache.get_many(unique_keys, min_ttl) if self.cache is not None else {}
+        queries = {}
+        for (cat, search_query), key in keys_by_query.items():
+            if key not in features_by_key and key not in queries:
+                queries[key] = build_search_url(search_query, lat, lng, bbox)
+        log_event(logging.DEBUG, "searchbox_plan", cached=len(features_by_key), queries=len(queries))
+        return keys_by_query, features_by_key, queries
+
+    # features of one category, in search term order; failed or timed out queries are simply missing
+    @staticmethod
+    def _category_features(cat, keys_by_query, features_by_key):
+        features = []
+        for (query_cat, search_query), key in keys_by_query.items():
+            if query_cat != cat:
+                continue
+            for feat in features_by_key.get(key) or []:
+                features.append(_with_default_name(feat, search_query))
+        return features
+
+    def search(self, lat: float, lng: float, max_distance: float, categories):
+        keys_by_query, features_by_key, queries = self._plan(lat, lng, max_distance, categories)
+        fetched = fetch_all_sync(list(queries.items()))
+        if self.cache is not None:
+            self.cache.set_many(fetched)
+        features_by_key.update(fetched)
+        return {cat: self._category_features(cat, keys_by_query, features_by_key) for cat in categories}
+
+    def stale_queries(self, lat: float, lng: float, max_distance: float, categories, min_ttl: float = 0):
+        return self._plan(lat, lng, max_distance, categories, min_ttl)[2]
+
+    def refresh(self, queries) -> int:
+        fetched = fetch_all_sync(list(queries.items()))
+        if self.cache is not None:
+            self.cache.set_many(fetched)
+        return len(fetched)
+
+    def purge_expired(self) -> int:
+        return self.cache.purge_expired() if self.cache is not None else 0
+
+    async def search_iter(self, lat: float, lng: float, max_distance: float, categories):
+        keys_by_query, features_by_key, queries = await asyncio.to_thread(
+            self._plan, lat, lng, max_distance, categories)
+
+        # a category is ready once none of its queries are still in flight
+        pending = {cat: set() for cat in categories}
+        for (cat, _), key in keys_by_query.items():
+            if key in queries:
+                pending[cat].add(key)
+        for cat in categories:
+            if not pending[cat]:
+                yield cat, self._category_features(cat, keys_by_query, features_by_key)
+
+        fetched = {}
+        async for key, features in iter_fetch(list(queries.items())):
+            if features is not None:
+                fetched[key] = features
+                features_by_key[key] = features
+            for cat in categories:
+                if key in pending[cat]:
+                    pending[cat].discard(key)
+                    if not pending[cat]:
+                        yield cat, self._category_features(cat, keys_by_query, features_by_key)
+
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set_many, fetched)
+
+
+# unnamed features are labelled with the search term that found them
+def _with_default_name(feat, search_query: str):
+    prop = feat.get("properties") or {}
+    if "name" in prop:
+        return feat
+    return {**feat, "properties": {**prop, "name": search_query}}
+
+
+# POIs from a bulk-loaded local file, no network involved
+class LocalLandmarkProvider(LandmarkProvider):
+    name = "local"
+
+    def __init__(self, path: str):
+        self.index = PoiIndex(path)
+
+    def search(self, lat: float, lng: float, max_distance: float, categories):
+        results = {}
+        for cat in categories:
+            positions, _ = self.index.query(lat, lng, max_distance, cat)
+            records = self.index.records[positions]
+            results[cat] = [
+                {
+                    "geometry": {"coordinates": [float(r["long"]), float(r["lat"])]},
+                    "properties": {"name": r["name"].decode("utf-8", "ignore"), "relevance": float(r["relevance"])},
+                }
+                for r in records
+            ]
+        return results
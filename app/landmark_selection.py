@@ -0,0 +1,120 @@
+import heapq
+import random
+
+from app.global_vars import LANDMARK_SELECTION_RANDOMNESS
+from app.landmark_dedup import NearDuplicateGrid
+
+
+# bounded min-heap holding the best k candidates of one category, unique by (name, type)
+# a better duplicate supersedes the entry already in the heap, which is left behind as stale
+class _TopK:
+    def __init__(self, k: int):
+        self.k = k
+        self.heap = []  # (score, seq, candidate, key)
+        self.live = {}  # key -> heap entry currently representing it
+        self.stale = set()  # seq of superseded entries still sitting in the heap
+
+    def _drop_stale_top(self):
+        while self.heap and self.heap[0][1] in self.stale:
+            self.stale.discard(heapq.heappop(self.heap)[1])
+
+    def offer(self, score: float, seq: int, candidate):
+        if self.k <= 0:
+            return
+        key = (candidate["name"], candidate["type"])
+        current = self.live.get(key)
+        if current is not None:
+            if current[0] >= score:
+                return
+            self.stale.add(current[1])
+            del self.live[key]
+            self._drop_stale_top()
+
+        entry = (score, seq, candidate, key)
+        if len(self.heap) - len(self.stale) < self.k:
+            heapq.heappush(self.heap, entry)
+        elif score > self.heap[0][0]:
+            evicted = heapq.heapreplace(self.heap, entry)
+            del self.live[evicted[3]]
+            self._drop_stale_top()
+        else:
+            return
+        self.live[key] = entry
+
+    # winners, best first
+    def entries(self):
+        return sorted((e for e in self.heap if e[1] not in self.stale), reverse=True)
+
+
+# pick landmarks for a trip in one pass over the candidates
+# each candidate is ranked by its relevance/distance score plus a random term, every category keeps
+# only its top category_counts[cat] in a bounded heap, and the winners are then capped to num_destinations
+# a place already picked for an earlier category (or in seen, what an earlier call picked) is skipped, so the
+# category's next candidate takes the slot; winners are added to seen
+def select_landmarks(candidates_per_category, category_counts, num_destinations: int,
+                     randomness: float = LANDMARK_SELECTION_RANDOMNESS, rng: random.Random = None,
+                     seen: NearDuplicateGrid = None):
+    rng = rng or random
+    if seen is None:
+        seen = NearDuplicateGrid(max((abs(c["lat"]) for cands in candidates_per_category.values() for c in cands),
+                                     default=0.0))
+    seq = 0
+    winners = []
+    for cat, candidates in candidates_per_category.items():
+        top = _TopK(int(category_counts.get(cat, 1)))
+        for candidate in candidates:
+            if seen.find(candidate) is None:
+                top.offer(candidate["score"] + randomness * rng.random(), seq, candidate)
+            seq += 1
+        entries = top.entries()
+        for entry in entries:
+            seen.add(entry[2], cat)
+        winners.extend(entries)
+
+    # Limit the number of destinations if necessary, keeping the best ranked
+    if len(winners) > num_destinations:
+        keep = {e[1] for e in heapq.nlargest(max(num_destinations, 0), winners)}
+        winners = [e for e in winners if e[1] in keep]
+    return [e[2] for e in winners]
+
+
+# draw count alternative selections from one candidate pool
+# each draw ranks candidates with fresh randomness and takes them greedily in rank order while their category
+# quota and num_destinations allow, skipping any candidate that would make it share more than max_overlap
+# landmarks with an earlier alternative; only candidates that end up in the alternative count towards overlap,
+# so a skipped one leaves its slot to the next ranked candidate
+def select_alternatives(candidates_per_category, category_counts, num_destinations: int, count: int,
+                        max_overlap: int, randomness: float = LANDMARK_SELECTION_RANDOMNESS,
+                        rng: random.Random = None):
+    rng = rng or random
+    categories = list(candidates_per_category)
+    quotas = [int(category_counts.get(cat, 1)) for cat in categories]
+    limit = max(num_destinations, 0)
+    alternatives = []
+    used_by = []  # per earlier alternative, the ids of the candidates it picked
+    for _ in range(count):
+        ranked = [(c["score"] + randomness * rng.random(), n, c)
+                  for n, cat in enumerate(categories) for c in candidates_per_category[cat]]
+        ranked.sort(key=lambda e: e[0], reverse=True)
+        overlap = [0] * len(used_by)
+        picked = [set() for _ in categories]
+        winners = []
+        for rank, n, candidate in ranked:
+            if len(winners) >= limit:
+                break
+            key = (candidate["name"], candidate["type"])
+            if len(picked[n]) >= quotas[n] or key in picked[n]:
+                continue
+            shared_with = [i for i, used in enumerate(used_by) if id(candidate) in used]
+            if any(overlap[i] >= max_overlap for i in shared_with):
+                continue
+            for i in shared_with:
+                overlap[i] += 1
+            picked[n].add(key)
+            winners.append((n, -rank, candidate))
+
+        # category order, best ranked first within each
+        selected = [candidate for _, _, candidate in sorted(winners, key=lambda e: e[:2])]
+        used_by.append({id(c) for c in selected})
+        alternatives.append(selected)
+    return alternatives
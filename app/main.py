@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 from routers import users, groups, trips, members, invites, messages
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app.global_vars import PREWARM_ENABLED, MESSAGE_MAINTENANCE_ENABLED, LANDMARK_CACHE_PERSIST
+from app.instrumentation import REGISTRY
 
 app = FastAPI()
 origins = [
@@ -14,6 +17,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-After-Tid"],  # list_trips_by_group's next page cursor, for browser clients
 )
 
 app.include_router(users.router, prefix="/users", tags=["Users"])
@@ -22,3 +26,32 @@ app.include_router(trips.router, prefix="/trips", tags=["Trips"])
 app.include_router(members.router, prefix="/members", tags=["Members"])
 app.include_router(invites.router, prefix="/invites", tags=["Invites"])
 app.include_router(messages.router, prefix="/messages", tags=["Messages"])
+
+
+# keep the landmark cache warm for popular trip locations, and purge its expired entries
+@app.on_event("startup")
+def start_prewarm():
+    if PREWARM_ENABLED:
+        trips.prewarm_scheduler.start()
+    elif LANDMARK_CACHE_PERSIST:
+        trips.cache_purger.start()  # the prewarm cycle purges expired cache rows, without it a timer does
+
+
+# pick up async trip jobs left behind by a previous process and keep this one's leases alive
+@app.on_event("startup")
+def start_trip_jobs():
+    trips.trip_jobs.start()
+
+
+# create upcoming messages partitions and compact old ones into message_archive
+# every worker runs it; advisory locks keep partition creation and compaction to one worker at a time
+@app.on_event("startup")
+def start_message_maintenance():
+    if MESSAGE_MAINTENANCE_ENABLED:
+        messages.message_maintenance.start()
+
+
+# Prometheus scrape target: per-stage trip generation latency, upstream query outcomes, pool and cache gauges
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return REGISTRY.render()
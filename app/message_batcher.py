@@ -0,0 +1,106 @@
+import logging
+import threading
+
+from sqlalchemy import insert
+
+from app.chat_push import notify_messages
+from app.global_vars import MESSAGE_GROUP_COMMIT_WINDOW, MESSAGE_GROUP_COMMIT_MAX_BATCH
+from app.instrumentation import MESSAGE_BATCH_SIZE, log_event
+from app.models import Message
+from app.read_cursors import advance_cursors
+
+_messages = Message.__table__
+_RETURNING = (_messages.c.id, _messages.c.gid, _messages.c.sender_uid, _messages.c.sender_name, _messages.c.text,
+              _messages.c.timestamp)
+
+
+class _Batch:
+    def __init__(self):
+        self.entries = []  # column values of each message
+        self.results = []  # inserted row or exception, per entry
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+# insert the messages, move each sender's read cursor past their own messages and notify chat push listeners,
+# all in one transaction; returns the inserted rows in entry order
+def write_messages(db, entries):
+    # executemany with sort_by_parameter_order: still batched into multi-row INSERTs ("insertmanyvalues"),
+    # and sqlalchemy hands the RETURNING rows back in the order of entries rather than whatever order postgres
+    # produced them in
+    rows = db.execute(insert(_messages).returning(*_RETURNING, sort_by_parameter_order=True), entries).all()
+    positions = {}
+    for row in rows:
+        key = (row.sender_uid, row.gid)
+        positions[key] = max(positions.get(key, 0), row.id)
+    advance_cursors(db, positions)
+    notify_messages(db, [(row.gid, row.id) for row in rows])
+    db.commit()
+    return rows
+
+
+# group commit for message sends: concurrent submit() calls are written by one INSERT ... RETURNING and one
+# commit instead of a transaction each
+# the first caller into an empty batch leads it: it waits up to window seconds (less if max_batch callers
+# join), writes everyone's rows and wakes them; each submit returns only once its row is committed
+class GroupCommit:
+    def __init__(self, session_factory, window: float = MESSAGE_GROUP_COMMIT_WINDOW,
+                 max_batch: int = MESSAGE_GROUP_COMMIT_MAX_BATCH):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._open = None  # batch still taking entries
+
+    def submit(self, values: dict):
+        with self._lock:
+            batch = self._open
+            leader = batch is None
+            if leader:
+                batch = self._open = _Batch()
+            index = len(batch.entries)
+            batch.entries.append(values)
+            if len(batch.entries) >= self.max_batch:
+                self._open = None
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open is batch:
+                    self._open = None
+            self._flush(batch)
+        else:
+            batch.done.wait()
+
+        result = batch.results[index]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def _flush(self, batch):
+        MESSAGE_BATCH_SIZE.observe(len(batch.entries))
+        try:
+            batch.results = self._write(batch.entries)
+        except BaseException as e:
+            if len(batch.entries) == 1:
+                batch.results = [e]
+            else:
+                # one bad row (a deleted group, say) fails the whole INSERT; retry alone so only its sender sees it
+                log_event(logging.WARNING, "message_group_commit_failed", size=len(batch.entries), error=str(e))
+                batch.results = [self._write_alone(values) for values in batch.entries]
+        finally:
+            batch.done.set()
+
+    def _write(self, entries):
+        db = self.session_factory()
+        try:
+            return write_messages(db, entries)
+        finally:
+            db.close()
+
+    def _write_alone(self, values):
+        try:
+            return self._write([values])[0]
+        except Exception as e:
+            return e
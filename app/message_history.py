@@ -0,0 +1,84 @@
+import datetime
+import json
+import zlib
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from app.global_vars import MESSAGE_PAGE_SIZE
+from app.models import Message, MessageArchive
+
+# a message read back from message_archive, with the attributes of Message that responses use
+ArchivedMessage = namedtuple("ArchivedMessage", ["id", "gid", "sender_uid", "sender_name", "text", "timestamp"])
+
+
+# one day of a group's messages as a message_archive payload
+def pack(messages) -> bytes:
+    rows = [[m.id, m.sender_uid, m.sender_name, m.text, m.timestamp.isoformat()] for m in messages]
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode())
+
+
+def unpack(gid: int, payload: bytes):
+    return [ArchivedMessage(id, gid, sender_uid, sender_name, text, datetime.datetime.fromisoformat(timestamp))
+            for id, sender_uid, sender_name, text, timestamp in json.loads(zlib.decompress(payload))]
+
+
+def _archived_day(db, gid: int, day):
+    payload = db.query(MessageArchive.payload).filter(MessageArchive.gid == gid, MessageArchive.day == day).scalar()
+    return unpack(gid, payload)
+
+
+# one page of gid's messages in id order (oldest first) and whether there are more past it, as /sync pages
+# after_id pages forward, before_id back, neither gives the newest page
+# live partitions are read first; archived days are only decompressed while they can still hold messages
+# that belong on the page, so paging through recent history never touches the archive
+def page_messages(db, gid: int, after_id: int = None, before_id: int = None, limit: int = MESSAGE_PAGE_SIZE):
+    query = db.query(Message).filter(Message.gid == gid)
+    days = db.query(MessageArchive.day, MessageArchive.first_id, MessageArchive.last_id).filter(
+        MessageArchive.gid == gid)
+    if after_id is not None:
+        messages = query.filter(Message.id > after_id).order_by(Message.id).limit(limit + 1).all()
+        days = days.filter(MessageArchive.last_id > after_id).order_by(MessageArchive.first_id).all()
+        newest_first = False
+    else:
+        if before_id is not None:
+            query = query.filter(Message.id < before_id)
+            days = days.filter(MessageArchive.first_id < before_id)
+        messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+        days = days.order_by(MessageArchive.last_id.desc()).all()
+        newest_first = True
+
+    for day, first_id, last_id in days:
+        if len(messages) > limit:
+            # the page is full up to messages[limit]; a day entirely past it can't change the page, nor can later ones
+            boundary = messages[limit].id
+            if (last_id < boundary) if newest_first else (first_id > boundary):
+                break
+        archived = [m for m in _archived_day(db, gid, day)
+                    if (after_id is None or m.id > after_id) and (before_id is None or m.id < before_id)]
+        messages = sorted(messages + archived, key=lambda m: m.id, reverse=newest_first)[:limit + 1]
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if newest_first:
+        messages.reverse()
+    return messages, has_more
+
+
+# id of gid's newest message, live or archived, 0 for a group without any
+# ids only grow, so the archive is only consulted when the live partitions have nothing for the group
+def latest_message_id(db, gid: int) -> int:
+    latest = db.query(func.max(Message.id)).filter(Message.gid == gid).scalar()
+    if latest is None:
+        latest = db.query(func.max(MessageArchive.last_id)).filter(MessageArchive.gid == gid).scalar()
+    return latest or 0
+
+
+# gid's whole history, live and archived, in timestamp order
+def all_messages(db, gid: int):
+    messages = db.query(Message).filter(Message.gid == gid).order_by(Message.timestamp).all()
+    payloads = db.query(MessageArchive.payload).filter(MessageArchive.gid == gid).order_by(MessageArchive.day)
+    archived = [m for (payload,) in payloads for m in unpack(gid, payload)]
+    if not archived:
+        return messages
+    return sorted(archived + messages, key=lambda m: (m.timestamp, m.id))
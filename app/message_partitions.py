@@ -0,0 +1,151 @@
+import datetime
+import itertools
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+
+from app.global_vars import MESSAGE_MAINTENANCE_INTERVAL, MESSAGE_PARTITION_MONTHS_AHEAD, \
+    MESSAGE_ARCHIVE_AFTER_MONTHS
+from app.instrumentation import log_event
+from app.message_history import pack
+from app.models import MessageArchive
+
+# arbitrary constants identifying the partition maintenance locks among other advisory locks
+_MAINTENANCE_LOCK = 7_301_943  # held by each partition create or compaction transaction
+_COMPACTION_LOCK = 7_301_944  # held by the process running a compaction pass, for the whole pass
+_ARCHIVE_INSERT_BATCH = 500  # group-days per archive INSERT
+
+
+def add_months(day: datetime.date, months: int) -> datetime.date:
+    month = day.year * 12 + day.month - 1 + months
+    return datetime.date(month // 12, month % 12 + 1, 1)
+
+
+# month partitions of messages as {first day of month: table name}
+def month_partitions(conn):
+    rows = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'messages'::regclass AND c.relname ~ '^messages_p[0-9]{6}$'"
+    ))
+    return {datetime.date(int(name[-6:-2]), int(name[-2:]), 1): name for (name,) in rows}
+
+
+# make sure the current month's partition and the next months_ahead exist, returns how many were created
+def ensure_partitions(engine, months_ahead: int = MESSAGE_PARTITION_MONTHS_AHEAD, today: datetime.date = None):
+    this_month = (today or datetime.datetime.utcnow().date()).replace(day=1)
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock)"), {"lock": _MAINTENANCE_LOCK})
+        return sum(
+            conn.execute(text("SELECT ensure_message_partition(:month)"),
+                         {"month": add_months(this_month, n)}).scalar()
+            for n in range(months_ahead + 1)
+        )
+
+
+# move one month partition into message_archive, a blob per group and (server) day, and drop it, in one transaction
+# returns the number of messages archived (0 if another worker got to it first)
+def compact_partition(engine, name: str) -> int:
+    archived = 0
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock)"), {"lock": _MAINTENANCE_LOCK})
+        if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is None:
+            return 0
+
+        rows = conn.execute(text(
+            f'SELECT id, gid, sender_uid, sender_name, text, timestamp, created_at FROM "{name}" '
+            f'ORDER BY gid, created_at::date, id'
+        ).execution_options(stream_results=True, yield_per=1000))
+        pending = []
+        for (gid, day), messages in itertools.groupby(rows, key=lambda m: (m.gid, m.created_at.date())):
+            messages = list(messages)
+            pending.append({"gid": gid, "day": day, "first_id": messages[0].id, "last_id": messages[-1].id,
+                            "message_count": len(messages), "payload": pack(messages)})
+            archived += len(messages)
+            if len(pending) >= _ARCHIVE_INSERT_BATCH:
+                conn.execute(MessageArchive.__table__.insert(), pending)
+                pending = []
+        if pending:
+            conn.execute(MessageArchive.__table__.insert(), pending)
+        conn.exec_driver_sql(f'DROP TABLE "{name}"')
+    return archived
+
+
+# month partitions that ended more than archive_after_months ago, oldest first
+def partitions_to_compact(engine, archive_after_months: int = MESSAGE_ARCHIVE_AFTER_MONTHS,
+                          today: datetime.date = None):
+    cutoff = add_months((today or datetime.datetime.utcnow().date()).replace(day=1), -archive_after_months)
+    with engine.connect() as conn:
+        partitions = month_partitions(conn)
+    return [name for month, name in sorted(partitions.items()) if month < cutoff]
+
+
+# compact every cold partition, unless another process is already doing it; returns (partitions, messages)
+# the session lock spans the whole pass, so two schedulers (or the api and a cron run) never drop partitions
+# side by side; the loser skips the pass instead of queueing up behind it
+def compact_partitions(engine, archive_after_months: int = MESSAGE_ARCHIVE_AFTER_MONTHS):
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:lock)"), {"lock": _COMPACTION_LOCK}).scalar():
+            conn.rollback()
+            log_event(logging.INFO, "message_compaction_skipped", reason="another process holds the lock")
+            return 0, 0
+        try:
+            conn.rollback()  # don't sit idle in a transaction while the pass runs
+            compacted = archived = 0
+            for name in partitions_to_compact(engine, archive_after_months):
+                archived += compact_partition(engine, name)
+                compacted += 1
+            return compacted, archived
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:lock)"), {"lock": _COMPACTION_LOCK})
+            conn.commit()
+
+
+# keeps messages partitioned ahead of time and compacts cold months into message_archive
+# rows outside every month partition land in messages_default, and move out once their month's partition is made
+# runs inside the api with MESSAGE_MAINTENANCE_ENABLED, or as a single job (python -m app.message_partitions)
+class MessageMaintenance:
+    def __init__(self, engine, interval: float = MESSAGE_MAINTENANCE_INTERVAL):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None  # stats of the last cycle
+
+    def run_cycle(self):
+        started = time.monotonic()
+        created = ensure_partitions(self.engine)
+        compacted, archived = compact_partitions(self.engine)
+        self.last_run = {
+            "partitions_created": created,
+            "partitions_compacted": compacted,
+            "messages_archived": archived,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        log_event(logging.INFO, "message_maintenance_cycle", **self.last_run)
+        return self.last_run
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_cycle()
+            except Exception as e:
+                log_event(logging.ERROR, "message_maintenance_failed", error=str(e))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="message-maintenance", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    # one maintenance cycle, for running from cron instead of inside the api
+    from routers.messages import message_maintenance
+
+    print(message_maintenance.run_cycle())
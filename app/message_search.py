@@ -0,0 +1,69 @@
+from sqlalchemy import REAL, cast, func, literal, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from app.global_vars import MESSAGE_SEARCH_CONFIG, MESSAGE_SEARCH_HEADLINE, MESSAGE_SEARCH_RANK_WINDOW, \
+    MESSAGE_SEARCH_START_SEL, MESSAGE_SEARCH_STOP_SEL
+from app.models import Message
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# cursors are "<rank>,<id>,<window top>" of the last hit on the previous page
+def encode_cursor(rank: float, message_id: int, window_top: int) -> str:
+    return f"{rank!r},{message_id},{window_top}"
+
+
+def decode_cursor(cursor: str):
+    try:
+        rank, message_id, window_top = cursor.split(",")
+        return float(rank), int(message_id), int(window_top)
+    except ValueError:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+# messages in gid matching q (web search syntax: words, "quoted phrases", or, -excluded), best match first,
+# as (id, sender_uid, sender_name, timestamp, rank, snippet) rows, the cursor of the next page, and whether
+# older matches were left out
+# ranking every match of a common word in a big group is what gets slow, so only the newest window matches
+# are ranked (all of them for anything rarer) and truncated says when there were more than that; the window's
+# newest id rides along in the cursor, so later pages rank the same window even as new messages arrive.
+# only the page's own rows get a ts_headline snippet, plain text with each matched word between
+# MESSAGE_SEARCH_START_SEL and MESSAGE_SEARCH_STOP_SEL; those control characters are blanked out of the message
+# text first, so a message can't fake or break a highlight
+def search_messages(db, gid: int, q: str, limit: int, cursor: str = None, window: int = MESSAGE_SEARCH_RANK_WINDOW):
+    config = literal(MESSAGE_SEARCH_CONFIG, REGCONFIG)
+    query = func.websearch_to_tsquery(config, q)
+
+    matches = db.query(Message.id, Message.sender_uid, Message.sender_name, Message.text, Message.timestamp,
+                       Message.search_vector).filter(Message.gid == gid, Message.search_vector.bool_op("@@")(query))
+    if cursor is not None:
+        last_rank, last_id, window_top = decode_cursor(cursor)
+        matches = matches.filter(Message.id <= window_top)
+    newest = matches.order_by(Message.id.desc()).limit(window).subquery()
+    truncated = db.query(matches.order_by(Message.id.desc()).offset(window).limit(1).exists()).scalar()
+
+    ranked = db.query(newest.c.id, newest.c.sender_uid, newest.c.sender_name, newest.c.text, newest.c.timestamp,
+                      func.ts_rank_cd(newest.c.search_vector, query, type_=REAL).label("rank"),
+                      func.max(newest.c.id).over().label("window_top")).subquery()
+    page = db.query(ranked)
+    if cursor is not None:
+        # compared as real, the type ts_rank_cd returns, so the cursor's own rank matches exactly
+        page = page.filter(tuple_(ranked.c.rank, ranked.c.id) < tuple_(cast(last_rank, REAL), last_id))
+    page = page.order_by(ranked.c.rank.desc(), ranked.c.id.desc()).limit(limit + 1).subquery()
+
+    marks = MESSAGE_SEARCH_START_SEL + MESSAGE_SEARCH_STOP_SEL
+    text = func.translate(page.c.text, marks, " " * len(marks))
+    rows = (
+        db.query(page.c.id, page.c.sender_uid, page.c.sender_name, page.c.timestamp, page.c.rank, page.c.window_top,
+                 func.ts_headline(config, text, query, MESSAGE_SEARCH_HEADLINE).label("snippet"))
+        .order_by(page.c.rank.desc(), page.c.id.desc())
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].id, rows[-1].window_top)
+    return rows, next_cursor, truncated
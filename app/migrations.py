@@ -0,0 +1,194 @@
+import datetime
+import logging
+
+from sqlalchemy import text
+
+from app.global_vars import TRIP_LANDMARK_CELL_DEG, MESSAGE_SEARCH_CONFIG
+from app.instrumentation import log_event
+
+# schema changes create_all can't express (triggers, backfills, column changes on existing tables)
+# each entry runs once, in order, and is recorded in schema_migrations; add new ones at the end, never edit old ones
+MIGRATIONS = [
+    ("trip_landmarks_sync", [
+        # rebuild a trip's trip_landmarks rows whenever its landmarks are written, whichever code path wrote them
+        # entries without numeric lat/long are skipped rather than failing the trip write
+        f"""
+        CREATE OR REPLACE FUNCTION trip_landmarks_sync() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM trip_landmarks WHERE tid = NEW.tid;
+            INSERT INTO trip_landmarks (tid, ordinal, name, type, lat, long, cell_lat, cell_long)
+            SELECT NEW.tid, e.ordinality - 1, e.value->>'name', e.value->>'type',
+                   (e.value->>'lat')::float8, (e.value->>'long')::float8,
+                   floor((e.value->>'lat')::float8 / {TRIP_LANDMARK_CELL_DEG!r}),
+                   floor((e.value->>'long')::float8 / {TRIP_LANDMARK_CELL_DEG!r})
+            FROM jsonb_array_elements(
+                     CASE WHEN jsonb_typeof(NEW.landmarks) = 'array' THEN NEW.landmarks ELSE '[]'::jsonb END
+                 ) WITH ORDINALITY AS e(value, ordinality)
+            WHERE jsonb_typeof(e.value->'lat') = 'number' AND jsonb_typeof(e.value->'long') = 'number';
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS trip_landmarks_sync ON trips",
+        """
+        CREATE TRIGGER trip_landmarks_sync AFTER INSERT OR UPDATE OF landmarks ON trips
+        FOR EACH ROW EXECUTE FUNCTION trip_landmarks_sync()
+        """,
+        # backfill trips written before the trigger existed; touching landmarks fires the trigger for each
+        """
+        UPDATE trips SET landmarks = landmarks
+        WHERE jsonb_typeof(landmarks) = 'array'
+          AND NOT EXISTS (SELECT 1 FROM trip_landmarks tl WHERE tl.tid = trips.tid)
+        """,
+    ]),
+    ("trips_version", [
+        # optimistic concurrency counter for trip edits, see Trip.version
+        "ALTER TABLE trips ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    ]),
+    ("trips_group_tid_index", [
+        'CREATE INDEX IF NOT EXISTS ix_trips_group_tid ON trips ("group", tid)',
+    ]),
+    ("message_read_cursors", [
+        "CREATE INDEX IF NOT EXISTS ix_messages_gid_id ON messages (gid, id)",
+        # the newest message each user appears in read_by becomes their cursor; mark_read always marked a whole
+        # group, so everything before it was read too
+        """
+        INSERT INTO message_read_cursors (uid, gid, last_read_id, last_read_at)
+        SELECT r.uid, m.gid, max(m.id), now() at time zone 'utc'
+        FROM messages m CROSS JOIN LATERAL unnest(m.read_by) AS r(uid)
+        WHERE EXISTS (SELECT 1 FROM users u WHERE u.uid = r.uid)
+        GROUP BY r.uid, m.gid
+        ON CONFLICT (uid, gid) DO UPDATE
+            SET last_read_id = GREATEST(message_read_cursors.last_read_id, EXCLUDED.last_read_id)
+        """,
+    ]),
+    ("messages_gid_timestamp_index", [
+        "CREATE INDEX IF NOT EXISTS ix_messages_gid_timestamp ON messages (gid, timestamp)",
+    ]),
+    ("messages_partitioned", [
+        # create the month partition holding day if it doesn't exist yet, returns whether it did
+        # rows for that month already sitting in messages_default would make the create fail, so they move across;
+        # the columns are listed because a generated column (search_vector) can't be inserted into
+        """
+        CREATE OR REPLACE FUNCTION ensure_message_partition(day date) RETURNS boolean AS $$
+        DECLARE
+            first_day date := date_trunc('month', day)::date;
+            part_name text := 'messages_p' || to_char(day, 'YYYYMM');
+        BEGIN
+            IF to_regclass(part_name) IS NOT NULL THEN
+                RETURN false;
+            END IF;
+            CREATE TEMP TABLE message_partition_moved (LIKE messages) ON COMMIT DROP;
+            WITH moved AS (
+                DELETE FROM messages_default
+                WHERE created_at >= first_day AND created_at < first_day + interval '1 month'
+                RETURNING *
+            )
+            INSERT INTO message_partition_moved SELECT * FROM moved;
+            -- %% because statements go through the driver's parameter formatting
+            EXECUTE format('CREATE TABLE %%I PARTITION OF messages FOR VALUES FROM (%%L) TO (%%L)',
+                           part_name, first_day, (first_day + interval '1 month')::date);
+            INSERT INTO messages (id, gid, sender_uid, sender_name, text, timestamp, read_by, created_at)
+            SELECT id, gid, sender_uid, sender_name, text, timestamp, read_by, created_at
+            FROM message_partition_moved;
+            DROP TABLE message_partition_moved;
+            RETURN true;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        # an existing plain messages table is rebuilt as the partitioned one, keeping ids and their sequence;
+        # existing rows get their client timestamp, capped at now, as created_at
+        # on a fresh database create_all already made it partitioned
+        """
+        DO $$
+        DECLARE
+            month date;
+        BEGIN
+            IF (SELECT relkind FROM pg_class WHERE oid = 'messages'::regclass) = 'p' THEN
+                RETURN;
+            END IF;
+            ALTER TABLE messages RENAME TO messages_unpartitioned;
+            ALTER SEQUENCE messages_id_seq OWNED BY NONE;
+            ALTER TABLE messages_unpartitioned ADD COLUMN created_at timestamp;
+            UPDATE messages_unpartitioned
+            SET created_at = least(coalesce(timestamp, now() at time zone 'utc'), now() at time zone 'utc');
+
+            CREATE TABLE messages (LIKE messages_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at);
+            ALTER TABLE messages ALTER COLUMN created_at SET NOT NULL;
+            ALTER TABLE messages ALTER COLUMN created_at SET DEFAULT (now() at time zone 'utc');
+            CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+            FOR month IN SELECT DISTINCT date_trunc('month', created_at)::date FROM messages_unpartitioned LOOP
+                PERFORM ensure_message_partition(month);
+            END LOOP;
+            INSERT INTO messages (id, gid, sender_uid, sender_name, text, timestamp, read_by, created_at)
+            SELECT id, gid, sender_uid, sender_name, text, timestamp, read_by, created_at FROM messages_unpartitioned;
+            DROP TABLE messages_unpartitioned;
+
+            ALTER SEQUENCE messages_id_seq OWNED BY messages.id;
+            ALTER TABLE messages ADD PRIMARY KEY (id, created_at);
+            ALTER TABLE messages ADD FOREIGN KEY (gid) REFERENCES groups (gid) ON DELETE CASCADE;
+            ALTER TABLE messages ADD FOREIGN KEY (sender_uid) REFERENCES users (uid) ON DELETE CASCADE;
+        END;
+        $$
+        """,
+        "CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT",
+        "CREATE INDEX IF NOT EXISTS ix_messages_id ON messages (id)",
+        "CREATE INDEX IF NOT EXISTS ix_messages_gid_id ON messages (gid, id)",
+        "CREATE INDEX IF NOT EXISTS ix_messages_gid_timestamp ON messages (gid, timestamp)",
+    ]),
+    ("messages_search_vector", [
+        # rewrites every partition once to fill the column in
+        f"""
+        ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (to_tsvector('{MESSAGE_SEARCH_CONFIG}', text)) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING gin (search_vector)",
+    ]),
+    ("trip_jobs_lease", [
+        "ALTER TABLE trip_jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP",
+        "ALTER TABLE trip_jobs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+        # jobs from before leases have none, so the first sweep picks them up like any expired one
+        """
+        CREATE INDEX IF NOT EXISTS ix_trip_jobs_active_lease ON trip_jobs (lease_expires_at)
+        WHERE status IN ('queued', 'running')
+        """,
+    ]),
+    ("messages_gid_search_vector", [
+        # search always filters by group, and with btree_gin one gin index answers both conditions instead of
+        # the whole table's matches being fetched and filtered by gid; servers without the contrib extensions
+        # keep the plain search_vector index
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gin') THEN
+                CREATE EXTENSION IF NOT EXISTS btree_gin;
+                CREATE INDEX IF NOT EXISTS ix_messages_gid_search_vector ON messages USING gin (gid, search_vector);
+                DROP INDEX IF EXISTS ix_messages_search_vector;
+            END IF;
+        END;
+        $$
+        """,
+    ]),
+]
+
+# arbitrary constant identifying the migration lock among other advisory locks
+_MIGRATION_LOCK = 7_301_942
+
+
+# apply every migration not yet recorded, in one transaction
+# the advisory lock makes concurrently starting workers wait for the first one instead of racing it
+def apply_migrations(engine):
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock)"), {"lock": _MIGRATION_LOCK})
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR PRIMARY KEY, applied_at TIMESTAMP NOT NULL)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT name FROM schema_migrations"))}
+        for name, statements in MIGRATIONS:
+            if name in applied:
+                continue
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            conn.execute(text("INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :at)"),
+                         {"name": name, "at": datetime.datetime.utcnow()})
+            log_event(logging.INFO, "migration_applied", name=name)
@@ -7,20 +7,32 @@ from sqlalchemy import (
     ARRAY,
     DateTime,
     Enum,
+    Date,
     Float,
     Double,
     ForeignKey,
     Boolean, UniqueConstraint,
+    Index,
+    LargeBinary,
+    Computed,
+    text,
 )
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import declarative_base, deferred, relationship
+
+from app.global_vars import MESSAGE_SEARCH_CONFIG
 
 from schemas.group import GroupTypeEnum
 
 from schemas.member import RoleEnum
 
+from schemas.trip import TripJobStatusEnum
+
 Base = declarative_base()
 
+# server-side default for utc timestamps, the same clock as datetime.datetime.utcnow on the api side
+_UTC_NOW = text("(now() at time zone 'utc')")
+
 #base model table for users
 class User(Base):
     __tablename__ = "users"
@@ -50,6 +62,29 @@ class Trip(Base):
     landmarks = Column(JSONB)  # Save list of landmark dicts here
     uid = Column(String, ForeignKey('users.uid', ondelete='CASCADE'), nullable=False)
     num_destinations = Column(Integer, nullable=True)
+    version = Column(Integer, nullable=False, default=1)  # bumped on every write, stale writers get a 409
+
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        Index('ix_trips_group_tid', 'group', 'tid'),  # keyset paging of a group's trips
+    )
+
+#one row per landmark of a trip, kept in sync with Trip.landmarks by a trigger (see app/migrations.py)
+class TripLandmark(Base):
+    __tablename__ = "trip_landmarks"
+
+    tid = Column(Integer, ForeignKey('trips.tid', ondelete='CASCADE'), primary_key=True)
+    ordinal = Column(Integer, primary_key=True)  # position in Trip.landmarks, from 0
+    name = Column(String)
+    type = Column(String)
+    lat = Column(Float, nullable=False)
+    long = Column(Float, nullable=False)
+    cell_lat = Column(Integer, nullable=False)  # floor(lat / TRIP_LANDMARK_CELL_DEG)
+    cell_long = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_trip_landmarks_cell', 'cell_lat', 'cell_long'),
+    )
 
 #base model table for members
 class Member(Base):
@@ -81,6 +116,7 @@ class Invite(Base):
     )
 
 #base model table for messages
+#range partitioned by month of timestamp (messages_pYYYYMM plus messages_default), see app/message_partitions.py
 class Message(Base):
     __tablename__ = "messages"
 
@@ -89,5 +125,70 @@ class Message(Base):
     sender_uid = Column(String, ForeignKey('users.uid', ondelete='CASCADE'), nullable=False)
     sender_name = Column(String, nullable=False)
     text = Column(String, nullable=False)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
-    read_by = Column(ARRAY(String), default=[])
\ No newline at end of file
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow)  # as sent by the client
+    read_by = Column(ARRAY(String), default=[])  # no longer written, read state lives in message_read_cursors
+    # maintained by Postgres for chat search, deferred so ordinary message loads don't carry it
+    search_vector = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{MESSAGE_SEARCH_CONFIG}', text)",
+                                                       persisted=True)))
+    # assigned by the server on insert; the partition key, so part of the primary key, and unlike the client's
+    # timestamp it can't put a message into a month partition that doesn't exist or was already compacted
+    created_at = Column(DateTime, primary_key=True, server_default=_UTC_NOW)
+
+    __table_args__ = (
+        Index('ix_messages_gid_id', 'gid', 'id'),  # unread checks and paging within a group
+        Index('ix_messages_gid_timestamp', 'gid', 'timestamp'),  # get_messages history in timestamp order
+        # chat search is indexed by gin (gid, search_vector), or search_vector alone without btree_gin,
+        # see app/migrations.py
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+#messages from compacted month partitions, one zlib-compressed JSON blob per group and day
+#payload is [[id, sender_uid, sender_name, text, timestamp], ...] in id order, see app/message_history.py
+class MessageArchive(Base):
+    __tablename__ = "message_archive"
+
+    gid = Column(Integer, ForeignKey('groups.gid', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    first_id = Column(Integer, nullable=False)
+    last_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index('ix_message_archive_gid_last_id', 'gid', 'last_id'),  # paging back through a group's history
+    )
+
+#how far each member has read in a group chat: every message in gid with id <= last_read_id is read
+class MessageReadCursor(Base):
+    __tablename__ = "message_read_cursors"
+
+    uid = Column(String, ForeignKey('users.uid', ondelete='CASCADE'), primary_key=True)
+    gid = Column(Integer, ForeignKey('groups.gid', ondelete='CASCADE'), primary_key=True)
+    last_read_id = Column(Integer, nullable=False, default=0)
+    last_read_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+#cached Searchbox responses, shared across api workers
+class LandmarkCacheEntry(Base):
+    __tablename__ = "landmark_cache"
+
+    key = Column(String, primary_key=True)  # geohash tile | search term | radius
+    features = Column(JSONB, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+#background trip generation jobs, see app/trip_jobs.py
+class TripJob(Base):
+    __tablename__ = "trip_jobs"
+
+    jid = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    uid = Column(String, ForeignKey('users.uid', ondelete='CASCADE'), nullable=False, index=True)
+    group = Column(Integer, nullable=False)
+    params = Column(JSONB, nullable=False)  # generate_trip query parameters
+    status = Column(Enum(TripJobStatusEnum, name="trip_job_status"), nullable=False, default=TripJobStatusEnum.queued)
+    trip_id = Column(Integer, ForeignKey('trips.tid', ondelete='SET NULL'), nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+    # renewed by the api worker holding the job; once it passes the job is requeued (or failed) by a sweep
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)  # times the job was requeued after its worker went away
@@ -0,0 +1,70 @@
+import math
+
+from sqlalchemy import func, tuple_
+
+from app.geo import EARTH_RADIUS_MILES, bounding_box
+from app.global_vars import TRIP_LANDMARK_CELL_DEG
+from app.models import Trip, TripLandmark
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# cursors are "<distance>,<tid>" of the last trip on the previous page
+def encode_cursor(distance: float, tid: int) -> str:
+    return f"{distance!r},{tid}"
+
+
+def decode_cursor(cursor: str):
+    try:
+        distance, tid = cursor.split(",")
+        return float(distance), int(tid)
+    except ValueError:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+# great-circle miles from (lat, lng) to each trip_landmarks row, computed in Postgres
+def _distance_expr(lat: float, lng: float):
+    d_lat = func.radians(TripLandmark.lat - lat) / 2
+    d_lng = func.radians(TripLandmark.long - lng) / 2
+    a = (func.power(func.sin(d_lat), 2)
+         + math.cos(math.radians(lat)) * func.cos(func.radians(TripLandmark.lat)) * func.power(func.sin(d_lng), 2))
+    return 2 * EARTH_RADIUS_MILES * func.asin(func.sqrt(func.least(a, 1.0)))
+
+
+# trips with at least one landmark within radius miles, nearest first, as (Trip columns..., distance) rows
+# the grid cells covering the bounding box narrow the scan through ix_trip_landmarks_cell before any
+# distance is computed; paging is keyset on (distance, tid) so every page costs the same
+def trips_near(db, lat: float, lng: float, radius: float, limit: int, group: int = None, cursor: str = None):
+    min_lng, min_lat, max_lng, max_lat = bounding_box(lat, lng, radius)
+    distance = _distance_expr(lat, lng)
+    nearest = (
+        db.query(TripLandmark.tid.label("tid"), func.min(distance).label("distance"))
+        .filter(TripLandmark.cell_lat.between(math.floor(min_lat / TRIP_LANDMARK_CELL_DEG),
+                                              math.floor(max_lat / TRIP_LANDMARK_CELL_DEG)),
+                TripLandmark.cell_long.between(math.floor(min_lng / TRIP_LANDMARK_CELL_DEG),
+                                               math.floor(max_lng / TRIP_LANDMARK_CELL_DEG)),
+                TripLandmark.lat.between(min_lat, max_lat),
+                TripLandmark.long.between(min_lng, max_lng),
+                distance <= radius)
+        .group_by(TripLandmark.tid)
+        .subquery()
+    )
+
+    query = (
+        db.query(Trip.tid, Trip.group, Trip.uid, Trip.location_lat, Trip.location_long, Trip.num_destinations,
+                 nearest.c.distance)
+        .join(nearest, nearest.c.tid == Trip.tid)
+    )
+    if group is not None:
+        query = query.filter(Trip.group == group)
+    if cursor is not None:
+        query = query.filter(tuple_(nearest.c.distance, Trip.tid) > tuple_(*decode_cursor(cursor)))
+    rows = query.order_by(nearest.c.distance, Trip.tid).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].distance, rows[-1].tid)
+    return rows, next_cursor
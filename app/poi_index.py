@@ -0,0 +1,107 @@
+import csv
+import json
+import math
+import sys
+
+import numpy as np
+
+from app.geo import bounding_box, haversine_miles
+from app.global_vars import LOCAL_POI_CELL_DEG
+
+# one fixed-width record per POI so the whole file can be memory-mapped
+POI_DTYPE = np.dtype([
+    ("lat", "<f8"),
+    ("long", "<f8"),
+    ("relevance", "<f4"),
+    ("category", "S24"),
+    ("name", "S96"),
+])
+
+
+# grid cell of each point, numbered row by row so a row of cells is one contiguous key range
+def cell_keys(lats, lngs, cell_deg: float = LOCAL_POI_CELL_DEG):
+    n_cols = int(math.ceil(360.0 / cell_deg)) + 1
+    rows = np.floor((np.asarray(lats) + 90.0) / cell_deg).astype(np.int64)
+    cols = np.floor((np.asarray(lngs) + 180.0) / cell_deg).astype(np.int64)
+    return rows * n_cols + cols
+
+
+# read name/category/lat/long rows from a GeoJSON FeatureCollection or a CSV extract
+def _read_source(path: str):
+    if path.endswith((".geojson", ".json")):
+        with open(path, encoding="utf-8") as f:
+            collection = json.load(f)
+        for feat in collection.get("features", []):
+            coords = (feat.get("geometry") or {}).get("coordinates")
+            if not coords or len(coords) < 2:
+                continue
+            prop = feat.get("properties") or {}
+            yield (float(coords[1]), float(coords[0]), float(prop.get("relevance") or 0),
+                   prop.get("category") or prop.get("type") or "", prop.get("name") or "")
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                lng = row.get("long") or row.get("lng") or row.get("lon")
+                if not row.get("lat") or not lng:
+                    continue
+                yield (float(row["lat"]), float(lng), float(row.get("relevance") or 0),
+                       row.get("category") or row.get("type") or "", row.get("name") or "")
+
+
+# bulk-load a POI extract into the array file served by LocalLandmarkProvider
+def build_poi_file(source_path: str, dest_path: str, cell_deg: float = LOCAL_POI_CELL_DEG) -> int:
+    rows = [
+        (lat, lng, relevance, category.encode("utf-8")[:24], name.encode("utf-8")[:96])
+        for lat, lng, relevance, category, name in _read_source(source_path)
+    ]
+    records = np.array(rows, dtype=POI_DTYPE)
+    # store records in cell order so each grid row can be sliced straight out of the file
+    records = records[np.argsort(cell_keys(records["lat"], records["long"], cell_deg), kind="stable")]
+    np.save(dest_path, records)
+    return len(records)
+
+
+# grid index over a memory-mapped POI file
+class PoiIndex:
+    def __init__(self, path: str, cell_deg: float = LOCAL_POI_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.n_cols = int(math.ceil(360.0 / cell_deg)) + 1
+        self.records = np.load(path, mmap_mode="r")
+        keys = cell_keys(self.records["lat"], self.records["long"], cell_deg)
+        # files written with a different cell size still work, through a sort permutation
+        self.order = None
+        if len(keys) > 1 and np.any(keys[1:] < keys[:-1]):
+            self.order = np.argsort(keys, kind="stable")
+            keys = keys[self.order]
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    # record positions of every POI within max_distance miles, optionally of one category
+    def query(self, lat: float, lng: float, max_distance: float, category: str = None):
+        min_lon, min_lat, max_lon, max_lat = bounding_box(lat, lng, max_distance)
+        row0, row1 = np.floor((np.array([min_lat, max_lat]) + 90.0) / self.cell_deg).astype(np.int64)
+        col0, col1 = np.clip(np.floor((np.array([min_lon, max_lon]) + 180.0) / self.cell_deg).astype(np.int64),
+                             0, self.n_cols - 1)
+        rows = np.arange(row0, row1 + 1, dtype=np.int64)
+        starts = np.searchsorted(self.keys, rows * self.n_cols + col0, side="left")
+        ends = np.searchsorted(self.keys, rows * self.n_cols + col1, side="right")
+        spans = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        if not spans:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions = np.concatenate(spans)
+        if self.order is not None:
+            positions = self.order[positions]
+
+        distances = haversine_miles(lat, lng, self.records["lat"][positions], self.records["long"][positions])
+        mask = distances <= max_distance
+        if category is not None:
+            mask &= self.records["category"][positions] == category.encode("utf-8")
+        return positions[mask], distances[mask]
+
+
+if __name__ == "__main__":
+    # python -m app.poi_index <extract.geojson|extract.csv> <pois.npy>
+    count = build_poi_file(sys.argv[1], sys.argv[2])
+    print(f"Wrote {count} POIs to {sys.argv[2]}")
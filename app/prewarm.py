@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from app.global_vars import PREWARM_INTERVAL, PREWARM_TOP_TILES, PREWARM_TRIP_WINDOW, PREWARM_CONCURRENCY, \
+    PREWARM_QUERY_BUDGET, PREWARM_RADIUS
+from app.instrumentation import log_event
+from app.landmark_cache import geohash
+from app.landmark_providers import QUERY_MAPPING
+from app.models import Trip
+
+
+# most frequent cache tiles among recent trips, as (lat, lng, trip count) at the mean trip location in each tile
+def popular_tiles(db, limit: int = PREWARM_TOP_TILES, window: int = PREWARM_TRIP_WINDOW):
+    rows = (
+        db.query(Trip.location_lat, Trip.location_long)
+        .order_by(Trip.tid.desc())
+        .limit(window)
+        .all()
+    )
+    counts = Counter()
+    sums = {}
+    for lat, lng in rows:
+        tile = geohash(lat, lng)
+        counts[tile] += 1
+        lat_sum, lng_sum = sums.get(tile, (0.0, 0.0))
+        sums[tile] = (lat_sum + lat, lng_sum + lng)
+    return [(sums[tile][0] / count, sums[tile][1] / count, count) for tile, count in counts.most_common(limit)]
+
+
+# keeps the landmark cache warm for the most popular trip locations
+# each cycle refreshes every category for the top tiles, re-fetching entries that would expire before the
+# next cycle, busiest tiles first, and stops once the cycle's Searchbox budget is spent; expired entries are
+# purged first
+class PrewarmScheduler:
+    def __init__(self, session_factory, provider, interval: float = PREWARM_INTERVAL,
+                 concurrency: int = PREWARM_CONCURRENCY, query_budget: int = PREWARM_QUERY_BUDGET,
+                 radius: float = PREWARM_RADIUS):
+        self.session_factory = session_factory
+        self.provider = provider
+        self.interval = interval
+        self.concurrency = concurrency
+        self.query_budget = query_budget
+        self.radius = radius
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None  # stats of the last cycle
+
+    def run_cycle(self):
+        started = time.monotonic()
+        purged = self.provider.purge_expired()
+        db = self.session_factory()
+        try:
+            tiles = popular_tiles(db)
+        finally:
+            db.close()
+
+        # reserve the budget up front so concurrent refreshes can't overspend it
+        # a tile that doesn't fit what's left is skipped, less popular tiles with fewer stale queries still may
+        categories = list(QUERY_MAPPING)
+        budget = self.query_budget
+        planned = []
+        for lat, lng, _ in tiles:
+            if budget <= 0:
+                break
+            queries = self.provider.stale_queries(lat, lng, self.radius, categories, min_ttl=self.interval)
+            if not queries or len(queries) > budget:
+                continue
+            budget -= len(queries)
+            planned.append(queries)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prewarm") as pool:
+            refreshed = sum(pool.map(self.provider.refresh, planned))
+
+        self.last_run = {
+            "tiles": len(tiles),
+            "tiles_refreshed": len(planned),
+            "queries_sent": self.query_budget - budget,
+            "entries_refreshed": refreshed,
+            "entries_purged": purged,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        log_event(logging.INFO, "prewarm_cycle", **self.last_run)
+        return self.last_run
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_cycle()
+            except Exception as e:
+                log_event(logging.ERROR, "prewarm_cycle_failed", error=str(e))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    # standalone warmer, best paired with LANDMARK_CACHE_PERSIST so the api workers see what it fetched
+    from routers.trips import prewarm_scheduler as scheduler
+
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
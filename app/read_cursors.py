@@ -0,0 +1,91 @@
+import datetime
+
+from sqlalchemy import and_, func, select, true
+from sqlalchemy.dialects.postgresql import insert
+
+from app.global_vars import UNREAD_COUNT_CAP
+from app.models import Group, Member, Message, MessageReadCursor
+
+
+# move uid's cursor in gid forward to last_read_id (the newest message in the group when None), as one upsert
+# cursors never move backwards, so a late or repeated mark_read can't un-read anything
+def advance_cursor(db, uid: str, gid: int, last_read_id: int = None):
+    if last_read_id is None:
+        last_read_id = (
+            select(func.coalesce(func.max(Message.id), 0)).where(Message.gid == gid).scalar_subquery()
+        )
+    stmt = insert(MessageReadCursor).values(uid=uid, gid=gid, last_read_id=last_read_id,
+                                            last_read_at=datetime.datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MessageReadCursor.uid, MessageReadCursor.gid],
+        set_={
+            "last_read_id": func.greatest(MessageReadCursor.last_read_id, stmt.excluded.last_read_id),
+            "last_read_at": stmt.excluded.last_read_at,
+        },
+    )
+    db.execute(stmt)
+
+
+# advance_cursor for many cursors at once, positions maps (uid, gid) to last_read_id, as one multi-row upsert
+def advance_cursors(db, positions):
+    now = datetime.datetime.utcnow()
+    stmt = insert(MessageReadCursor).values([
+        {"uid": uid, "gid": gid, "last_read_id": last_read_id, "last_read_at": now}
+        for (uid, gid), last_read_id in positions.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MessageReadCursor.uid, MessageReadCursor.gid],
+        set_={
+            "last_read_id": func.greatest(MessageReadCursor.last_read_id, stmt.excluded.last_read_id),
+            "last_read_at": stmt.excluded.last_read_at,
+        },
+    )
+    db.execute(stmt)
+
+
+# read_by for each message as the old array had it: the sender plus every member whose cursor is at or past it
+def read_by(db, gid: int, messages):
+    cursors = db.query(MessageReadCursor.uid, MessageReadCursor.last_read_id).filter(
+        MessageReadCursor.gid == gid).all()
+    result = []
+    for message in messages:
+        readers = [uid for uid, last_read_id in cursors if last_read_id >= message.id and uid != message.sender_uid]
+        result.append([message.sender_uid] + readers)
+    return result
+
+
+# (gid, group_name, unread_count, latest id, sender_uid, sender_name, text, timestamp) for every group uid
+# is a member of, most recently active first
+# starts from the user's memberships, then per group counts at most cap messages past the cursor and
+# fetches the newest one, both as short range scans on ix_messages_gid_id
+def unread_summary(db, uid: str, only_unread: bool = False, cap: int = UNREAD_COUNT_CAP):
+    last_read_id = func.coalesce(MessageReadCursor.last_read_id, 0)
+    pending = (
+        select(Message.id)
+        .where(Message.gid == Member.gid, Message.id > last_read_id, Message.sender_uid != uid)
+        .limit(cap)
+        .correlate(Member, MessageReadCursor)
+        .subquery()
+    )
+    unread = select(func.count().label("unread_count")).select_from(pending).lateral("unread")
+    latest = (
+        select(Message.id, Message.sender_uid, Message.sender_name, Message.text, Message.timestamp)
+        .where(Message.gid == Member.gid)
+        .order_by(Message.id.desc())
+        .limit(1)
+        .lateral("latest")
+    )
+    query = (
+        select(Member.gid, Group.group_name, unread.c.unread_count, latest.c.id, latest.c.sender_uid,
+               latest.c.sender_name, latest.c.text, latest.c.timestamp)
+        .select_from(Member)
+        .join(Group, Group.gid == Member.gid)
+        .outerjoin(MessageReadCursor, and_(MessageReadCursor.uid == Member.uid, MessageReadCursor.gid == Member.gid))
+        .join(unread, true())
+        .outerjoin(latest, true())
+        .where(Member.uid == uid)
+        .order_by(latest.c.id.desc().nulls_last(), Member.gid)
+    )
+    if only_unread:
+        query = query.where(unread.c.unread_count > 0)
+    return db.execute(query).all()
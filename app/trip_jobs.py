@@ -0,0 +1,192 @@
+import datetime
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import or_, text
+
+from app.global_vars import TRIP_JOB_WORKERS, TRIP_JOB_MAX_PER_USER, TRIP_JOB_LEASE, TRIP_JOB_HEARTBEAT, \
+    TRIP_JOB_MAX_ATTEMPTS
+from app.instrumentation import log_event
+from app.models import TripJob
+from schemas.trip import TripJobStatusEnum
+
+ACTIVE_STATUSES = (TripJobStatusEnum.queued, TripJobStatusEnum.running)
+
+
+class TooManyJobs(Exception):
+    pass
+
+
+# runs trip generation jobs on a bounded pool of worker threads
+# job state lives in the trip_jobs table so any api worker can report on or cancel a job,
+# run_job(db, job) does the actual work and returns the flushed Trip row
+# every job this process holds carries a lease it renews every heartbeat; when a worker dies (restart, --reload,
+# crash) its leases run out and the next sweep, in whichever worker gets there first, requeues the jobs
+class TripJobRunner:
+    def __init__(self, session_factory, run_job, max_workers: int = TRIP_JOB_WORKERS,
+                 max_per_user: int = TRIP_JOB_MAX_PER_USER, lease: float = TRIP_JOB_LEASE,
+                 heartbeat: float = TRIP_JOB_HEARTBEAT, max_attempts: int = TRIP_JOB_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.run_job = run_job
+        self.max_per_user = max_per_user
+        self.lease = lease
+        self.heartbeat = heartbeat
+        self.max_attempts = max_attempts
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="trip-job")
+        self._futures = {}  # jid -> Future, for jobs accepted by this process
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _lease_until(self):
+        return datetime.datetime.utcnow() + datetime.timedelta(seconds=self.lease)
+
+    # queue a job, raises TooManyJobs when the user already has max_per_user jobs in flight
+    # jobs whose lease ran out don't count, their worker is gone and the sweep will requeue or fail them
+    def submit(self, db, uid: str, group: int, params: dict) -> TripJob:
+        self.start()
+        # serialise submissions per user across every api worker so the limit can't be raced past
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:uid))"), {"uid": uid})
+        active = db.query(TripJob).filter(TripJob.uid == uid, TripJob.status.in_(ACTIVE_STATUSES),
+                                          TripJob.lease_expires_at > datetime.datetime.utcnow()).count()
+        if active >= self.max_per_user:
+            db.rollback()
+            raise TooManyJobs(f"User {uid} already has {active} trips generating")
+
+        job = TripJob(uid=uid, group=group, params=params, status=TripJobStatusEnum.queued,
+                      lease_expires_at=self._lease_until())
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._schedule(job.jid)
+        return job
+
+    def _schedule(self, jid: int):
+        with self._lock:
+            future = self._futures[jid] = self._pool.submit(self._run, jid)
+        future.add_done_callback(lambda done: self._drop(jid, done))
+
+    # forget a finished run, unless a sweep already handed the job to a newer one
+    def _drop(self, jid: int, future):
+        with self._lock:
+            if self._futures.get(jid) is future:
+                del self._futures[jid]
+
+    # push out the lease of every job this process still holds
+    def renew_leases(self):
+        with self._lock:
+            held = list(self._futures)
+        if not held:
+            return
+        db = self.session_factory()
+        try:
+            db.query(TripJob).filter(TripJob.jid.in_(held), TripJob.status.in_(ACTIVE_STATUSES)).update(
+                {TripJob.lease_expires_at: self._lease_until()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    # claim active jobs whose lease ran out and run them here again, or fail the ones that already had
+    # max_attempts runs; SKIP LOCKED lets every worker sweep at once without two of them taking the same job
+    def recover(self) -> int:
+        db = self.session_factory()
+        try:
+            expired = (
+                db.query(TripJob)
+                .filter(TripJob.status.in_(ACTIVE_STATUSES),
+                        or_(TripJob.lease_expires_at.is_(None),
+                            TripJob.lease_expires_at < datetime.datetime.utcnow()))
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            requeued = []
+            for job in expired:
+                job.attempts += 1
+                job.updated_at = datetime.datetime.utcnow()
+                if job.attempts >= self.max_attempts:
+                    job.status = TripJobStatusEnum.failed
+                    job.error = "The server stopped before the trip was generated"
+                else:
+                    job.status = TripJobStatusEnum.queued
+                    job.lease_expires_at = self._lease_until()
+                    requeued.append(job.jid)
+            db.commit()
+        finally:
+            db.close()
+
+        for jid in requeued:
+            self._schedule(jid)
+        if expired:
+            log_event(logging.WARNING, "trip_jobs_recovered", requeued=len(requeued),
+                      failed=len(expired) - len(requeued))
+        return len(expired)
+
+    def _loop(self):
+        while True:
+            try:
+                self.renew_leases()
+                self.recover()
+            except Exception as e:
+                log_event(logging.ERROR, "trip_job_sweep_failed", error=str(e))
+            if self._stop.wait(self.heartbeat):
+                return
+
+    # start renewing leases and sweeping, the first sweep runs right away so jobs orphaned by the previous
+    # process are picked up on startup
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="trip-job-lease", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # cancel a queued or running job; a running one finishes its fetch but never saves its trip
+    def cancel(self, db, jid: int) -> bool:
+        cancelled = (
+            db.query(TripJob)
+            .filter(TripJob.jid == jid, TripJob.status.in_(ACTIVE_STATUSES))
+            .update({TripJob.status: TripJobStatusEnum.cancelled, TripJob.updated_at: datetime.datetime.utcnow()},
+                    synchronize_session=False)
+        )
+        db.commit()
+        with self._lock:
+            future = self._futures.get(jid)
+        if future is not None:
+            future.cancel()
+        return cancelled > 0
+
+    # move the job from one status to another, only if nobody else (e.g. a cancel) got there first
+    @staticmethod
+    def _transition(db, jid: int, from_status, values: dict) -> bool:
+        values = {**values, TripJob.updated_at: datetime.datetime.utcnow()}
+        return db.query(TripJob).filter(TripJob.jid == jid, TripJob.status == from_status).update(
+            values, synchronize_session=False) > 0
+
+    def _run(self, jid: int):
+        db = self.session_factory()
+        try:
+            if not self._transition(db, jid, TripJobStatusEnum.queued, {TripJob.status: TripJobStatusEnum.running}):
+                db.rollback()
+                return  # cancelled before it started
+            db.commit()
+
+            job = db.query(TripJob).filter(TripJob.jid == jid).first()
+            trip = self.run_job(db, job)
+            # the trip is only kept if the job wasn't cancelled in the meantime
+            if not self._transition(db, jid, TripJobStatusEnum.running,
+                                    {TripJob.status: TripJobStatusEnum.done, TripJob.trip_id: trip.tid}):
+                db.rollback()
+                return
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            log_event(logging.ERROR, "trip_job_failed", jid=jid, error=str(e))
+            self._transition(db, jid, TripJobStatusEnum.running,
+                             {TripJob.status: TripJobStatusEnum.failed, TripJob.error: str(e)[:500]})
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,75 @@
+from sqlalchemy import update
+
+from app.models import Trip
+from schemas.trip import TripPatchOpEnum
+
+_trips = Trip.__table__
+
+
+class InvalidPatch(ValueError):
+    pass
+
+
+class PatchConflict(Exception):
+    def __init__(self, current_version: int):
+        super().__init__(f"Trip was changed by someone else, now at version {current_version}")
+        self.current_version = current_version
+
+
+def _landmark(op):
+    if op.landmark is None:
+        raise InvalidPatch(f"{op.op.value} needs a landmark")
+    return op.landmark.dict()
+
+
+def _check_index(op, index: int, length: int):
+    if index >= length:
+        raise InvalidPatch(f"{op.op.value} refers to position {index} of a {length} landmark list")
+
+
+# the landmark list after applying the ops in order, each op seeing the result of the ones before it
+def patched_landmarks(landmarks, ops):
+    landmarks = list(landmarks) if isinstance(landmarks, list) else []
+    for op in ops:
+        if op.op != TripPatchOpEnum.add and op.index is None:
+            raise InvalidPatch(f"{op.op.value} needs an index")
+
+        if op.op == TripPatchOpEnum.add:
+            if op.index is None:
+                landmarks.append(_landmark(op))
+            else:
+                _check_index(op, op.index, len(landmarks) + 1)
+                landmarks.insert(op.index, _landmark(op))
+        elif op.op == TripPatchOpEnum.remove:
+            _check_index(op, op.index, len(landmarks))
+            del landmarks[op.index]
+        elif op.op == TripPatchOpEnum.replace:
+            _check_index(op, op.index, len(landmarks))
+            landmarks[op.index] = _landmark(op)
+        elif op.op == TripPatchOpEnum.move:
+            if op.to is None:
+                raise InvalidPatch("move needs to")
+            _check_index(op, op.index, len(landmarks))
+            _check_index(op, op.to, len(landmarks))
+            landmarks.insert(op.to, landmarks.pop(op.index))
+    return landmarks
+
+
+# apply the ops to the trip if it is still at version, returning the updated row
+# the row is locked while the ops are applied so a concurrent edit waits and then sees the new version;
+# returns None when the trip doesn't exist, raises PatchConflict when it moved past version and
+# InvalidPatch when an op points outside the list
+def apply_patch(db, tid: int, version: int, ops):
+    current = db.query(Trip.landmarks, Trip.version).filter(Trip.tid == tid).with_for_update().first()
+    if current is None:
+        return None
+    if current.version != version:
+        raise PatchConflict(current.version)
+
+    return db.execute(
+        update(_trips)
+        .where(_trips.c.tid == tid)
+        .values(landmarks=patched_landmarks(current.landmarks, ops), version=_trips.c.version + 1)
+        .returning(_trips.c.tid, _trips.c.group, _trips.c.uid, _trips.c.location_lat, _trips.c.location_long,
+                   _trips.c.landmarks, _trips.c.num_destinations, _trips.c.version)
+    ).first()
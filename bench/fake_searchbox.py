@@ -0,0 +1,185 @@
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SEARCHBOX_PATH = "/search/searchbox/v1/forward"
+
+
+# deterministic fake POIs for one search term around a point, so every run sees the same candidates
+def synthetic_features(search_query: str, lat: float, lng: float, limit: int = 10, spread: float = 0.3):
+    seed = hashlib.sha1(f"{search_query}|{round(lat, 3)}|{round(lng, 3)}".encode()).hexdigest()
+    rng = random.Random(seed)
+    features = []
+    for i in range(limit):
+        # a few entries come back slightly renamed/moved, like the same place under different search terms
+        name = f"{search_query.title()} {rng.randint(1, 40)}"
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point",
+                         "coordinates": [lng + rng.uniform(-spread, spread), lat + rng.uniform(-spread, spread)]},
+            "properties": {"name": name, "feature_type": "poi"},
+        })
+    return features
+
+
+# a recording is {"proximity": [lng, lat], "responses": {search term: [features]}} captured from the real API
+# features are shifted by the offset between the recorded and the requested proximity
+def recorded_features(recording, search_query: str, lat: float, lng: float, limit: int = 10):
+    features = recording["responses"].get(search_query)
+    if features is None:
+        return None
+    rec_lng, rec_lat = recording["proximity"]
+    d_lat, d_lng = lat - rec_lat, lng - rec_lng
+    shifted = []
+    for feat in features[:limit]:
+        f_lng, f_lat = feat["geometry"]["coordinates"][:2]
+        shifted.append({**feat, "geometry": {**feat["geometry"], "coordinates": [f_lng + d_lng, f_lat + d_lat]}})
+    return shifted
+
+
+# local stand-in for the Searchbox forward endpoint
+# latency is latency_ms plus uniform jitter, error_rate answers 503, rate_limit_rate answers 429 and
+# stall_rate holds the response for stall_ms (past the client's read timeout with the defaults)
+class FakeSearchbox:
+    def __init__(self, latency_ms: float = 80.0, jitter_ms: float = 40.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, stall_rate: float = 0.0, stall_ms: float = 6000.0,
+                 recording=None, seed: int = 0, host: str = "127.0.0.1", port: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self.recording = recording
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "stalled": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{SEARCHBOX_PATH}"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    # pick the outcome and delay of one request
+    def _draw(self):
+        with self._lock:
+            roll = self._rng.random()
+            delay = self.latency_ms + self._rng.uniform(0, self.jitter_ms)
+        if roll < self.stall_rate:
+            return "stalled", self.stall_ms
+        roll -= self.stall_rate
+        if roll < self.error_rate:
+            return "errors", delay
+        roll -= self.error_rate
+        if roll < self.rate_limit_rate:
+            return "rate_limited", delay
+        return "ok", delay
+
+    def respond(self, path: str):
+        parsed = urllib.parse.urlparse(path)
+        if parsed.path != SEARCHBOX_PATH:
+            return 404, {"message": "Not Found"}
+        params = urllib.parse.parse_qs(parsed.query)
+        try:
+            search_query = params["q"][0]
+            lng, lat = (float(v) for v in params["proximity"][0].split(","))
+            limit = int(params.get("limit", ["10"])[0])
+        except (KeyError, ValueError):
+            return 400, {"message": "Bad Request"}
+
+        self._count("requests")
+        outcome, delay = self._draw()
+        time.sleep(delay / 1000.0)
+        self._count(outcome)
+        if outcome == "errors":
+            return 503, {"message": "Service Unavailable"}
+        if outcome == "rate_limited":
+            return 429, {"message": "Too Many Requests"}
+
+        features = None
+        if self.recording is not None:
+            features = recorded_features(self.recording, search_query, lat, lng, limit)
+        if features is None:
+            features = synthetic_features(search_query, lat, lng, limit)
+        return 200, {"type": "FeatureCollection", "features": features}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_GET(self):
+                status, payload = fake.respond(self.path)
+                body = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up on a stalled response
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-searchbox", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# capture real Searchbox responses for every search term around one point, for use as a recording
+def record(lat: float, lng: float, dest: str, max_distance: float = 50.0):
+    from app.geo import bounding_box
+    from app.http_client import mapbox_client
+    from app.landmark_fetch import build_search_url
+    from app.landmark_providers import QUERY_MAPPING
+
+    bbox = ",".join(str(v) for v in bounding_box(lat, lng, max_distance))
+    terms = sorted({term for terms in QUERY_MAPPING.values() for term in terms})
+    responses = {}
+    for term in terms:
+        res = mapbox_client.get(build_search_url(term, lat, lng, bbox))
+        if res.status_code == 200:
+            responses[term] = res.json().get("features", [])
+    with open(dest, "w") as f:
+        json.dump({"proximity": [lng, lat], "responses": responses}, f)
+    return len(responses)
+
+
+if __name__ == "__main__":
+    # python -m bench.fake_searchbox record <lat> <lng> <dest.json>   capture a recording from the real API
+    # python -m bench.fake_searchbox serve [port]                     run the stand-in on its own
+    if len(sys.argv) == 5 and sys.argv[1] == "record":
+        count = record(float(sys.argv[2]), float(sys.argv[3]), sys.argv[4])
+        print(f"Recorded {count} search terms to {sys.argv[4]}")
+    elif len(sys.argv) in (2, 3) and sys.argv[1] == "serve":
+        server = FakeSearchbox(port=int(sys.argv[2]) if len(sys.argv) == 3 else 8089).start()
+        print(f"Fake Searchbox at {server.url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+    else:
+        sys.exit("usage: python -m bench.fake_searchbox record <lat> <lng> <dest.json> | serve [port]")
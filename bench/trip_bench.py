@@ -0,0 +1,270 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from bench.fake_searchbox import FakeSearchbox
+
+# spots used when the cache is meant to be warm, each is fetched once before timing starts
+WARM_LOCATIONS = [(40.7128, -74.0060), (39.9526, -75.1652), (41.8781, -87.6298), (37.7749, -122.4194),
+                  (47.6062, -122.3321)]
+
+DEFAULT_PARAMS = {
+    "landmark_types": "Food,Parks,Historic,Museums",
+    "max_distance": 50.0,
+    "num_destinations": 6,
+    "category_counts": '{"Food": 2, "Parks": 2, "Historic": 1, "Museums": 1}',
+}
+
+
+def git_revision():
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], text=True,
+                                             stderr=subprocess.DEVNULL).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return sha, dirty
+
+
+# request locations: a handful of repeated spots (warm) or a new ~1km tile every request (cold)
+def locations(cache_mode: str, count: int, seed: int):
+    if cache_mode == "warm":
+        return [WARM_LOCATIONS[i % len(WARM_LOCATIONS)] for i in range(count)]
+    rng = random.Random(seed)
+    return [(rng.uniform(30.0, 47.0), rng.uniform(-120.0, -75.0)) for _ in range(count)]
+
+
+# run count calls of call(lat, lng) on `concurrency` threads, returning per-call latencies and the error count
+def drive(call, points, concurrency: int):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    todo = iter(points)
+
+    def worker():
+        while True:
+            with lock:
+                point = next(todo, None)
+            if point is None:
+                return
+            started = time.perf_counter()
+            try:
+                ok = call(*point)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+# mean milliseconds per stage observed between two trip_stage_seconds snapshots
+def stage_means(before, after):
+    means = {}
+    for labels, (total, count) in after.items():
+        prev_total, prev_count = before.get(labels, (0.0, 0))
+        if count > prev_count:
+            means[dict(labels)["stage"]] = round((total - prev_total) / (count - prev_count) * 1000, 3)
+    return dict(sorted(means.items()))
+
+
+# each target is a callable (lat, lng) -> success
+# get_landmarks runs the fetch/selection pipeline alone and needs no database, generate_trip goes through the api
+def make_targets(names, uid: str, created):
+    from app import landmark_pipeline
+
+    targets = {}
+    if "get_landmarks" in names:
+        def get_landmarks(lat, lng):
+            landmark_pipeline.get_landmarks(lat, lng, DEFAULT_PARAMS["landmark_types"],
+                                            DEFAULT_PARAMS["max_distance"], DEFAULT_PARAMS["num_destinations"],
+                                            DEFAULT_PARAMS["category_counts"])
+            return True
+
+        targets["get_landmarks"] = get_landmarks
+
+    if "generate_trip" in names:
+        from fastapi.testclient import TestClient
+        from app.main import app
+
+        clients = threading.local()
+
+        def generate_trip(lat, lng):
+            if not hasattr(clients, "client"):
+                clients.client = TestClient(app)
+            res = clients.client.post("/trips/generate_trip", params={
+                "group": 0, "uid": uid, "location_lat": lat, "location_long": lng, **DEFAULT_PARAMS})
+            if res.status_code != 200:
+                return False
+            created.append(res.json()["trip_id"])
+            return True
+
+        targets["generate_trip"] = generate_trip
+    return targets
+
+
+def run(args):
+    from app import landmark_fetch
+    from app.http_client import mapbox_client
+    from app.instrumentation import STAGE_SECONDS
+    from app.landmark_pipeline import landmark_cache
+
+    recording = None
+    if args.recording:
+        with open(args.recording) as f:
+            recording = json.load(f)
+    # in-process by default; at high concurrency the stand-in competes with the app for the GIL, so it can also
+    # run on its own (python -m bench.fake_searchbox serve) and be passed in with --searchbox-url
+    fake = None
+    if args.searchbox_url:
+        landmark_fetch.MAPBOX_SEARCHBOX_URL = args.searchbox_url
+    else:
+        fake = FakeSearchbox(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                             rate_limit_rate=args.rate_limit_rate, stall_rate=args.stall_rate, recording=recording,
+                             seed=args.seed).start()
+        landmark_fetch.MAPBOX_SEARCHBOX_URL = fake.url
+
+    created = []
+    targets = make_targets(args.targets, args.uid, created)
+    runs = []
+    try:
+        for name, call in targets.items():
+            for concurrency in args.concurrency:
+                landmark_cache.clear()
+                mapbox_client.breaker.record_success()
+                points = locations(args.cache, args.requests, args.seed + concurrency)
+                if args.cache == "warm":
+                    for point in WARM_LOCATIONS:
+                        call(*point)
+
+                upstream_before = dict(fake.counts) if fake else {}
+                stages_before = STAGE_SECONDS.snapshot()
+                latencies, errors, seconds = drive(call, points, concurrency)
+                ms = np.asarray(latencies) * 1000
+                result = {
+                    "target": name,
+                    "concurrency": concurrency,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "seconds": round(seconds, 3),
+                    "throughput": round(len(latencies) / seconds, 2),
+                    "latency_ms": {
+                        "p50": round(float(np.percentile(ms, 50)), 2),
+                        "p95": round(float(np.percentile(ms, 95)), 2),
+                        "p99": round(float(np.percentile(ms, 99)), 2),
+                        "mean": round(float(ms.mean()), 2),
+                        "max": round(float(ms.max()), 2),
+                    },
+                    "stages_ms": stage_means(stages_before, STAGE_SECONDS.snapshot()),
+                    "upstream": {key: fake.counts[key] - upstream_before[key] for key in upstream_before},
+                }
+                runs.append(result)
+                print(f"{name:<14} c={concurrency:<3} {result['throughput']:>8} req/s  "
+                      f"p50 {result['latency_ms']['p50']:>8}ms  p95 {result['latency_ms']['p95']:>8}ms  "
+                      f"p99 {result['latency_ms']['p99']:>8}ms  errors {errors}")
+    finally:
+        if fake:
+            fake.stop()
+        if created:
+            from app.models import Trip
+            from routers import trips
+            db = trips.SessionLocal()
+            try:
+                db.query(Trip).filter(Trip.tid.in_(created)).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                db.close()
+    return runs
+
+
+# (target, concurrency, what, baseline, current) for every run that got worse than tolerance allows
+def regressions(baseline, current, tolerance: float):
+    previous = {(r["target"], r["concurrency"]): r for r in baseline["runs"]}
+    found = []
+    for r in current["runs"]:
+        old = previous.get((r["target"], r["concurrency"]))
+        if old is None:
+            continue
+        for pct in ("p50", "p95", "p99"):
+            if r["latency_ms"][pct] > old["latency_ms"][pct] * (1 + tolerance):
+                found.append((r["target"], r["concurrency"], pct, old["latency_ms"][pct], r["latency_ms"][pct]))
+        if r["throughput"] < old["throughput"] * (1 - tolerance):
+            found.append((r["target"], r["concurrency"], "throughput", old["throughput"], r["throughput"]))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark trip generation against a local Searchbox stand-in")
+    parser.add_argument("--targets", type=lambda s: s.split(","), default=["get_landmarks", "generate_trip"],
+                        help="comma separated: get_landmarks, generate_trip")
+    parser.add_argument("--concurrency", type=lambda s: [int(v) for v in s.split(",")], default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="requests per target and concurrency level")
+    parser.add_argument("--cache", choices=("cold", "warm"), default="cold")
+    parser.add_argument("--uid", default=None, help="existing user the generate_trip target creates trips for")
+    parser.add_argument("--searchbox-url", default=None, help="use an already running stand-in instead")
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Searchbox calls answering 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share answering 429")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="share that never answer in time")
+    parser.add_argument("--recording", default=None,
+                        help="recorded responses from python -m bench.fake_searchbox record")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="results file, defaults to bench/results/<commit>.json")
+    parser.add_argument("--baseline", default=None, help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed slowdown before it counts as a regression")
+    args = parser.parse_args(argv)
+
+    if "generate_trip" in args.targets and args.uid is None:
+        print("generate_trip needs --uid, skipping it")
+        args.targets = [t for t in args.targets if t != "generate_trip"]
+
+    sha, dirty = git_revision()
+    results = {
+        "commit": sha,
+        "dirty": dirty,
+        "timestamp": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "params": DEFAULT_PARAMS,
+        "runs": run(args),
+    }
+
+    name = f"{(sha or 'unknown')[:12]}{'-dirty' if dirty else ''}.json"
+    output = args.output or os.path.join("bench", "results", name)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(baseline, results, args.tolerance)
+        for target, concurrency, what, old, new in found:
+            print(f"REGRESSION {target} c={concurrency} {what}: {old} -> {new}")
+        if found:
+            return 1
+        print(f"No regressions against {args.baseline} (commit {baseline.get('commit')})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -24,35 +24,104 @@ class _ChatPageState extends State<ChatPage> {
   final TextEditingController _messageController = TextEditingController();
   List<Map<String, dynamic>> _messages = [];
   bool _isLoading = false;
-  Timer? _timer;
+  bool _hasOlder = false;  // older history exists on the server
+  http.Client? _streamClient;
+  bool _disposed = false;
 
   @override
   void initState() {
     super.initState();
-    fetchMessages();  // fetch initial messages
-    _timer = Timer.periodic(const Duration(seconds: 5), (_) => fetchMessages());  // refresh messages every 5 seconds
+    fetchMessages().then((_) => listenForMessages());  // fetch initial messages, then follow the live stream
   }
 
   @override
   void dispose() {
-    _timer?.cancel();  // cancel timer when the widget is disposed
+    _disposed = true;
+    _streamClient?.close();  // end the live stream when the widget is disposed
     _messageController.dispose();  // dispose message controller
     super.dispose();
   }
 
+  // fetch only what's new since the last message we have (the newest page on first load)
   Future<void> fetchMessages() async {
+    final lastId = _messages.isEmpty ? null : _messages.last['id'];
+    var hasMore = true;
+    var received = 0;
+
+    while (hasMore) {
+      final after = _messages.isEmpty ? '' : '?after_id=${_messages.last['id']}';
+      final response = await http.get(
+        Uri.parse('http://$ip/messages/sync/${widget.gid}$after'),
+      );
+      if (response.statusCode != 200) {
+        print('Failed to fetch messages: ${response.body}');
+        return;
+      }
+
+      final data = json.decode(response.body);
+      final page = List<Map<String, dynamic>>.from(data['messages']);
+      setState(() {
+        if (lastId == null && received == 0) _hasOlder = data['has_more'];
+        _messages.addAll(page);  // update messages list
+      });
+      received += page.length;
+      // the first load only needs the newest page, refreshes catch up fully
+      hasMore = lastId != null && data['has_more'];
+    }
+
+    if (received > 0) {
+      await markMessagesAsRead();  // ensure read_by gets updated
+    }
+  }
+
+  // follow new messages as the server pushes them (server-sent events) instead of polling
+  // every (re)connect resumes after the newest message we have, so nothing is missed while disconnected
+  Future<void> listenForMessages() async {
+    var retryDelay = 1;
+    while (!_disposed) {
+      final after = _messages.isEmpty ? 0 : _messages.last['id'];
+      _streamClient = http.Client();
+      try {
+        final response = await _streamClient!.send(
+          http.Request('GET', Uri.parse('http://$ip/messages/stream/${widget.gid}?after_id=$after')),
+        );
+        if (response.statusCode == 200) {
+          retryDelay = 1;
+          await for (final line in response.stream.transform(utf8.decoder).transform(const LineSplitter())) {
+            if (!line.startsWith('data:')) continue;  // skip ids, event names and heartbeats
+            final message = Map<String, dynamic>.from(json.decode(line.substring(5)));
+            if (_disposed || _messages.any((m) => m['id'] == message['id'])) continue;
+            setState(() => _messages.add(message));
+            markMessagesAsRead();
+          }
+        } else {
+          print('Failed to open message stream: ${response.statusCode}');
+        }
+      } catch (e) {
+        if (!_disposed) print('Message stream interrupted: $e');
+      } finally {
+        _streamClient?.close();
+      }
+      if (_disposed) break;
+      await Future.delayed(Duration(seconds: retryDelay));  // back off before reconnecting
+      retryDelay = retryDelay < 30 ? retryDelay * 2 : 30;
+    }
+  }
+
+  // page back through history, one page before the oldest message we have
+  Future<void> fetchOlderMessages() async {
+    if (_messages.isEmpty) return;
     final response = await http.get(
-      Uri.parse('http://$ip/messages/get_messages/${widget.gid}'),
+      Uri.parse('http://$ip/messages/sync/${widget.gid}?before_id=${_messages.first['id']}'),
     );
-
     if (response.statusCode == 200) {
-      final List<dynamic> data = json.decode(response.body);
+      final data = json.decode(response.body);
       setState(() {
-        _messages = data.cast<Map<String, dynamic>>();  // update messages list
+        _messages.insertAll(0, List<Map<String, dynamic>>.from(data['messages']));
+        _hasOlder = data['has_more'];
       });
-      await markMessagesAsRead();  // ensure read_by gets updated
     } else {
-      print('Failed to fetch messages: ${response.body}');
+      print('Failed to fetch older messages: ${response.body}');
     }
   }
 
@@ -75,8 +144,7 @@ class _ChatPageState extends State<ChatPage> {
       );
 
       if (response.statusCode == 200) {
-        _messageController.clear();  // clear message input after sending
-        fetchMessages();  // refresh messages list
+        _messageController.clear();  // clear message input after sending, the stream delivers it
       } else {
         print('Failed to send message: ${response.body}');
       }
@@ -87,9 +155,12 @@ class _ChatPageState extends State<ChatPage> {
 
   Future<void> markMessagesAsRead() async {
     print('Marking messages as read...');
+    // only mark what was actually shown, messages that arrived since stay unread
+    final ids = _messages.map((m) => m['id']).whereType<int>();
+    final lastReadId = ids.isEmpty ? '' : '?last_read_id=${ids.reduce((a, b) => a > b ? a : b)}';
     try {
       final response = await http.post(
-        Uri.parse('http://$ip/messages/mark_read/${widget.gid}/${widget.senderUid}'),
+        Uri.parse('http://$ip/messages/mark_read/${widget.gid}/${widget.senderUid}$lastReadId'),
       );
 
       print("Mark read status: ${response.statusCode} - ${response.body}");
@@ -107,6 +178,12 @@ class _ChatPageState extends State<ChatPage> {
     return Scaffold(
       appBar: AppBar(
         title: const Text('Group Chat'),
+        actions: [
+          IconButton(
+            icon: const Icon(Icons.search),
+            onPressed: () => showSearch(context: context, delegate: _ChatSearchDelegate(widget.gid)),  // search this chat
+          ),
+        ],
       ),
       body: Column(
         children: [
@@ -115,8 +192,15 @@ class _ChatPageState extends State<ChatPage> {
                 ? const Center(child: CircularProgressIndicator())  // show loading indicator if fetching messages
                 : ListView.builder(
               reverse: true,  // show newest messages at the bottom
-              itemCount: _messages.length,
+              itemCount: _messages.length + (_hasOlder ? 1 : 0),
               itemBuilder: (context, index) {
+                if (index == _messages.length) {
+                  // top of the list, load the page before the oldest message shown
+                  return TextButton(
+                    onPressed: fetchOlderMessages,
+                    child: const Text('Load earlier messages'),
+                  );
+                }
                 final message = _messages[_messages.length - 1 - index];  // get the message for the current index
                 final isOwnMessage = message['sender_uid'] == widget.senderUid;  // check if the message is sent by the current user
                 return Container(
@@ -171,3 +255,109 @@ class _ChatPageState extends State<ChatPage> {
     );
   }
 }
+
+// full-text search over the group's chat, best matches first, more loaded from the server as you scroll
+class _ChatSearchDelegate extends SearchDelegate<void> {
+  final int gid;
+
+  _ChatSearchDelegate(this.gid);
+
+  // one page of hits for the current query, plus the cursor of the next page
+  Future<Map<String, dynamic>> _search(String? cursor) async {
+    final params = {'q': query, if (cursor != null) 'cursor': cursor};
+    final response = await http.get(
+      Uri.parse('http://$ip/messages/search/$gid').replace(queryParameters: params),
+    );
+    if (response.statusCode != 200) {
+      throw Exception('Search failed: ${response.body}');
+    }
+    return json.decode(response.body);
+  }
+
+  // the snippet with the matched words (between \x02 and \x03 from the server) in bold
+  // it is plain text, the server blanks those two characters out of message text so they only ever mark matches
+  Widget _snippet(String snippet) {
+    final spans = <TextSpan>[];
+    final parts = snippet.split('\x02');
+    spans.add(TextSpan(text: parts.first));
+    for (final part in parts.skip(1)) {
+      final end = part.indexOf('\x03');
+      if (end < 0) {
+        spans.add(TextSpan(text: part));
+        continue;
+      }
+      spans.add(TextSpan(text: part.substring(0, end), style: const TextStyle(fontWeight: FontWeight.bold)));
+      spans.add(TextSpan(text: part.substring(end + 1)));
+    }
+    return RichText(text: TextSpan(style: const TextStyle(color: Colors.black), children: spans));
+  }
+
+  @override
+  List<Widget> buildActions(BuildContext context) => [
+        IconButton(icon: const Icon(Icons.clear), onPressed: () => query = ''),
+      ];
+
+  @override
+  Widget buildLeading(BuildContext context) => IconButton(
+        icon: const Icon(Icons.arrow_back),
+        onPressed: () => close(context, null),
+      );
+
+  @override
+  Widget buildSuggestions(BuildContext context) => const SizedBox.shrink();
+
+  @override
+  Widget buildResults(BuildContext context) {
+    if (query.trim().isEmpty) return const SizedBox.shrink();
+    final hits = <Map<String, dynamic>>[];
+    String? nextCursor;
+    var truncated = false;  // the server only ranked the newest matches of a very common query
+    var loading = false;
+    var started = false;
+
+    return StatefulBuilder(
+      builder: (context, setState) {
+        Future<void> loadMore() async {
+          if (loading) return;
+          loading = true;
+          try {
+            final page = await _search(nextCursor);
+            setState(() {
+              hits.addAll(List<Map<String, dynamic>>.from(page['results']));
+              nextCursor = page['next_cursor'];
+              truncated = page['truncated'] ?? false;
+            });
+          } catch (e) {
+            print('Error searching messages: $e');
+          } finally {
+            loading = false;
+          }
+        }
+
+        if (!started) {
+          started = true;
+          loadMore();  // first page
+        }
+        return ListView.builder(
+          itemCount: hits.length + (nextCursor != null || truncated ? 1 : 0),
+          itemBuilder: (context, index) {
+            if (index == hits.length && nextCursor == null) {
+              return const ListTile(
+                subtitle: Text('Only the most recent matches are shown, add more words to find older messages'),
+              );
+            }
+            if (index == hits.length) {
+              loadMore();  // reached the end of what's loaded
+              return const Center(child: CircularProgressIndicator());
+            }
+            final hit = hits[index];
+            return ListTile(
+              title: Text(hit['sender_name'], style: const TextStyle(fontWeight: FontWeight.bold)),
+              subtitle: _snippet(hit['snippet']),
+            );
+          },
+        );
+      },
+    );
+  }
+}
@@ -38,6 +38,7 @@ class _TripTabPageState extends State<CreateRandomTripPage> with SingleTickerPro
   double _maxTripDistance = 50.0;  // maximum trip distance in km
   double _maxInterlandmarkDistance = 20.0;  // maximum distance between landmarks
   int _numDestinations = 6;  // number of destinations in the trip
+  List<String> streamedLandmarks = [];  // landmark names received so far while the trip is generating
 
   late AnimationController _animationController;  // controller for animations
   late Animation<Offset> _slideAnimation;  // slide animation for address input
@@ -146,11 +147,14 @@ class _TripTabPageState extends State<CreateRandomTripPage> with SingleTickerPro
       return;
     }
 
-    setState(() => isLoading = true);
+    setState(() {
+      isLoading = true;
+      streamedLandmarks = [];
+    });
 
     String landmarkTypes = selectedCategories.join(",");
     final url = Uri.parse(
-        "http://$ip/trips/generate_trip"
+        "http://$ip/trips/generate_trip_stream"
             "?group=${widget.group}"
             "&uid=${widget.uid}"
             "&location_lat=$currentLat"
@@ -161,15 +165,32 @@ class _TripTabPageState extends State<CreateRandomTripPage> with SingleTickerPro
             "&num_destinations=$_numDestinations"
     );
 
+    final client = http.Client();
     try {
-      final response = await http.post(url);
+      // the server sends one NDJSON line per category as soon as it is picked, then the saved trip
+      final response = await client.send(http.Request('POST', url));
       if (response.statusCode == 200) {
-        final data = json.decode(response.body);
-        final tripId = data['tid'];
-        ScaffoldMessenger.of(context).showSnackBar(
-          const SnackBar(content: Text("Trip successfully created!")),
-        );
-        Navigator.pop(context);
+        var saved = false;  // the stream ends with a trip line once saved, or an error line if that failed
+        await for (final line in response.stream.transform(utf8.decoder).transform(const LineSplitter())) {
+          if (line.trim().isEmpty) continue;
+          final event = json.decode(line);
+          if (event['event'] == 'landmarks') {
+            setState(() => streamedLandmarks.addAll(
+                (event['landmarks'] as List).map((l) => l['name'] as String)));
+          } else if (event['event'] == 'trip') {
+            saved = true;
+          }
+        }
+        if (saved) {
+          ScaffoldMessenger.of(context).showSnackBar(
+            const SnackBar(content: Text("Trip successfully created!")),
+          );
+          Navigator.pop(context);
+        } else {
+          ScaffoldMessenger.of(context).showSnackBar(
+            const SnackBar(content: Text("Error generating trip.")),
+          );
+        }
       } else {
         ScaffoldMessenger.of(context).showSnackBar(
           const SnackBar(content: Text("Error generating trip.")),
@@ -178,6 +199,7 @@ class _TripTabPageState extends State<CreateRandomTripPage> with SingleTickerPro
     } catch (e) {
       print("Error: $e");
     } finally {
+      client.close();
       setState(() => isLoading = false);
     }
   }
@@ -189,7 +211,19 @@ class _TripTabPageState extends State<CreateRandomTripPage> with SingleTickerPro
       bottomNavigationBar: Padding(
         padding: const EdgeInsets.all(16.0),
         child: isLoading
-            ? const Center(child: CircularProgressIndicator())  // show loading indicator while generating
+            ? Column(  // show loading indicator and the landmarks found so far while generating
+          mainAxisSize: MainAxisSize.min,
+          children: [
+            if (streamedLandmarks.isNotEmpty)
+              Text(
+                "Found ${streamedLandmarks.length}: ${streamedLandmarks.join(", ")}",
+                maxLines: 3,
+                overflow: TextOverflow.ellipsis,
+              ),
+            const SizedBox(height: 8),
+            const CircularProgressIndicator(),
+          ],
+        )
             : SizedBox(
           width: double.infinity,
           height: 55,
@@ -25,6 +25,10 @@ class _EditTripPageState extends State<EditTripPage> {
   // list to store selected places
   List<Map<String, dynamic>> _selectedPlaces = [];
 
+  // trip version the edits are made against, and the edits made since it was loaded
+  int? _version;
+  List<Map<String, dynamic>> _pendingOps = [];
+
   // flags for loading states
   bool _isSearching = false;
   bool _isSaving = false;
@@ -49,6 +53,8 @@ class _EditTripPageState extends State<EditTripPage> {
         final landmarks = List<Map<String, dynamic>>.from(data['landmarks'] ?? []);
         setState(() {
           _selectedPlaces = landmarks;
+          _version = data['version'];
+          _pendingOps = [];
         });
       } else {
         print('Failed to fetch trip: ${response.body}');
@@ -106,16 +112,22 @@ class _EditTripPageState extends State<EditTripPage> {
   // add a place to selected list if not already added
   void _addPlace(Map<String, dynamic> place) {
     if (!_selectedPlaces.any((p) => p['name'] == place['name'])) {
-      setState(() => _selectedPlaces.add(place));
+      setState(() {
+        _selectedPlaces.add(place);
+        _pendingOps.add({'op': 'add', 'landmark': place});
+      });
     }
   }
 
   // remove a place from selected list
   void _removePlace(int index) {
-    setState(() => _selectedPlaces.removeAt(index));
+    setState(() {
+      _selectedPlaces.removeAt(index);
+      _pendingOps.add({'op': 'remove', 'index': index});
+    });
   }
 
-  // update trip data in the backend
+  // send only the edits made on this page, the server applies them to the current landmarks
   Future<void> _updateTrip() async {
     if (_selectedPlaces.isEmpty) return;
 
@@ -124,10 +136,10 @@ class _EditTripPageState extends State<EditTripPage> {
     final url = Uri.parse('http://$ip/trips/update_trip/${widget.tripId}');
 
     try {
-      final response = await http.put(
+      final response = await http.patch(
         url,
         headers: {'Content-Type': 'application/json'},
-        body: json.encode(_selectedPlaces),
+        body: json.encode({'version': _version, 'ops': _pendingOps}),
       );
 
       if (response.statusCode == 200) {
@@ -137,6 +149,12 @@ class _EditTripPageState extends State<EditTripPage> {
             builder: (_) => TripDetailPage(tripId: widget.tripId),
           ),
         );
+      } else if (response.statusCode == 409) {
+        // someone else in the group saved first, reload their version
+        ScaffoldMessenger.of(context).showSnackBar(
+          const SnackBar(content: Text('This trip was changed by someone else. Reloaded the latest version.')),
+        );
+        await _fetchTripData();
       } else {
         print('Failed to update trip: ${response.body}');
       }
@@ -102,7 +102,7 @@ class _HomeFeedPageState extends State<HomeFeedPage> {
 
   // check for unread messages
   Future<void> checkForNewMessages() async {
-    final response = await http.get(Uri.parse("http://$ip/messages/unread/${widget.uid}"));
+    final response = await http.get(Uri.parse("http://$ip/messages/unread_summary/${widget.uid}?only_unread=true"));
     if (response.statusCode == 200) {
       final List<dynamic> data = json.decode(response.body);
       if (data.isNotEmpty) {
@@ -161,7 +161,10 @@ class _HomeFeedPageState extends State<HomeFeedPage> {
           Padding(
             padding: const EdgeInsets.symmetric(horizontal: 8.0),
             child: MaterialBanner(
-              content: Text('You have unread chat messages in Group (${unreadMessage!['group_name']}).'),
+              content: Text(
+                  '${unreadMessage!['unread_count'] >= 100 ? '99+' : unreadMessage!['unread_count']} unread in '
+                  'Group (${unreadMessage!['group_name']})'
+                  '${unreadMessage!['latest'] != null ? ': ${unreadMessage!['latest']['sender_name']}: ${unreadMessage!['latest']['text']}' : '.'}'),
               actions: [
                 TextButton(
                   onPressed: () {
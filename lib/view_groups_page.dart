@@ -49,7 +49,8 @@ class _GroupTripPageState extends State<GroupTripPage> {
           }
 
           //fastAPI used to find trip info
-          final tripRes = await http.get(Uri.parse('http://$ip/trips/list_trips_by_group/$gid'));
+          final tripRes = await http.get(Uri.parse(
+              'http://$ip/trips/list_trips_by_group/$gid?limit=1&fields=location_lat,location_long'));
           List trips = tripRes.statusCode == 200 ? json.decode(tripRes.body) : [];
 
           combined.add({
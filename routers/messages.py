@@ -1,18 +1,33 @@
-from typing import List
+import asyncio
+import json
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 from datetime import datetime
 
-from app.global_vars import DB_USERNAME, DB_PASSWORD, DB_HOST, DB_NAME
-from app.models import Message, Base, Group
-from schemas.message import MessageResponse, MessageCreateRequest
+from app.global_vars import DB_USERNAME, DB_PASSWORD, DB_HOST, DB_NAME, MESSAGE_PREVIEW_CHARS, \
+    MESSAGE_PAGE_SIZE, MESSAGE_MAX_PAGE_SIZE, MESSAGE_GROUP_COMMIT, MESSAGE_SEARCH_PAGE_SIZE, \
+    MESSAGE_SEARCH_MAX_PAGE_SIZE
+from app.chat_push import HEARTBEAT, ChatBroker, notify_message, subscriber_events
+from app.instrumentation import REGISTRY
+from app.message_batcher import GroupCommit
+from app.message_history import all_messages, page_messages
+from app.message_partitions import MessageMaintenance
+from app.message_search import search_messages, InvalidCursor
+from app.migrations import apply_migrations
+from app.models import Message, Base
+from app.read_cursors import advance_cursor, read_by, unread_summary
+from schemas.message import MessageResponse, MessageCreateRequest, MessagePreview, UnreadSummaryResponse, \
+    MessageSyncResponse, MessageSearchHit, MessageSearchPage
 
 # Define your connection string
 conn_string = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
 engine = create_engine(conn_string)
 Base.metadata.create_all(bind=engine)
+apply_migrations(engine)
 
 # Use the create_engine function to establish the connection
 engine = create_engine(conn_string)
@@ -22,6 +37,13 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 router = APIRouter()
 
+# live chat delivery for this worker's stream/ws clients, fed by NOTIFYs from every worker's send_message
+chat_broker = ChatBroker(engine, SessionLocal)
+# shared by every request thread when MESSAGE_GROUP_COMMIT is on
+message_writer = GroupCommit(SessionLocal)
+# started by the app on startup when MESSAGE_MAINTENANCE_ENABLED
+message_maintenance = MessageMaintenance(engine)
+
 
 def get_db():
     db = SessionLocal()
@@ -32,54 +54,206 @@ def get_db():
 
 
 # router to send a message
+# with MESSAGE_GROUP_COMMIT the row is written together with other requests' sends; either way the response
+# comes back only after the message is committed
 @router.post("/send_message", response_model=MessageResponse)
 def send_message(message: MessageCreateRequest, db: Session = Depends(get_db)):
+    if MESSAGE_GROUP_COMMIT:
+        row = message_writer.submit(message.dict())
+        return message_response(row, read_by(db, row.gid, [row])[0])
+
     db_message = Message(
         gid=message.gid,
         sender_uid=message.sender_uid,
         sender_name=message.sender_name,
         text=message.text,
-        timestamp=message.timestamp,
-        read_by=[message.sender_uid]
+        timestamp=message.timestamp
     )
     db.add(db_message)
+    db.flush()
+    # the sender has read the chat up to their own message
+    advance_cursor(db, message.sender_uid, message.gid, db_message.id)
+    notify_message(db, db_message.gid, db_message.id)
     db.commit()
     db.refresh(db_message)
-    return db_message
+    return message_response(db_message, read_by(db, db_message.gid, [db_message])[0])
+
+
+def message_response(message: Message, readers: List[str]) -> MessageResponse:
+    return MessageResponse(
+        id=message.id,
+        gid=message.gid,
+        sender_uid=message.sender_uid,
+        sender_name=message.sender_name,
+        text=message.text,
+        timestamp=message.timestamp,
+        read_by=readers
+    )
 
 
-# obtain previous messages
+# obtain previous messages, including history compacted into message_archive
 @router.get("/get_messages/{gid}", response_model=List[MessageResponse])
 def get_messages(gid: int, db: Session = Depends(get_db)):
-    messages = db.query(Message).filter(Message.gid == gid).order_by(Message.timestamp).all()
-    return messages
+    messages = all_messages(db, gid)
+    return [message_response(m, readers) for m, readers in zip(messages, read_by(db, gid, messages))]
+
+
+# incremental chat sync, pages are in id order (oldest first)
+# after_id: messages newer than the last one the client has, for refreshing
+# before_id: messages older than the first one the client has, for scrolling back through history
+# neither: the newest page
+# every page is one range scan on ix_messages_gid_id however long the history is; pages reaching back past
+# the live partitions continue into message_archive
+@router.get("/sync/{gid}", response_model=MessageSyncResponse)
+def sync_messages(
+        gid: int,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        limit: int = MESSAGE_PAGE_SIZE,
+        db: Session = Depends(get_db)
+):
+    if after_id is not None and before_id is not None:
+        raise HTTPException(status_code=400, detail="Pass after_id or before_id, not both")
+    limit = max(1, min(limit, MESSAGE_MAX_PAGE_SIZE))
+
+    messages, has_more = page_messages(db, gid, after_id, before_id, limit)
+    return MessageSyncResponse(
+        messages=[message_response(m, readers) for m, readers in zip(messages, read_by(db, gid, messages))],
+        has_more=has_more
+    )
+
+
+# full-text search of gid's chat, best match first with highlighted snippets
+# page through with the returned next_cursor; history compacted into message_archive isn't searched, and a query
+# matching more than MESSAGE_SEARCH_RANK_WINDOW messages only ranks the newest ones, flagged by truncated
+@router.get("/search/{gid}", response_model=MessageSearchPage)
+def search_group_messages(
+        gid: int,
+        q: str,
+        cursor: Optional[str] = None,
+        limit: int = MESSAGE_SEARCH_PAGE_SIZE,
+        db: Session = Depends(get_db)
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q must not be empty")
+    limit = max(1, min(limit, MESSAGE_SEARCH_MAX_PAGE_SIZE))
+    try:
+        rows, next_cursor, truncated = search_messages(db, gid, q, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return MessageSearchPage(
+        results=[
+            MessageSearchHit(
+                id=row.id,
+                sender_uid=row.sender_uid,
+                sender_name=row.sender_name,
+                timestamp=row.timestamp,
+                snippet=row.snippet,
+                rank=row.rank
+            )
+            for row in rows
+        ],
+        next_cursor=next_cursor,
+        truncated=truncated
+    )
 
 
 # Endpoint to get groups with unread messages
+# a group is unread when it has a message from someone else past the user's read cursor
 @router.get("/unread/{uid}")
 def get_unread_groups(uid: str, db: Session = Depends(get_db)):
-    unread_gids = (
-        db.query(Message.gid)
-        .filter(~Message.read_by.any(uid))
-        .distinct()
-        .all()
-    )
-    gids = [gid for (gid,) in unread_gids]
-    groups = db.query(Group).filter(Group.gid.in_(gids)).all()
-    return [{"gid": group.gid, "group_name": group.group_name} for group in groups]
+    return [{"gid": row.gid, "group_name": row.group_name} for row in unread_summary(db, uid, only_unread=True)]
 
 
-from sqlalchemy.orm.attributes import flag_modified
+# unread count and newest message of each of uid's groups, most recently active first
+# cost depends on the user's groups and their unread messages only, not on how much chat history exists
+@router.get("/unread_summary/{uid}", response_model=List[UnreadSummaryResponse])
+def get_unread_summary(uid: str, only_unread: bool = False, db: Session = Depends(get_db)):
+    return [
+        UnreadSummaryResponse(
+            gid=row.gid,
+            group_name=row.group_name,
+            unread_count=row.unread_count,
+            latest=MessagePreview(
+                id=row.id,
+                sender_uid=row.sender_uid,
+                sender_name=row.sender_name,
+                text=row.text[:MESSAGE_PREVIEW_CHARS],
+                timestamp=row.timestamp
+            ) if row.id is not None else None
+        )
+        for row in unread_summary(db, uid, only_unread)
+    ]
 
 
+# mark the group read for uid, up to last_read_id (the newest message when left out)
+# a single upsert of the user's read cursor, however long the chat history is
 @router.post("/mark_read/{gid}/{uid}")
-def mark_read(gid: int, uid: str, db: Session = Depends(get_db)):
-    messages = db.query(Message).filter(Message.gid == gid).all()
-    for msg in messages:
-        if not msg.read_by:
-            msg.read_by = []
-        if uid not in msg.read_by:
-            msg.read_by.append(uid)
-            flag_modified(msg, "read_by")  # <- This tells SQLAlchemy the field changed
+def mark_read(gid: int, uid: str, last_read_id: Optional[int] = None, db: Session = Depends(get_db)):
+    advance_cursor(db, uid, gid, last_read_id)
     db.commit()
     return {"status": "read updated"}
+
+
+# live chat for gid as server-sent events, replacing polling /sync
+# starts live from now, or resumes after after_id or the Last-Event-ID header an EventSource sends when it
+# reconnects, so nothing sent while the client was away is missed; after_id=0 replays the whole history
+# a comment line every CHAT_PUSH_HEARTBEAT seconds keeps proxies from closing an idle stream
+@router.get("/stream/{gid}")
+async def stream_messages(gid: int, request: Request, after_id: Optional[int] = None,
+                          last_event_id: Optional[str] = Header(None)):
+    if last_event_id is not None and last_event_id.isdigit():
+        after_id = max(after_id or 0, int(last_event_id))
+
+    async def frames():
+        subscriber = chat_broker.subscribe(gid)
+        try:
+            async for event in subscriber_events(chat_broker, subscriber, after_id):
+                if await request.is_disconnected():
+                    break
+                if event is HEARTBEAT:
+                    yield ": ping\n\n"
+                else:
+                    yield f"id: {event['id']}\nevent: message\ndata: {json.dumps(event)}\n\n"
+        finally:
+            chat_broker.unsubscribe(subscriber)
+
+    return StreamingResponse(frames(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# the same feed over a WebSocket, as {"event": "message", "message": {...}} and {"event": "heartbeat"}
+@router.websocket("/ws/{gid}")
+async def chat_socket(websocket: WebSocket, gid: int, after_id: Optional[int] = None):
+    await websocket.accept()
+    subscriber = chat_broker.subscribe(gid)
+    # notices the client going away between events; anything it sends is ignored
+    closed = asyncio.ensure_future(websocket.receive())
+    try:
+        async for event in subscriber_events(chat_broker, subscriber, after_id):
+            if closed.done():
+                if closed.result()["type"] == "websocket.disconnect":
+                    break
+                closed = asyncio.ensure_future(websocket.receive())
+            if event is HEARTBEAT:
+                await websocket.send_json({"event": "heartbeat"})
+            else:
+                await websocket.send_json({"event": "message", "message": event})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed.cancel()
+        chat_broker.unsubscribe(subscriber)
+
+
+@REGISTRY.collector
+def chat_push_gauges():
+    return [
+        ("chat_push_subscribers", "Connected chat stream/ws clients on this worker",
+         [({}, chat_broker.subscriber_count())]),
+        ("chat_push_events", "Live chat events by outcome, dropped ones are re-read from the db", [
+            ({"outcome": "delivered"}, chat_broker.delivered), ({"outcome": "dropped"}, chat_broker.dropped)]),
+        ("chat_push_resyncs", "Times every client was sent back to the db after a gap in the LISTEN feed",
+         [({}, chat_broker.resyncs)]),
+    ]
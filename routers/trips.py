@@ -1,25 +1,50 @@
-import math
-import urllib
 import json
-import random
-from typing import List
+import logging
+from typing import List, Optional
 
-import requests
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import create_engine
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import create_engine, insert
 from sqlalchemy.orm import Session, sessionmaker
-from app.global_vars import DB_USERNAME, DB_PASSWORD, DB_HOST, DB_NAME, MAPBOX_PUBLIC_TOKEN
-from app.models import Trip, Base
-from schemas.trip import TripResponse, TripSummaryResponse, Landmark, AlternateTripResponse
+from sqlalchemy.orm.exc import StaleDataError
+from app.global_vars import DB_USERNAME, DB_PASSWORD, DB_HOST, DB_NAME, LANDMARK_CACHE_PERSIST, MAX_TRIP_BATCH, \
+    NEARBY_TRIPS_PAGE_SIZE, NEARBY_TRIPS_MAX_PAGE_SIZE, TRIP_PATCH_MAX_OPS, TRIP_LIST_PAGE_SIZE, TRIP_LIST_MAX_PAGE_SIZE
+from app.http_client import mapbox_client
+from app.instrumentation import REGISTRY, TRIPS_GENERATED, log_event, span
+from app.itinerary import order_stops
+from app.landmark_cache import PostgresCacheTier, CachePurger
+from app.landmark_pipeline import landmark_cache, landmark_provider, candidate_fetches, parse_landmark_request, \
+    public_landmark, get_candidate_pool, get_landmarks, stream_landmarks
+from app.landmark_selection import select_alternatives
+from app.migrations import apply_migrations
+from app.models import Trip, Base, TripJob
+from app.nearby_trips import trips_near, InvalidCursor
+from app.prewarm import PrewarmScheduler
+from app.trip_patch import apply_patch, InvalidPatch, PatchConflict
+from app.trip_jobs import TripJobRunner, TooManyJobs
+from schemas.trip import TripResponse, TripSummaryResponse, Landmark, TripJobResponse, \
+    NearbyTripResponse, NearbyTripPage, TripPatchRequest, TripListItem
 
 # Database setup
 conn_string = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
 engine = create_engine(conn_string)
 Base.metadata.create_all(bind=engine)
+apply_migrations(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 router = APIRouter()
 
+# Searchbox responses also kept in the landmark_cache table, shared across workers
+if LANDMARK_CACHE_PERSIST:
+    landmark_cache.persistent = PostgresCacheTier(SessionLocal)
+
+# Keeps popular trip locations warm in the landmark cache, started from app/main.py when PREWARM_ENABLED
+prewarm_scheduler = PrewarmScheduler(SessionLocal, landmark_provider)
+
+# Deletes expired landmark_cache rows when the prewarm scheduler isn't running to do it, see app/main.py
+cache_purger = CachePurger(landmark_cache)
+
 
 def get_db():
     db = SessionLocal()
@@ -29,172 +54,34 @@ def get_db():
         db.close()
 
 
-# calculate haversine distance
-def haversine_distance(lat1, lon1, lat2, lon2):
-    R = 3958.8
-    d_lat = math.radians(lat2 - lat1)
-    d_lon = math.radians(lon2 - lon1)
-    a = math.sin(d_lat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(
-        d_lon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
-def get_landmarks(lat: float, lng: float, landmark_types: str, max_distance: float, num_destinations: int,
-                  category_counts_str: str):
-    # Log input parameters for debugging
-    print("get_landmarks() called with:")
-    print("  lat =", lat, "lng =", lng)
-    print("  landmark_types =", landmark_types)
-    print("  max_distance =", max_distance)
-    print("  num_destinations =", num_destinations)
-    print("  category_counts_str =", category_counts_str)
-
-    # Parse the landmark types and clean up any extra spaces
-    categories = [cat.strip() for cat in landmark_types.split(",") if cat.strip()]
-    print("Parsed categories:", categories)
-
-    # Try parsing the category counts, defaulting to 1 for each category if parsing fails
-    try:
-        category_counts = json.loads(category_counts_str)
-    except Exception as e:
-        print("Error parsing category_counts; defaulting each category to 1:", e)
-        category_counts = {cat: 1 for cat in categories}
-
-    # Ensure all specified categories have an entry in category_counts
-    for cat in categories:
-        if cat not in category_counts:
-            category_counts[cat] = 1
-    print("Parsed category_counts:", category_counts)
-
-    # Mapping for each category to relevant search terms for the API query
-    query_mapping = {
-        "Food": ["restaurant", "cafe", "diner", "bistro", "eatery", "food", "coffee shop", "grill", "pho", "ramen",
-                 "yakitori", "la piazza"],
-        "Parks": ["garden", "botanical garden", "green space", "nature reserve", "trail", "peak", "falls", "orchard"],
-        "Historic": ["historic building", "heritage site", "historical site", "landmark", "old building", "monumental"],
-        "Memorials": ["memorial", "monument", "commemorative", "statue", "cenotaph", "tribute"],
-        "Museums": ["museum", "art gallery", "exhibit", "history museum", "science museum", "cultural center"],
-        "Art": ["art gallery", "exhibit", "showcase", "gallery", "art center", "art museum", "creative space"],
-        "Entertainment": ["cinema", "movie theater", "theater", "amusement", "entertainment", "arcade", "playhouse",
-                          "live performance"]
-    }
-
-    # Define a list of unwanted terms that should be filtered out from landmark names
-    unwanted_words = ["street", "drive", "way", "avenue", "road", "development", "developments", "residential",
-                      "commercial", "office", "plaza", "mall", "complex", "apartment", "lane", "parkway", "court",
-                      "common", "commons", "place"]
-
-    # Helper function to check if a name contains unwanted terms
-    def is_unwanted(name: str) -> bool:
-        lower_name = name.lower()
-        return any(word in lower_name for word in unwanted_words)
-
-    # Calculate bounding box for the search area based on the max distance
-    lat_delta = max_distance / 69.0
-    lon_delta = max_distance / (69.0 * math.cos(math.radians(lat)))
-    min_lat = lat - lat_delta
-    max_lat = lat + lat_delta
-    min_lon = lng - lon_delta
-    max_lon = lng + lon_delta
-    bbox = f"{min_lon},{min_lat},{max_lon},{max_lat}"
-    print("Calculated bounding box:", bbox)
-
-    # Initialize a dictionary to store candidate landmarks for each category
-    candidates_per_category = {cat: [] for cat in categories}
-
-    # Perform API requests for each category's landmarks
-    for cat in categories:
-        alternatives = query_mapping.get(cat, [cat])  # Use the category name or mapped queries
-        for search_query in alternatives:
-            encoded_query = urllib.parse.quote(search_query)  # URL encode the search term
-            url = (
-                f"https://api.mapbox.com/search/searchbox/v1/forward?q={encoded_query}"
-                f"&types=poi&proximity={lng},{lat}&bbox={bbox}&limit=10"
-                f"&access_token={MAPBOX_PUBLIC_TOKEN}"
-            )
-            print(f"\nRequesting for category '{cat}' using keyword '{search_query}' (encoded: '{encoded_query}'):")
-            print("Request URL:", url)
-
-            # Make the request to the Mapbox API
-            res = requests.get(url)
-            if res.status_code != 200:
-                print(f"Error fetching for '{search_query}': {res.status_code}")
-                continue  # Skip to the next query if the request fails
-
-            result = res.json()
-            features = result.get("features", [])
-            print(f"Found {len(features)} features for keyword '{search_query}'")
-
-            # Process the returned features
-            for feat in features:
-                coords = feat.get("geometry", {}).get("coordinates")
-                if not coords or len(coords) < 2:
-                    continue  # Skip if coordinates are invalid
-                f_lon = float(coords[0])
-                f_lat = float(coords[1])
-
-                # Calculate the distance between the current point and the landmark
-                dist = haversine_distance(lat, lng, f_lat, f_lon)
-                if dist > max_distance:
-                    continue  # Skip if the landmark is too far away
-
-                prop = feat.get("properties", {})
-                name = prop.get("name", search_query)
-
-                # Skip unwanted landmarks based on their name
-                if is_unwanted(name):
-                    continue
-
-                # Get the relevance score or default to 0 if not present
-                try:
-                    relevance = float(prop.get("relevance", 0))
-                except (TypeError, ValueError):
-                    relevance = 0
-
-                # Create a candidate landmark and add it to the list
-                candidate = {
-                    "name": name,
-                    "lat": f_lat,
-                    "long": f_lon,
-                    "type": "Park" if cat == "Parks" else cat,  # Special case for "Parks"
-                    "relevance": relevance
-                }
-                candidates_per_category[cat].append(candidate)
-
-    # Select the best candidates for each category based on relevance and category counts
-    selected_candidates = []
-    for cat in categories:
-        desired = int(category_counts.get(cat, 1))
-        cat_candidates = candidates_per_category.get(cat, [])
-        random.shuffle(cat_candidates)  # Shuffle to introduce randomness
-        selected = sorted(cat_candidates[:desired], key=lambda x: x["relevance"], reverse=True)  # Sort by relevance
-        selected_candidates.extend(selected)
-        print(f"Selected for {cat} (desired {desired}):", selected)
-
-    # Ensure uniqueness of landmarks, keeping the one with the highest relevance
-    unique = {}
-    for c in selected_candidates:
-        key = (c["name"], c["type"])
-        if key in unique:
-            if c["relevance"] > unique[key]["relevance"]:
-                unique[key] = c
-        else:
-            unique[key] = c
-    selected_candidates = list(unique.values())
-
-    # Limit the number of destinations if necessary
-    if len(selected_candidates) > num_destinations:
-        random.shuffle(selected_candidates)
-        selected_candidates = selected_candidates[:num_destinations]
+# Insert a generated trip and build its response
+def save_trip(db: Session, group: int, uid: str, location_lat: float, location_long: float, landmarks: list,
+              num_destinations: int, route_miles: Optional[float] = None) -> TripResponse:
+    new_trip = Trip(
+        group=group,
+        uid=uid,
+        location_lat=location_lat,
+        location_long=location_long,
+        landmarks=landmarks,
+        num_destinations=num_destinations
+    )
 
-    # Remove the "relevance" field from the final result
-    for candidate in selected_candidates:
-        candidate.pop("relevance", None)
+    with span("db_insert"):
+        db.add(new_trip)
+        db.commit()
+        db.refresh(new_trip)
 
-    # Log and return the final selected landmarks
-    print("\nFinal landmarks returned:", selected_candidates)
-    return selected_candidates
+    return TripResponse(
+        trip_id=new_trip.tid,
+        group=new_trip.group,
+        uid=new_trip.uid,
+        location_lat=new_trip.location_lat,
+        location_long=new_trip.location_long,
+        landmarks=landmarks,
+        num_destinations=num_destinations,
+        route_miles=route_miles,
+        version=new_trip.version
+    )
 
 
 # finally, generate the trip
@@ -208,34 +95,218 @@ def generate_trip(
         max_distance: float = 50.0,
         num_destinations: int = 0,
         category_counts: str = "{}",
+        optimize_route: bool = False,
         db: Session = Depends(get_db)
 ):
     # Get landmarks FIRST
     landmarks = get_landmarks(location_lat, location_long, landmark_types, max_distance, num_destinations,
                               category_counts)
 
+    # Optionally visit them in a short route starting from the trip location
+    route_miles = None
+    if optimize_route:
+        with span("route_order"):
+            landmarks, route_miles = order_stops(landmarks, start=(location_lat, location_long))
+    TRIPS_GENERATED.inc(mode="sync")
+    return save_trip(db, group, uid, location_lat, location_long, landmarks, num_destinations, route_miles)
+
+
+# generate several alternative trips for the same spot from one candidate fetch
+# max_overlap is how many landmarks any two alternatives may share (defaults to half of num_destinations)
+@router.post("/generate_trip_batch", response_model=List[TripResponse])
+def generate_trip_batch(
+        group: int,
+        uid: str,
+        location_lat: float,
+        location_long: float,
+        landmark_types: str = "",
+        max_distance: float = 50.0,
+        num_destinations: int = 0,
+        category_counts: str = "{}",
+        count: int = 3,
+        max_overlap: Optional[int] = None,
+        optimize_route: bool = False,
+        db: Session = Depends(get_db)
+):
+    if count < 1 or count > MAX_TRIP_BATCH:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MAX_TRIP_BATCH}")
+    if max_overlap is None:
+        max_overlap = num_destinations // 2
+
+    with span("parse"):
+        categories, counts = parse_landmark_request(landmark_types, category_counts)
+    candidates_per_category = get_candidate_pool(location_lat, location_long, categories, max_distance)
+    with span("selection"):
+        alternatives = select_alternatives(candidates_per_category, counts, num_destinations, count, max_overlap)
+    alternatives = [[public_landmark(c) for c in selected] for selected in alternatives]
+
+    # Optionally visit each alternative's landmarks in a short route starting from the trip location
+    route_miles = [None] * len(alternatives)
+    if optimize_route:
+        with span("route_order"):
+            for i, landmarks in enumerate(alternatives):
+                alternatives[i], route_miles[i] = order_stops(landmarks, start=(location_lat, location_long))
+
+    # every alternative goes in with one multi-row INSERT in a single transaction
+    # sort_by_parameter_order lines the RETURNING rows up with the alternatives
+    with span("db_insert"):
+        rows = db.execute(
+            insert(Trip).returning(Trip.tid, Trip.version, sort_by_parameter_order=True),
+            [
+                {
+                    "group": group,
+                    "uid": uid,
+                    "location_lat": location_lat,
+                    "location_long": location_long,
+                    "landmarks": landmarks,
+                    "num_destinations": num_destinations,
+                }
+                for landmarks in alternatives
+            ]
+        ).all()
+        db.commit()
+    TRIPS_GENERATED.inc(len(rows), mode="batch")
+
+    return [
+        TripResponse(
+            trip_id=tid,
+            group=group,
+            uid=uid,
+            location_lat=location_lat,
+            location_long=location_long,
+            landmarks=landmarks,
+            num_destinations=num_destinations,
+            route_miles=miles,
+            version=version
+        )
+        for (tid, version), landmarks, miles in zip(rows, alternatives, route_miles)
+    ]
+
+
+# generate the trip, streaming each category's landmarks as NDJSON lines as soon as they are picked
+# {"event": "landmarks", "category": ..., "landmarks": [...]} per category, then {"event": "trip", "trip": {...}}
+# the 200 is already sent by then, so a failure part way ends the stream with {"event": "error", "detail": ...}
+# instead of the trip line
+@router.post("/generate_trip_stream")
+async def generate_trip_stream(
+        group: int,
+        uid: str,
+        location_lat: float,
+        location_long: float,
+        landmark_types: str = "",
+        max_distance: float = 50.0,
+        num_destinations: int = 0,
+        category_counts: str = "{}"
+):
+    def save_streamed_trip(landmarks):
+        db = SessionLocal()
+        try:
+            return save_trip(db, group, uid, location_lat, location_long, landmarks, num_destinations)
+        finally:
+            db.close()
+
+    async def events():
+        landmarks = []
+        try:
+            async for cat, selected in stream_landmarks(location_lat, location_long, landmark_types, max_distance,
+                                                        num_destinations, category_counts):
+                landmarks.extend(selected)
+                yield json.dumps({"event": "landmarks", "category": cat, "landmarks": selected}) + "\n"
+            trip = await run_in_threadpool(save_streamed_trip, landmarks)
+        except Exception as e:
+            log_event(logging.ERROR, "trip_stream_failed", uid=uid, group=group, landmarks_sent=len(landmarks),
+                      error=str(e))
+            yield json.dumps({"event": "error", "detail": "Failed to generate the trip"}) + "\n"
+            return
+        TRIPS_GENERATED.inc(mode="stream")
+        yield json.dumps({"event": "trip", "trip": trip.dict()}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+# background job body: same pipeline as generate_trip, the trip row is flushed but left for the runner to commit
+def run_trip_job(db: Session, job: TripJob) -> Trip:
+    params = job.params
+    landmarks = get_landmarks(params["location_lat"], params["location_long"], params["landmark_types"],
+                              params["max_distance"], params["num_destinations"], params["category_counts"])
     new_trip = Trip(
-        group=group,
-        uid=uid,
-        location_lat=location_lat,
-        location_long=location_long,
+        group=job.group,
+        uid=job.uid,
+        location_lat=params["location_lat"],
+        location_long=params["location_long"],
         landmarks=landmarks,
-        num_destinations=num_destinations
+        num_destinations=params["num_destinations"]
+    )
+    with span("db_insert"):
+        db.add(new_trip)
+        db.flush()
+    TRIPS_GENERATED.inc(mode="async")
+    return new_trip
+
+
+trip_jobs = TripJobRunner(SessionLocal, run_trip_job)
+
+
+def trip_job_response(job: TripJob) -> TripJobResponse:
+    return TripJobResponse(
+        job_id=job.jid,
+        uid=job.uid,
+        group=job.group,
+        status=job.status,
+        trip_id=job.trip_id,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at
     )
 
-    db.add(new_trip)
-    db.commit()
-    db.refresh(new_trip)
 
-    return TripResponse(
-        trip_id=new_trip.tid,
-        group=new_trip.group,
-        uid=new_trip.uid,
-        location_lat=new_trip.location_lat,
-        location_long=new_trip.location_long,
-        landmarks=landmarks,
-        num_destinations=num_destinations
-    )
+# generate the trip in the background, poll /trips/jobs/{job_id} for the result
+@router.post("/generate_trip_async", response_model=TripJobResponse, status_code=202)
+def generate_trip_async(
+        group: int,
+        uid: str,
+        location_lat: float,
+        location_long: float,
+        landmark_types: str = "",
+        max_distance: float = 50.0,
+        num_destinations: int = 0,
+        category_counts: str = "{}",
+        db: Session = Depends(get_db)
+):
+    params = {
+        "location_lat": location_lat,
+        "location_long": location_long,
+        "landmark_types": landmark_types,
+        "max_distance": max_distance,
+        "num_destinations": num_destinations,
+        "category_counts": category_counts,
+    }
+    try:
+        job = trip_jobs.submit(db, uid, group, params)
+    except TooManyJobs as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return trip_job_response(job)
+
+
+# status of a background trip, trip_id is set once it is done
+@router.get("/jobs/{job_id}", response_model=TripJobResponse)
+def get_trip_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(TripJob).filter(TripJob.jid == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return trip_job_response(job)
+
+
+# cancel a background trip that hasn't finished yet
+@router.delete("/jobs/{job_id}", response_model=TripJobResponse)
+def cancel_trip_job(job_id: int, db: Session = Depends(get_db)):
+    job = db.query(TripJob).filter(TripJob.jid == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not trip_jobs.cancel(db, job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status.value}")
+    db.refresh(job)
+    return trip_job_response(job)
 
 
 # custom create
@@ -245,8 +316,15 @@ def create_custom_trip(
         uid: str,
         landmarks: list[dict],
         num_destinations: int,
+        optimize_route: bool = False,
         db: Session = Depends(get_db)
 ):
+    # Optionally put the stops in a short visiting order
+    route_miles = None
+    if optimize_route:
+        with span("route_order"):
+            landmarks, route_miles = order_stops(landmarks)
+
     new_trip = Trip(
         group=group,
         uid=uid,
@@ -267,7 +345,108 @@ def create_custom_trip(
         location_lat=new_trip.location_lat,
         location_long=new_trip.location_long,
         landmarks=landmarks,
-        num_destinations=num_destinations
+        num_destinations=num_destinations,
+        route_miles=route_miles,
+        version=new_trip.version
+    )
+
+
+# re-order an existing trip's landmarks into a short route, by default starting from the trip location
+@router.put("/reorder_trip/{trip_id}", response_model=TripResponse)
+def reorder_trip(trip_id: int, from_trip_location: bool = True, db: Session = Depends(get_db)):
+    trip = db.query(Trip).filter(Trip.tid == trip_id).first()
+    if not trip:
+        raise HTTPException(status_code=404, detail="Trip not found")
+
+    start = (trip.location_lat, trip.location_long) if from_trip_location else None
+    with span("route_order"):
+        landmarks, route_miles = order_stops(trip.landmarks or [], start=start)
+    trip.landmarks = landmarks
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Trip was changed while it was being reordered")
+    db.refresh(trip)
+
+    return TripResponse(
+        trip_id=trip.tid,
+        group=trip.group,
+        uid=trip.uid,
+        location_lat=trip.location_lat,
+        location_long=trip.location_long,
+        landmarks=trip.landmarks,
+        num_destinations=trip.num_destinations,
+        route_miles=route_miles,
+        version=trip.version
+    )
+
+
+# health of the landmark pipeline: Mapbox client pool/retries/breaker, cache hit rate, coalesced fetches
+@router.get("/provider_stats")
+def provider_stats():
+    return {
+        "provider": landmark_provider.name,
+        "http": mapbox_client.stats(),
+        "cache": {"entries": len(landmark_cache), "hits": landmark_cache.hits, "misses": landmark_cache.misses},
+        "coalesced_fetches": candidate_fetches.shared,
+    }
+
+
+# the same numbers as gauges on /metrics next to the stage histograms
+@REGISTRY.collector
+def provider_gauges():
+    http = mapbox_client.stats()
+    return [
+        ("external_http_requests", "Mapbox client counters", [({"counter": name}, http[name]) for name in
+                                                               ("requests", "retries", "failures", "rejected",
+                                                                "in_flight", "max_in_flight")]),
+        ("external_http_pool_connections", "Mapbox connection pool", [
+            ({"kind": "opened"}, http["pool"]["connections_opened"]), ({"kind": "idle"}, http["pool"]["idle"])]),
+        ("external_http_breaker_open", "1 while the Mapbox circuit breaker is open",
+         [({}, int(http["breaker"]["state"] == "open"))]),
+        ("landmark_cache", "Landmark cache entries and lookups", [
+            ({"kind": "entries"}, len(landmark_cache)), ({"kind": "hits"}, landmark_cache.hits),
+            ({"kind": "misses"}, landmark_cache.misses)]),
+        ("coalesced_fetches", "Candidate fetches shared with an identical in-flight request",
+         [({}, candidate_fetches.shared)]),
+    ]
+
+
+# trips with a landmark within radius miles of a point, nearest first
+# page through with the returned next_cursor
+@router.get("/nearby", response_model=NearbyTripPage)
+def list_nearby_trips(
+        lat: float,
+        lng: float,
+        radius: float = 10.0,
+        group: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = NEARBY_TRIPS_PAGE_SIZE,
+        db: Session = Depends(get_db)
+):
+    if radius <= 0:
+        raise HTTPException(status_code=400, detail="radius must be positive")
+    limit = max(1, min(limit, NEARBY_TRIPS_MAX_PAGE_SIZE))
+    try:
+        rows, next_cursor = trips_near(db, lat, lng, radius, limit, group=group, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return NearbyTripPage(
+        trips=[
+            NearbyTripResponse(
+                trip_id=row.tid,
+                group=row.group,
+                uid=row.uid,
+                location_lat=row.location_lat,
+                location_long=row.location_long,
+                num_destinations=row.num_destinations,
+                distance=row.distance
+            )
+            for row in rows
+        ],
+        next_cursor=next_cursor
     )
 
 
@@ -303,7 +482,8 @@ def get_trip(trip_id: int, db: Session = Depends(get_db)):
         location_lat=trip.location_lat,
         location_long=trip.location_long,
         landmarks=trip.landmarks,
-        num_destinations=trip.num_destinations
+        num_destinations=trip.num_destinations,
+        version=trip.version
     )
 
 
@@ -337,7 +517,11 @@ def update_trip(
             })
 
     trip.landmarks = updated_landmarks
-    db.commit()
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Trip was changed while it was being updated")
     db.refresh(trip)
 
     return TripResponse(
@@ -346,7 +530,40 @@ def update_trip(
         uid=trip.uid,
         location_lat=trip.location_lat,
         location_long=trip.location_long,
-        landmarks=trip.landmarks
+        landmarks=trip.landmarks,
+        num_destinations=trip.num_destinations,
+        version=trip.version
+    )
+
+
+# edit a trip's landmarks in place with add/remove/move/replace ops, applied in order and saved in one UPDATE
+# version is the one the client last read; if someone else saved since, nothing is applied and a 409
+# carrying the current version is returned so the client can refetch and redo its edits
+@router.patch("/update_trip/{trip_id}", response_model=TripResponse)
+def patch_trip(trip_id: int, patch: TripPatchRequest, db: Session = Depends(get_db)):
+    if len(patch.ops) > TRIP_PATCH_MAX_OPS:
+        raise HTTPException(status_code=400, detail=f"At most {TRIP_PATCH_MAX_OPS} ops per request")
+    try:
+        row = apply_patch(db, trip_id, patch.version, patch.ops)
+    except PatchConflict as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail={"message": str(e), "version": e.current_version})
+    except InvalidPatch as e:
+        db.rollback()
+        raise HTTPException(status_code=422, detail=str(e))
+    if row is None:
+        raise HTTPException(status_code=404, detail="Trip not found")
+    db.commit()
+
+    return TripResponse(
+        trip_id=row.tid,
+        group=row.group,
+        uid=row.uid,
+        location_lat=row.location_lat,
+        location_long=row.location_long,
+        landmarks=row.landmarks,
+        num_destinations=row.num_destinations,
+        version=row.version
     )
 
 
@@ -362,7 +579,59 @@ def delete_trip(trip_id: int, db: Session = Depends(get_db)):
     return {"message": "Trip deleted successfully"}
 
 
-# trips by group
-@router.get("/list_trips_by_group/{gid}", response_model=list[AlternateTripResponse])
-def list_trips_by_group(gid: int, db: Session = Depends(get_db)):
-    return db.query(Trip).filter(Trip.group == gid).all()
+# columns list_trips_by_group can return; "summary" is every scalar column, "full" adds the landmarks
+TRIP_LIST_COLUMNS = {
+    "tid": Trip.tid,
+    "group": Trip.group,
+    "uid": Trip.uid,
+    "location_lat": Trip.location_lat,
+    "location_long": Trip.location_long,
+    "num_destinations": Trip.num_destinations,
+    "version": Trip.version,
+    "landmarks": Trip.landmarks,
+}
+TRIP_LIST_PRESETS = {
+    "summary": [name for name in TRIP_LIST_COLUMNS if name != "landmarks"],
+    "full": list(TRIP_LIST_COLUMNS),
+}
+
+
+def parse_trip_fields(fields: str):
+    names = []
+    for name in (f.strip() for f in fields.split(",") if f.strip()):
+        if name in TRIP_LIST_PRESETS:
+            names.extend(TRIP_LIST_PRESETS[name])
+        elif name in TRIP_LIST_COLUMNS:
+            names.append(name)
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+    if not names:
+        raise HTTPException(status_code=400, detail="fields is empty")
+    return list(dict.fromkeys(["tid"] + names))  # tid is always returned, it's the cursor
+
+
+# trips by group, oldest first, one page at a time
+# fields picks the columns (comma separated names, or "summary"/"full"); only those are selected, so summary
+# listings never read the landmarks JSONB. Pass the last tid as after_tid for the next page; X-Next-After-Tid
+# is set while there may be more
+@router.get("/list_trips_by_group/{gid}", response_model=list[TripListItem], response_model_exclude_unset=True)
+def list_trips_by_group(
+        gid: int,
+        response: Response,
+        after_tid: Optional[int] = None,
+        limit: int = TRIP_LIST_PAGE_SIZE,
+        fields: str = "full",
+        db: Session = Depends(get_db)
+):
+    names = parse_trip_fields(fields)
+    limit = max(1, min(limit, TRIP_LIST_MAX_PAGE_SIZE))
+
+    # keyset on (group, tid) through ix_trips_group_tid, each page is one index range scan
+    query = db.query(*[TRIP_LIST_COLUMNS[name] for name in names]).filter(Trip.group == gid)
+    if after_tid is not None:
+        query = query.filter(Trip.tid > after_tid)
+    rows = query.order_by(Trip.tid).limit(limit).all()
+
+    if len(rows) == limit:
+        response.headers["X-Next-After-Tid"] = str(rows[-1].tid)
+    return [TripListItem(**dict(zip(names, row))) for row in rows]
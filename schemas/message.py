@@ -1,10 +1,8 @@
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel
 
-from datetime import datetime
-from pydantic import BaseModel
-
 #for creating messages
 class MessageCreateRequest(BaseModel):
     gid: int
@@ -15,12 +13,48 @@ class MessageCreateRequest(BaseModel):
 
 #response for messages
 class MessageResponse(BaseModel):
+    id: Optional[int] = None
     gid: int
     sender_uid: str
     sender_name: str
     text: str
     timestamp: datetime
-    read_by: list[str] = []
+    read_by: list[str] = []  # derived from the members' read cursors
 
     class Config:
         orm_mode = True
+
+#one page of a group's messages in id order
+class MessageSyncResponse(BaseModel):
+    messages: list[MessageResponse]
+    has_more: bool  # more messages past the page in the direction asked for
+
+#newest message of a group, shortened
+class MessagePreview(BaseModel):
+    id: int
+    sender_uid: str
+    sender_name: str
+    text: str
+    timestamp: datetime
+
+#unread state of one of the user's groups
+class UnreadSummaryResponse(BaseModel):
+    gid: int
+    group_name: Optional[str] = None
+    unread_count: int  # capped at UNREAD_COUNT_CAP
+    latest: Optional[MessagePreview] = None
+
+#one search hit, snippet is plain text with each matched word between \x02 and \x03
+class MessageSearchHit(BaseModel):
+    id: int
+    sender_uid: str
+    sender_name: str
+    timestamp: datetime
+    snippet: str
+    rank: float
+
+#one page of search hits, best match first
+class MessageSearchPage(BaseModel):
+    results: list[MessageSearchHit]
+    next_cursor: Optional[str] = None  # pass back as cursor for the next page, None on the last page
+    truncated: bool = False  # only the newest MESSAGE_SEARCH_RANK_WINDOW matches were ranked, older ones are left out
@@ -1,6 +1,7 @@
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from enum import Enum
 
 #landmark psuedo model
@@ -29,6 +30,8 @@ class TripResponse(BaseModel):
     landmarks: List[Landmark]
     uid: str
     num_destinations: int
+    route_miles: Optional[float] = None  # set when the landmarks were put in route order
+    version: Optional[int] = None  # send back with /trips/update_trip PATCH requests
 
     class Config:
         arbitrary_types_allowed = True
@@ -70,4 +73,81 @@ class AlternateTripResponse(BaseModel):
 
     class Config:
         arbitrary_types_allowed = True
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+#one trip in a group listing, only the requested fields are set (see fields on list_trips_by_group)
+class TripListItem(BaseModel):
+    tid: Optional[int] = None
+    group: Optional[int] = None
+    uid: Optional[str] = None
+    location_lat: Optional[float] = None
+    location_long: Optional[float] = None
+    num_destinations: Optional[int] = None
+    version: Optional[int] = None
+    landmarks: Optional[List[Landmark]] = None
+
+    class Config:
+        orm_mode = True
+
+#background trip generation job states
+class TripJobStatusEnum(str, Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class TripJobResponse(BaseModel):
+    job_id: int
+    uid: str
+    group: int
+    status: TripJobStatusEnum
+    trip_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+#trip with a landmark near the searched point
+class NearbyTripResponse(BaseModel):
+    trip_id: int
+    group: int
+    uid: str
+    location_lat: float
+    location_long: float
+    num_destinations: Optional[int] = None
+    distance: float  # miles from the searched point to the trip's closest landmark
+
+    class Config:
+        orm_mode = True
+
+
+class NearbyTripPage(BaseModel):
+    trips: List[NearbyTripResponse]
+    next_cursor: Optional[str] = None  # pass back as cursor for the next page, None on the last page
+
+
+#incremental landmark edit, applied in order
+#add inserts landmark at index (appends when index is left out), remove drops index,
+#move takes the landmark at index and puts it at to, replace swaps the landmark at index for landmark
+class TripPatchOpEnum(str, Enum):
+    add = "add"
+    remove = "remove"
+    move = "move"
+    replace = "replace"
+
+
+class TripPatchOp(BaseModel):
+    op: TripPatchOpEnum
+    index: Optional[int] = Field(None, ge=0)
+    to: Optional[int] = Field(None, ge=0)
+    landmark: Optional[Landmark] = None
+
+
+class TripPatchRequest(BaseModel):
+    version: int  # the version the edits were made against
+    ops: List[TripPatchOp]
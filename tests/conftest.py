@@ -0,0 +1,29 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+
+@pytest.fixture(scope="module")
+def trips_router():
+    try:
+        from routers import trips
+    except (OperationalError, ImportError):
+        pytest.skip("needs the Postgres database configured in app/global_vars.py")
+    return trips
+
+
+@pytest.fixture
+def client(trips_router):
+    app = FastAPI()
+    app.include_router(trips_router.router, prefix="/trips")
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def messages_router():
+    try:
+        from routers import messages
+    except (OperationalError, ImportError):
+        pytest.skip("needs the Postgres database configured in app/global_vars.py")
+    return messages
@@ -0,0 +1,88 @@
+import asyncio
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.chat_push import HEARTBEAT, subscriber_events
+from app.global_vars import CHAT_PUSH_CHANNEL
+from app.models import Group, User
+from schemas.message import MessageCreateRequest
+
+TEST_UID = "test-chat-push"
+
+
+@pytest.fixture
+def gid(messages_router):
+    db = messages_router.SessionLocal()
+    if db.get(User, TEST_UID) is None:
+        db.add(User(uid=TEST_UID))
+        db.flush()
+    group = Group(owner=TEST_UID, group_name="chat push test")
+    db.add(group)
+    db.commit()
+    yield group.gid
+    db.delete(group)  # its messages go with it
+    db.commit()
+    db.close()
+
+
+def send(messages_router, gid: int, body: str) -> int:
+    db = messages_router.SessionLocal()
+    try:
+        return messages_router.send_message(MessageCreateRequest(
+            gid=gid, sender_uid=TEST_UID, sender_name="Test", text=body, timestamp=datetime.datetime.utcnow()
+        ), db).id
+    finally:
+        db.close()
+
+
+def listener_pids(messages_router):
+    with messages_router.engine.connect() as conn:
+        return conn.execute(text("SELECT pid FROM pg_stat_activity WHERE query = :query"),
+                            {"query": f"LISTEN {CHAT_PUSH_CHANNEL}"}).scalars().all()
+
+
+# messages sent while the LISTEN connection is down never get a notification delivered,
+# the subscriber must still receive them once the broker is back
+def test_no_message_lost_when_listener_dies(messages_router, gid):
+    broker = messages_router.chat_broker
+
+    async def scenario():
+        subscriber = broker.subscribe(gid)
+        events = subscriber_events(broker, subscriber, None, heartbeat=0.2)
+        received = []
+
+        async def receive_until(ids):
+            async for event in events:
+                if event is not HEARTBEAT:
+                    received.append(event["id"])
+                if set(ids) <= set(received):
+                    return
+
+        try:
+            for _ in range(50):
+                pids = await asyncio.to_thread(listener_pids, messages_router)
+                if pids:
+                    break
+                await asyncio.sleep(0.1)
+            assert pids, "the broker never started listening"
+
+            first = await asyncio.to_thread(send, messages_router, gid, "before")
+            await asyncio.wait_for(receive_until([first]), 10)
+            resyncs = broker.resyncs
+
+            with messages_router.engine.connect() as conn:
+                for pid in pids:
+                    conn.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": pid})
+            during = [await asyncio.to_thread(send, messages_router, gid, f"during {i}") for i in range(3)]
+
+            await asyncio.wait_for(receive_until(during), 15)
+            assert broker.resyncs > resyncs
+        finally:
+            await events.aclose()
+            broker.unsubscribe(subscriber)
+        return first, during, received
+
+    first, during, received = asyncio.run(scenario())
+    assert received == [first] + during
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+import requests
+
+from app.http_client import CircuitBreaker, CircuitOpenError, ExternalHttpClient
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+# answers with the scripted statuses (or raises the scripted exceptions) in order
+class FakeSession:
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    def get(self, url, timeout=None, **kwargs):
+        self.calls += 1
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+def make_client(monkeypatch, *script, max_retries: int = 2, threshold: int = 3, delay: float = 0.0):
+    monkeypatch.setattr(ExternalHttpClient, "_backoff", staticmethod(lambda attempt, res=None: delay))
+    client = ExternalHttpClient(max_retries=max_retries, breaker=CircuitBreaker(threshold=threshold, cooldown=30.0))
+    client.session = FakeSession(*script)
+    return client
+
+
+def cool_down(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.cooldown
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker(threshold=2, cooldown=30.0)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    # one trial after the cooldown, and its failure opens the circuit again straight away
+    cool_down(breaker)
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 2
+
+    cool_down(breaker)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+
+
+def test_retries_until_success(monkeypatch):
+    client = make_client(monkeypatch, 503, 502, 200)
+    assert client.get("http://upstream").status_code == 200
+    assert client.session.calls == 3
+    assert client.stats()["retries"] == 2
+    assert client.breaker.state == "closed" and client.breaker.failures == 0
+
+
+def test_gives_up_after_max_retries_and_returns_last_response(monkeypatch):
+    client = make_client(monkeypatch, 503, 503, 503, 503, threshold=10)
+    assert client.get("http://upstream").status_code == 503
+    assert client.session.calls == 3
+
+
+# 429 is retried but never opens the circuit, the upstream itself is fine
+def test_rate_limit_does_not_trip_the_breaker(monkeypatch):
+    client = make_client(monkeypatch, 429, 429, 429, max_retries=2, threshold=1)
+    assert client.get("http://upstream").status_code == 429
+    assert client.breaker.state == "closed"
+
+
+def test_open_circuit_fails_fast(monkeypatch):
+    client = make_client(monkeypatch, 500, 500, 200, max_retries=5, threshold=2)
+    with pytest.raises(CircuitOpenError):
+        client.get("http://upstream")
+    assert client.session.calls == 2
+    assert client.stats()["rejected"] == 1
+
+    # after the cooldown the trial request goes through and closes the circuit
+    cool_down(client.breaker)
+    assert client.get("http://upstream").status_code == 200
+    assert client.breaker.state == "closed"
+
+
+def test_connection_errors_are_retried_other_errors_are_not(monkeypatch):
+    client = make_client(monkeypatch, requests.ConnectionError("reset"), 200)
+    assert client.get("http://upstream").status_code == 200
+
+    client = make_client(monkeypatch, ValueError("bad url"), 200)
+    with pytest.raises(ValueError):
+        client.get("http://upstream")
+    assert client.session.calls == 1
+
+
+# a half-open trial that dies with a non-requests error still reports back and re-opens the circuit
+def test_failed_trial_reopens_the_circuit(monkeypatch):
+    client = make_client(monkeypatch, 500, RuntimeError("boom"), threshold=1, max_retries=0)
+    client.get("http://upstream")
+    cool_down(client.breaker)
+    with pytest.raises(RuntimeError):
+        client.get("http://upstream")
+    assert client.breaker.state == "open" and not client.breaker.allow()
+
+
+# a retry whose backoff would end past the deadline is not attempted
+def test_no_retry_past_the_deadline(monkeypatch):
+    client = make_client(monkeypatch, 503, 200, delay=1.0)
+    assert client.get("http://upstream", deadline=time.monotonic() + 0.5).status_code == 503
+    assert client.session.calls == 1
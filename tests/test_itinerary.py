@@ -0,0 +1,54 @@
+import itertools
+import random
+
+import pytest
+
+from app.geo import haversine_matrix
+from app.itinerary import order_stops
+
+
+def stop(name, lat, lng):
+    return {"name": name, "lat": lat, "long": lng, "type": "Food"}
+
+
+def route_miles(stops, start=None):
+    points = ([start] if start else []) + [(s["lat"], s["long"]) for s in stops]
+    dist = haversine_matrix([p[0] for p in points], [p[1] for p in points])
+    return sum(dist[i, i + 1] for i in range(len(points) - 1))
+
+
+def test_trivial_inputs():
+    assert order_stops([]) == ([], 0.0)
+    only = stop("A", 40.0, -75.0)
+    assert order_stops([only]) == ([only], 0.0)
+    ordered, miles = order_stops([only], start=(40.1, -75.0))
+    assert ordered == [only]
+    assert miles == pytest.approx(route_miles([only], start=(40.1, -75.0)))
+
+
+# stops along one road, shuffled, come back in road order from the start
+def test_stops_on_a_line_are_visited_in_order():
+    line = [stop(str(i), 40.0 + i / 100, -75.0) for i in range(8)]
+    shuffled = random.Random(1).sample(line, len(line))
+    ordered, miles = order_stops(shuffled, start=(39.99, -75.0))
+    assert [s["name"] for s in ordered] == [str(i) for i in range(8)]
+    assert miles == pytest.approx(route_miles(line, start=(39.99, -75.0)))
+
+
+# on small random sets the route is a permutation of the stops, its reported length is its real length,
+# and it is close to the best order found by trying them all (local search, so not always equal to it)
+@pytest.mark.parametrize("seed", range(5))
+def test_route_matches_brute_force(seed):
+    rng = random.Random(seed)
+    stops = [stop(str(i), 40.0 + rng.uniform(-0.1, 0.1), -75.0 + rng.uniform(-0.1, 0.1)) for i in range(7)]
+    start = (40.0, -75.0)
+    ordered, miles = order_stops(stops, start=start)
+    assert sorted(s["name"] for s in ordered) == sorted(s["name"] for s in stops)
+    assert miles == pytest.approx(route_miles(ordered, start=start))
+    best = min(route_miles(list(p), start=start) for p in itertools.permutations(stops))
+    assert miles <= best * 1.1
+
+    # without a start point either end of the route may come first
+    ordered, miles = order_stops(stops)
+    assert miles == pytest.approx(route_miles(ordered))
+    assert miles <= min(route_miles(list(p)) for p in itertools.permutations(stops)) * 1.1
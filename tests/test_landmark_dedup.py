@@ -0,0 +1,38 @@
+from app.landmark_dedup import merge_near_duplicates, names_similar, normalize_name
+
+
+def candidate(name, lat, lng, score, type_):
+    return {"name": name, "lat": lat, "long": lng, "score": score, "type": type_}
+
+
+def test_normalize_name():
+    assert normalize_name("The Museum of Art") == normalize_name("museum  art")
+    assert normalize_name("Café Rouge & Bar") == "cafe rouge bar"
+
+
+def test_same_place_from_two_search_terms_is_merged():
+    deduped, removed = merge_near_duplicates({"Museums": [
+        candidate("City Museum", 40.0, -75.0, 0.4, "Museums"),
+        candidate("The City Museum", 40.0001, -75.0001, 0.7, "Museums"),
+        candidate("Science Center", 40.01, -75.01, 0.5, "Museums"),
+    ]})
+    assert removed == 1
+    assert sorted((c["name"], c["score"]) for c in deduped["Museums"]) == [("Science Center", 0.5),
+                                                                            ("The City Museum", 0.7)]
+
+
+def test_place_in_two_categories_stays_in_both():
+    # the gallery scores higher as a museum, but it is the only Art candidate and must not be taken from Art
+    deduped, removed = merge_near_duplicates({
+        "Museums": [candidate("Riverside Gallery", 40.0, -75.0, 0.9, "Museums"),
+                    candidate("History Museum", 40.02, -75.02, 0.6, "Museums")],
+        "Art": [candidate("Riverside Art Gallery", 40.0001, -75.0, 0.3, "Art")],
+    })
+    assert removed == 0
+    assert [c["name"] for c in deduped["Art"]] == ["Riverside Art Gallery"]
+    assert len(deduped["Museums"]) == 2
+
+
+def test_names_similar_needs_enough_shared_words():
+    assert names_similar(normalize_name("Art Institute"), normalize_name("The Art Institute of Chicago"))
+    assert not names_similar("cafe", "blue cafe")
@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app.landmark_fetch as landmark_fetch
+
+
+@pytest.fixture
+def slow_upstream(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=2)
+    started = []
+    lock = threading.Lock()
+
+    def fetch_features(url, timeout):
+        with lock:
+            started.append(url)
+        time.sleep(0.2)
+        return [url]
+
+    monkeypatch.setattr(landmark_fetch, "_executor", executor)
+    monkeypatch.setattr(landmark_fetch, "_fetch_features", fetch_features)
+    yield started
+    executor.shutdown(wait=True)
+
+
+def test_queue_wait_does_not_count_against_the_query_timeout(slow_upstream):
+    # 8 queries on 2 threads queue for up to 0.6s, longer than the 0.3s each query is allowed once sent
+    queries = [(k, f"url{k}") for k in range(8)]
+    results = landmark_fetch.fetch_all_sync(queries, max_in_flight=8, timeout=0.3, deadline=5)
+    assert results == {k: [f"url{k}"] for k in range(8)}
+
+
+def test_deadline_returns_partial_results_and_drops_queued_queries(slow_upstream):
+    queries = [(k, f"url{k}") for k in range(20)]
+    began = time.monotonic()
+    results = landmark_fetch.fetch_all_sync(queries, max_in_flight=20, timeout=0.3, deadline=0.5)
+
+    assert time.monotonic() - began < 0.8
+    assert 2 <= len(results) < 20
+    time.sleep(0.5)
+    # queries still queued at the deadline were taken off the executor, not sent late
+    assert len(slow_upstream) <= 6
@@ -0,0 +1,56 @@
+import csv
+
+import pytest
+
+from app.geo import haversine_miles
+from app.landmark_providers import LandmarkProvider, LocalLandmarkProvider
+from app.poi_index import build_poi_file
+
+CENTER = (40.0, -75.0)
+POIS = [
+    # name, category, lat, long, relevance
+    ("Corner Cafe", "Food", 40.001, -75.001, 0.9),
+    ("Night Market", "Food", 40.02, -75.03, 0.5),
+    ("Riverside Gallery", "Art", 40.005, -74.995, 0.8),
+    ("Old Mill", "Historic", 39.99, -75.01, 0.7),
+    ("Far Diner", "Food", 41.0, -75.0, 0.9),  # ~69 miles north
+    ("Across The Meridian", "Art", 40.0, -76.5, 0.6),  # ~80 miles west
+]
+
+
+@pytest.fixture
+def provider(tmp_path):
+    source = tmp_path / "pois.csv"
+    with open(source, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "category", "lat", "long", "relevance"])
+        writer.writerows(POIS)
+    dest = tmp_path / "pois.npy"
+    assert build_poi_file(str(source), str(dest)) == len(POIS)
+    return LocalLandmarkProvider(str(dest))
+
+
+def test_provider_must_implement_search():
+    with pytest.raises(TypeError):
+        LandmarkProvider()
+
+
+def test_local_search_by_category_and_distance(provider):
+    results = provider.search(*CENTER, 5, ["Food", "Art", "Parks"])
+
+    assert sorted(f["properties"]["name"] for f in results["Food"]) == ["Corner Cafe", "Night Market"]
+    assert [f["properties"]["name"] for f in results["Art"]] == ["Riverside Gallery"]
+    assert results["Parks"] == []
+    for features in results.values():
+        for feat in features:
+            lng, lat = feat["geometry"]["coordinates"]
+            assert haversine_miles(*CENTER, lat, lng) <= 5
+
+
+def test_local_search_radius(provider):
+    results = provider.search(*CENTER, 100, ["Food", "Art"])
+
+    assert len(results["Food"]) == 3
+    assert len(results["Art"]) == 2
+    relevance = {f["properties"]["name"]: f["properties"]["relevance"] for f in results["Food"]}
+    assert relevance["Corner Cafe"] == pytest.approx(0.9)
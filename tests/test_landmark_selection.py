@@ -0,0 +1,69 @@
+import random
+
+from app.landmark_selection import _TopK, select_landmarks, select_alternatives
+
+
+def candidate(name, lat, lng, score, type_):
+    return {"name": name, "lat": lat, "long": lng, "score": score, "type": type_}
+
+
+
+# the heap keeps the k best, and a better scored duplicate replaces its earlier entry instead of taking a slot
+def test_top_k_keeps_best_unique():
+    top = _TopK(2)
+    for seq, (name, score) in enumerate([("A", 0.1), ("B", 0.5), ("A", 0.9), ("C", 0.3), ("B", 0.2), ("D", 0.4)]):
+        top.offer(score, seq, candidate(name, 40.0, -75.0, score, "Food"))
+    assert [(e[0], e[2]["name"]) for e in top.entries()] == [(0.9, "A"), (0.5, "B")]
+
+
+def test_top_k_of_zero_keeps_nothing():
+    top = _TopK(0)
+    top.offer(1.0, 0, candidate("A", 40.0, -75.0, 1.0, "Food"))
+    assert top.entries() == []
+
+
+# each category keeps its quota by score, then the cap drops the lowest scored winners wherever they came from
+def test_quotas_then_cap_by_score():
+    pool = {
+        "Food": [candidate(f"Diner {i}", 40.0 + i / 10, -75.0, score, "Food")
+                 for i, score in enumerate([0.2, 0.9, 0.5, 0.7])],
+        "Parks": [candidate(f"Park {i}", 41.0 + i / 10, -75.0, score, "Parks")
+                  for i, score in enumerate([0.6, 0.1])],
+    }
+    selected = select_landmarks(pool, {"Food": 3, "Parks": 1}, 3, randomness=0, rng=random.Random(0))
+    assert [c["name"] for c in selected] == ["Diner 1", "Diner 3", "Park 0"]
+    assert select_landmarks(pool, {"Food": 3, "Parks": 1}, 0, randomness=0) == []
+
+# the gallery is the best museum and the best art spot; it is picked once and Art falls back to its next candidate
+def test_place_is_picked_for_one_category_only():
+    pool = {
+        "Museums": [candidate("Riverside Gallery", 40.0, -75.0, 0.9, "Museums"),
+                    candidate("History Museum", 40.02, -75.02, 0.5, "Museums")],
+        "Art": [candidate("Riverside Art Gallery", 40.0001, -75.0, 0.9, "Art"),
+                candidate("Mural Walk", 40.03, -75.01, 0.4, "Art")],
+    }
+    selected = select_landmarks(pool, {"Museums": 1, "Art": 1}, 5, randomness=0, rng=random.Random(0))
+    assert [(c["name"], c["type"]) for c in selected] == [("Riverside Gallery", "Museums"), ("Mural Walk", "Art")]
+
+
+class ScriptedRng:
+    def __init__(self, values):
+        self.values = iter(values)
+
+    def random(self):
+        return next(self.values)
+
+
+# the second draw ranks the shared Park last, so it must not use up the overlap budget and block the shared Bridge
+def test_alternative_overlap_counts_only_kept_landmarks():
+    pool = {
+        "Parks": [candidate("Park", 40.0, -75.0, 0.0, "Parks")],
+        "Bridges": [candidate("Bridge", 40.01, -75.0, 0.0, "Bridges"),
+                    candidate("Footbridge", 40.02, -75.0, 0.0, "Bridges")],
+        "Cafes": [candidate("Cafe", 40.03, -75.0, 0.0, "Cafes")],
+    }
+    rng = ScriptedRng([0.9, 0.8, 0.1, 0.2,
+                       0.1, 0.9, 0.3, 0.5])
+    first, second = select_alternatives(pool, {"Parks": 1, "Bridges": 1, "Cafes": 1}, 2, 2, 1, randomness=1, rng=rng)
+    assert [c["name"] for c in first] == ["Park", "Bridge"]
+    assert [c["name"] for c in second] == ["Bridge", "Cafe"]
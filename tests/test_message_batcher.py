@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import message_batcher
+from app.message_batcher import GroupCommit
+
+
+class FakeSession:
+    def close(self):
+        pass
+
+
+# stands in for write_messages: a batch holding a "bad" entry fails as a whole, like a violated FK would
+@pytest.fixture
+def writes(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def write_messages(db, entries):
+        with lock:
+            calls.append([values["text"] for values in entries])
+        if any(values["text"].startswith("bad") for values in entries):
+            raise ValueError(f"cannot insert {len(entries)} rows")
+        return [("row", values["text"]) for values in entries]
+
+    monkeypatch.setattr(message_batcher, "write_messages", write_messages)
+    return calls
+
+
+def submit_all(writer: GroupCommit, texts):
+    def submit(text):
+        try:
+            return writer.submit({"text": text})
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(len(texts)) as pool:
+        return list(pool.map(submit, texts))
+
+
+# a full batch is written by one call, and each sender gets its own row back
+def test_batch_is_written_once(writes):
+    writer = GroupCommit(FakeSession, window=5.0, max_batch=3)
+    results = submit_all(writer, ["a", "b", "c"])
+    assert results == [("row", "a"), ("row", "b"), ("row", "c")]
+    assert len(writes) == 1 and sorted(writes[0]) == ["a", "b", "c"]
+
+
+# one bad row fails the batch; every entry is then retried alone, so only its own sender sees the error
+def test_failed_batch_falls_back_to_one_write_per_entry(writes):
+    writer = GroupCommit(FakeSession, window=5.0, max_batch=3)
+    a, bad, c = submit_all(writer, ["a", "bad", "c"])
+    assert a == ("row", "a") and c == ("row", "c")
+    assert isinstance(bad, ValueError) and "1 rows" in str(bad)
+    assert len(writes) == 4
+    assert sorted(writes[1:]) == [["a"], ["bad"], ["c"]]
+
+
+# a batch of one is not retried, its error goes straight back to the sender
+def test_single_entry_failure_is_not_retried(writes):
+    writer = GroupCommit(FakeSession, window=0.0, max_batch=3)
+    with pytest.raises(ValueError):
+        writer.submit({"text": "bad"})
+    assert writes == [["bad"]]
@@ -0,0 +1,40 @@
+import datetime
+
+import pytest
+
+from app.global_vars import MESSAGE_SEARCH_START_SEL, MESSAGE_SEARCH_STOP_SEL
+from app.models import Group, User
+from schemas.message import MessageCreateRequest
+
+TEST_UID = "test-message-search"
+
+
+@pytest.fixture
+def gid(messages_router):
+    db = messages_router.SessionLocal()
+    if db.get(User, TEST_UID) is None:
+        db.add(User(uid=TEST_UID))
+        db.flush()
+    group = Group(owner=TEST_UID, group_name="message search test")
+    db.add(group)
+    db.commit()
+    yield group.gid
+    db.delete(group)  # its messages go with it
+    db.commit()
+    db.close()
+
+
+# markup and stray marker characters in a message come back as plain text, only the matched word is marked
+def test_snippet_marks_only_matches(messages_router, gid):
+    db = messages_router.SessionLocal()
+    try:
+        messages_router.send_message(MessageCreateRequest(
+            gid=gid, sender_uid=TEST_UID, sender_name="Test", timestamp=datetime.datetime.utcnow(),
+            text=f"<b>fake</b> lighthouse {MESSAGE_SEARCH_START_SEL}tour{MESSAGE_SEARCH_STOP_SEL} at noon"
+        ), db)
+        page = messages_router.search_group_messages(gid, "lighthouse", db=db)
+    finally:
+        db.close()
+    snippet = page.results[0].snippet
+    assert snippet.count(MESSAGE_SEARCH_START_SEL) == snippet.count(MESSAGE_SEARCH_STOP_SEL) == 1
+    assert f"{MESSAGE_SEARCH_START_SEL}lighthouse{MESSAGE_SEARCH_STOP_SEL}" in snippet
@@ -0,0 +1,63 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.single_flight import SingleFlight
+
+
+def wait_for_waiters(flight: SingleFlight, key, waiters: int):
+    for _ in range(500):
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters == waiters:
+                return
+        time.sleep(0.01)
+    raise AssertionError("the callers never joined the running call")
+
+
+# callers arriving while the leader runs share its single call
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "pool"
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.do, "key", fn)]
+        wait_for_waiters(flight, "key", 0)
+        futures += [pool.submit(flight.do, "key", fn) for _ in range(3)]
+        wait_for_waiters(flight, "key", 3)
+        release.set()
+        assert [f.result(5) for f in futures] == ["pool"] * 4
+    assert len(calls) == 1
+    assert flight.shared == 3
+    assert flight.in_flight() == 0
+
+
+# the leader's exception reaches every waiter, and the failed call isn't cached for the next caller
+def test_leader_failure_reaches_waiters():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(3) as pool:
+        leader = pool.submit(flight.do, "key", failing)
+        wait_for_waiters(flight, "key", 0)
+        waiters = [pool.submit(flight.do, "key", failing) for _ in range(2)]
+        wait_for_waiters(flight, "key", 2)
+        release.set()
+        for future in [leader] + waiters:
+            with pytest.raises(RuntimeError, match="upstream down"):
+                future.result(5)
+
+    assert flight.in_flight() == 0
+    assert flight.do("key", lambda: "retried") == "retried"
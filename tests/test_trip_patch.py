@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+from app.global_vars import TRIP_PATCH_MAX_OPS
+from app.models import Trip, User
+from app.trip_patch import InvalidPatch, patched_landmarks
+from schemas.trip import TripPatchOp
+
+TEST_UID = "test-trip-patch"
+
+
+def landmark(i):
+    return {"name": f"Stop {i}", "lat": 40.0 + i / 100, "long": -75.0 - i / 100, "type": "Food"}
+
+
+def ops(*raw):
+    return [TripPatchOp(**op) for op in raw]
+
+
+def test_ops_apply_in_order():
+    result = patched_landmarks([landmark(0), landmark(1), landmark(2)], ops(
+        {"op": "add", "landmark": landmark(3)},
+        {"op": "add", "index": 0, "landmark": landmark(4)},
+        {"op": "remove", "index": 2},
+        {"op": "replace", "index": 1, "landmark": landmark(5)},
+        {"op": "move", "index": 0, "to": 3},
+    ))
+    assert [l["name"] for l in result] == ["Stop 5", "Stop 2", "Stop 3", "Stop 4"]
+
+
+def test_out_of_range_index_is_rejected():
+    with pytest.raises(InvalidPatch):
+        patched_landmarks([landmark(0)], ops({"op": "move", "index": 0, "to": 1}))
+    with pytest.raises(InvalidPatch):
+        patched_landmarks([landmark(0)], ops({"op": "add", "index": 2, "landmark": landmark(1)}))
+
+
+@pytest.fixture
+def trip(trips_router):
+    db = trips_router.SessionLocal()
+    if db.get(User, TEST_UID) is None:
+        db.add(User(uid=TEST_UID))
+        db.flush()
+    trip = Trip(group=0, uid=TEST_UID, location_lat=40.0, location_long=-75.0,
+                landmarks=[landmark(i) for i in range(10)], num_destinations=10)
+    db.add(trip)
+    db.commit()
+    yield trip.tid, trip.landmarks
+    db.query(Trip).filter(Trip.tid == trip.tid).delete()
+    db.commit()
+    db.close()
+
+
+# the largest patch a client may send, all moves, the op that used to grow the generated SQL fastest
+def test_patch_with_max_moves(client, trip):
+    tid, landmarks = trip
+    moves = [{"op": "move", "index": i % len(landmarks), "to": (i * 7 + 3) % len(landmarks)}
+             for i in range(TRIP_PATCH_MAX_OPS)]
+    expected = list(landmarks)
+    for move in moves:
+        expected.insert(move["to"], expected.pop(move["index"]))
+
+    started = time.monotonic()
+    response = client.patch(f"/trips/update_trip/{tid}", json={"version": 1, "ops": moves})
+    assert time.monotonic() - started < 5
+
+    assert response.status_code == 200, response.text
+    assert response.json()["landmarks"] == expected
+    assert response.json()["version"] == 2
+
+    stale = client.patch(f"/trips/update_trip/{tid}", json={"version": 1, "ops": moves})
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["version"] == 2
@@ -0,0 +1,13 @@
+import json
+
+
+# no categories means no landmark queries, so this only exercises the save at the end of the stream
+def test_failed_save_ends_stream_with_error(client):
+    response = client.post("/trips/generate_trip_stream", params={
+        "group": 0, "uid": "test-trip-stream-no-such-user", "location_lat": 40.0, "location_long": -75.0,
+    })
+
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[-1]["event"] == "error"
+    assert all(event["event"] != "trip" for event in events)